@@ -3,9 +3,20 @@ from routes.auth import auth_bp
 from routes.farmer import farmer_bp
 from routes.customer import customer_bp
 from routes.admin import admin_bp
+from routes.jobs import jobs_bp
 from config import APP_CONFIG
 from flask_wtf.csrf import CSRFProtect
-from database import fetchone
+from database import fetchone, init_app as init_db
+import reservations
+import order_queue
+import catalog
+import cart_store
+import loyalty
+import order_history
+import farmer_stats
+import sales_rollup
+import stock_alerts
+import platform_counters
 
 def create_app():
     app = Flask(__name__, static_folder="static", template_folder="routes/templates")
@@ -15,11 +26,35 @@ def create_app():
     )
     # optionally override SECRET_KEY via environment variable in production
 
+    # one pooled DB connection per request, released at teardown
+    init_db(app)
+    # background sweeper for expired cart stock holds
+    reservations.init_app(app)
+    # group-commit order workers (only when ORDER_CONFIG['intake_mode'] == 'queued')
+    order_queue.init_app(app)
+    # flattened catalog_product read model for the shop
+    catalog.init_app(app)
+    # server-side carts; the session only carries the cart ID
+    cart_store.init_app(app)
+    # loyalty points ledger and its periodic reconciliation
+    loyalty.init_app(app)
+    # index behind the paged customer order history
+    order_history.init_app(app)
+    # per-farmer dashboard stats snapshots and their background check
+    farmer_stats.init_app(app)
+    # daily/weekly/monthly sales buckets behind the farmer sales reports
+    sales_rollup.init_app(app)
+    # in-memory low-stock set and the farmer notification feed
+    stock_alerts.init_app(app)
+    # incrementally kept platform totals behind the admin dashboard
+    platform_counters.init_app(app)
+
     # Blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(farmer_bp, url_prefix="/farmer")
     app.register_blueprint(customer_bp, url_prefix="/customer")
     app.register_blueprint(admin_bp, url_prefix="/admin")
+    app.register_blueprint(jobs_bp, url_prefix="/jobs")
 
     # CSRF protection
     csrf = CSRFProtect()
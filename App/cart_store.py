@@ -0,0 +1,212 @@
+"""
+cart_store.py
+Server-side shopping carts.
+
+The session cookie only carries a cart ID; the lines live in a durable
+backend (the cart_item table, or process memory for a single-process dev
+server) behind a small per-process LRU. Adding to the cart is one atomic
+increment in the backend, so clicks from several tabs never overwrite each
+other.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from config import CART_CONFIG
+from database import execute, execute_rowcount, fetchall, ensure_index
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cart_item (
+        CartID CHAR(32) NOT NULL,
+        ProductID INT NOT NULL,
+        Quantity INT NOT NULL,
+        UpdatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (CartID, ProductID)
+    )
+"""
+
+
+class MySQLCartBackend:
+    """Cart lines in the cart_item table."""
+
+    def ensure_schema(self):
+        execute(SCHEMA)
+        ensure_index('cart_item', 'idx_cart_item_updated', 'UpdatedAt')
+
+    def load(self, cart_id):
+        rows = fetchall("SELECT ProductID, Quantity FROM cart_item WHERE CartID = %s", (cart_id,))
+        return {r['ProductID']: r['Quantity'] for r in rows}
+
+    def increment(self, cart_id, product_id, delta):
+        # LAST_INSERT_ID(expr) hands the updated quantity back without a
+        # second query; a fresh row simply holds `delta`
+        new_qty = execute(
+            "INSERT INTO cart_item (CartID, ProductID, Quantity) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE Quantity = LAST_INSERT_ID(Quantity + VALUES(Quantity))",
+            (cart_id, product_id, delta)) or delta
+        if new_qty <= 0:
+            execute("DELETE FROM cart_item WHERE CartID = %s AND ProductID = %s AND Quantity <= 0",
+                    (cart_id, product_id))
+            return 0
+        return new_qty
+
+    def set(self, cart_id, product_id, qty):
+        if qty <= 0:
+            execute("DELETE FROM cart_item WHERE CartID = %s AND ProductID = %s", (cart_id, product_id))
+        else:
+            execute("INSERT INTO cart_item (CartID, ProductID, Quantity) VALUES (%s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE Quantity = VALUES(Quantity)", (cart_id, product_id, qty))
+
+    def clear(self, cart_id):
+        execute("DELETE FROM cart_item WHERE CartID = %s", (cart_id,))
+
+    def purge(self, retention_days):
+        return execute_rowcount("DELETE FROM cart_item WHERE UpdatedAt < NOW() - INTERVAL %s DAY",
+                                (retention_days,))
+
+
+class MemoryCartBackend:
+    """Cart lines in process memory; only for a single-process dev server."""
+
+    def __init__(self):
+        self._carts = {}
+        self._lock = threading.Lock()
+
+    def ensure_schema(self):
+        pass
+
+    def load(self, cart_id):
+        with self._lock:
+            return dict(self._carts.get(cart_id, {}))
+
+    def increment(self, cart_id, product_id, delta):
+        with self._lock:
+            cart = self._carts.setdefault(cart_id, {})
+            new_qty = cart.get(product_id, 0) + delta
+            if new_qty <= 0:
+                cart.pop(product_id, None)
+                return 0
+            cart[product_id] = new_qty
+            return new_qty
+
+    def set(self, cart_id, product_id, qty):
+        with self._lock:
+            cart = self._carts.setdefault(cart_id, {})
+            if qty <= 0:
+                cart.pop(product_id, None)
+            else:
+                cart[product_id] = qty
+
+    def clear(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+    def purge(self, retention_days):
+        return 0
+
+
+BACKENDS = {
+    'mysql': MySQLCartBackend,
+    'memory': MemoryCartBackend,
+}
+
+
+class CartStore:
+    """
+    {product_id: quantity} carts by cart ID. Reads are served from the LRU
+    for up to `lru_ttl` seconds (another worker may have changed the cart in
+    the meantime) unless they ask for a fresh copy; every write goes to the
+    backend and refreshes the entry.
+    """
+
+    def __init__(self, backend='mysql', lru_size=5000, lru_ttl=30, retention_days=30):
+        self.backend = BACKENDS[backend]()
+        self.lru_size = lru_size
+        self.lru_ttl = lru_ttl
+        self.retention_days = retention_days
+        self._lru = OrderedDict()   # cart_id -> (loaded_at, {product_id: qty})
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    def _remember(self, cart_id, lines):
+        with self._lock:
+            self._lru[cart_id] = (time.monotonic(), lines)
+            self._lru.move_to_end(cart_id)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _update(self, cart_id, product_id, qty):
+        with self._lock:
+            entry = self._lru.get(cart_id)
+            if entry is None:
+                return
+            lines = dict(entry[1])
+            if qty > 0:
+                lines[product_id] = qty
+            else:
+                lines.pop(product_id, None)
+            self._lru[cart_id] = (entry[0], lines)
+
+    def get(self, cart_id, fresh=False):
+        """The cart's lines; fresh=True reads the backend (checkout must see every line)."""
+        if not cart_id:
+            return {}
+        with self._lock:
+            entry = None if fresh else self._lru.get(cart_id)
+            if entry and time.monotonic() - entry[0] < self.lru_ttl:
+                self._lru.move_to_end(cart_id)
+                self._counters['hits'] += 1
+                return dict(entry[1])
+            self._counters['misses'] += 1
+        lines = dict(sorted(self.backend.load(cart_id).items()))
+        self._remember(cart_id, lines)
+        return dict(lines)
+
+    def add(self, cart_id, product_id, delta):
+        """Atomically add `delta` (may be negative) to a line; returns the new quantity."""
+        product_id = int(product_id)
+        qty = self.backend.increment(cart_id, product_id, int(delta))
+        self._update(cart_id, product_id, qty)
+        return qty
+
+    def set(self, cart_id, product_id, qty):
+        product_id, qty = int(product_id), int(qty)
+        self.backend.set(cart_id, product_id, qty)
+        self._update(cart_id, product_id, qty)
+
+    def subtract(self, cart_id, lines):
+        """
+        Take ordered {product_id: quantity} out of the cart. Lines added
+        meanwhile (e.g. from another tab) stay in it.
+        """
+        if not cart_id:
+            return
+        for product_id, qty in lines.items():
+            self.add(cart_id, product_id, -int(qty))
+
+    def clear(self, cart_id):
+        if not cart_id:
+            return
+        self.backend.clear(cart_id)
+        with self._lock:
+            self._lru.pop(cart_id, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, cached_carts=len(self._lru), lru_size=self.lru_size)
+
+
+cart_store = CartStore(**CART_CONFIG)
+
+
+def init_app(app):
+    """Create the cart table and drop carts abandoned for longer than retention_days."""
+    with app.app_context():
+        cart_store.backend.ensure_schema()
+        cart_store.backend.purge(cart_store.retention_days)
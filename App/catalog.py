@@ -0,0 +1,384 @@
+"""
+catalog.py
+Flattened read model for the shop: one catalog_product row per product with
+category, farmer, seasons, image, stock and rating already joined in.
+
+The table is built by the first worker process to start and kept current
+by the write paths (add/edit/restock/delete product, orders, reviews, farmer
+profile edits), so the shop reads it with a single indexed query instead of
+joining v_productdetails, product, product_season and season on every page
+view. Writes that bypass those paths (stored procedures, admin SQL, a hook
+that failed after its commit) are caught by a background check that
+compares the table with the source tables every
+CATALOG_CONFIG['verify_interval'] seconds and re-derives the rows that
+drifted.
+
+In-process indexes built over the catalog (facets, search, suggestions)
+subscribe() to it: they are loaded with every row at startup, told about
+changed rows after each committing write, and fully reloaded every
+CATALOG_CONFIG['index_refresh'] seconds to pick up writes made by other
+worker processes.
+"""
+
+import base64
+import json
+import threading
+import time
+
+from config import CATALOG_CONFIG
+from database import execute, execute_rowcount, fetchall, fetchone, fetch_by_ids, transaction, ensure_index, after_commit
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS catalog_product (
+        ProductID INT NOT NULL PRIMARY KEY,
+        ProductName VARCHAR(255) NOT NULL,
+        Price DECIMAL(10,2) NOT NULL,
+        QuantityAvailable INT NOT NULL DEFAULT 0,
+        Freshness VARCHAR(50) NULL,
+        ImagePath VARCHAR(255) NULL,
+        CategoryID INT NULL,
+        CategoryName VARCHAR(100) NULL,
+        FarmerID INT NULL,
+        FarmerName VARCHAR(255) NULL,
+        FarmerLocation VARCHAR(255) NULL,
+        SeasonName VARCHAR(255) NULL,
+        AvgRating DECIMAL(3,2) NOT NULL DEFAULT 0,
+        ReviewCount INT NOT NULL DEFAULT 0,
+        UpdatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        KEY idx_catalog_category (CategoryName, ProductID),
+        KEY idx_catalog_farmer (FarmerID, ProductID)
+    )
+"""
+
+COLUMNS = ("ProductID, ProductName, Price, QuantityAvailable, Freshness, ImagePath, "
+           "CategoryID, CategoryName, FarmerID, FarmerName, FarmerLocation, SeasonName, "
+           "AvgRating, ReviewCount")
+
+# Source rows for catalog_product, one per product, named as its columns
+SOURCE = """
+    SELECT
+        p.ProductID,
+        p.Name AS ProductName,
+        p.Price,
+        p.QuantityAvailable,
+        p.Freshness,
+        p.ImagePath,
+        p.CategoryID,
+        c.CategoryName,
+        p.FarmerID,
+        f.Name AS FarmerName,
+        f.Location AS FarmerLocation,
+        (SELECT GROUP_CONCAT(s.SeasonName ORDER BY s.SeasonName SEPARATOR ', ')
+         FROM product_season ps JOIN season s ON ps.SeasonID = s.SeasonID
+         WHERE ps.ProductID = p.ProductID) AS SeasonName,
+        (SELECT COALESCE(AVG(r.Rating), 0) FROM review r WHERE r.ProductID = p.ProductID) AS AvgRating,
+        (SELECT COUNT(*) FROM review r WHERE r.ProductID = p.ProductID) AS ReviewCount
+    FROM product p
+    LEFT JOIN category c ON p.CategoryID = c.CategoryID
+    LEFT JOIN farmer f ON p.FarmerID = f.FarmerID
+"""
+
+# Secondary indexes backing the shop's keyset pagination
+INDEXES = [
+    ('idx_catalog_price', 'Price, ProductID'),
+    ('idx_catalog_name', 'ProductName, ProductID'),
+    ('idx_catalog_rating', 'AvgRating, ProductID'),
+    ('idx_catalog_category_price', 'CategoryName, Price, ProductID'),
+]
+
+# Shop sort orders as (column, direction); ProductID breaks ties so every
+# row has a unique position to resume from
+SORTS = {
+    'newest': (None, 'DESC'),
+    'price-low': ('Price', 'ASC'),
+    'price-high': ('Price', 'DESC'),
+    'name': ('ProductName', 'ASC'),
+    'rating': ('AvgRating', 'DESC'),
+}
+
+SHOP_COLUMNS = ("ProductID, ProductName, Price, CategoryName, FarmerID, FarmerName, ImagePath, "
+                "QuantityAvailable, SeasonName, AvgRating, ReviewCount")
+
+INDEX_COLUMNS = SHOP_COLUMNS + ", FarmerLocation"
+
+# in-process indexes kept in step with catalog_product
+_listeners = []
+_refresher = None
+_checker = None
+_last_check = {}
+
+
+def _in_list(ids):
+    ids = sorted({int(i) for i in ids})
+    return ids, ", ".join(["%s"] * len(ids))
+
+
+def ensure_schema():
+    execute(SCHEMA)
+    for name, columns in INDEXES:
+        ensure_index('catalog_product', name, columns)
+
+
+def rebuild():
+    """Repopulate catalog_product from the source tables."""
+    with transaction():
+        execute("DELETE FROM catalog_product")
+        execute(f"INSERT INTO catalog_product ({COLUMNS}) {SOURCE}")
+
+
+def _comparable(row):
+    # catalog_product stores the average rating rounded to DECIMAL(3,2)
+    return tuple(round(float(row[c]), 2) if c in ('Price', 'AvgRating') else row[c]
+                 for c in COLUMNS.split(", "))
+
+
+def verify():
+    """
+    Compare catalog_product with the source tables and re-derive the rows
+    that drifted, dropping rows of products that no longer exist. Repairs
+    re-read the source, so a write landing meanwhile is never undone.
+    """
+    started = time.monotonic()
+    expected = {r['ProductID']: _comparable(r) for r in fetchall(SOURCE)}
+    stored = {r['ProductID']: _comparable(r) for r in fetchall(f"SELECT {COLUMNS} FROM catalog_product")}
+    drifted = sorted(pid for pid, row in expected.items() if stored.get(pid) != row)
+    removed = sorted(pid for pid in stored if pid not in expected)
+    if drifted or removed:
+        with transaction():
+            refresh_products(drifted)
+            remove_products(removed)
+    report = {
+        'checked': len(expected),
+        'drifted': drifted[:100],
+        'drifted_count': len(drifted),
+        'removed': len(removed),
+        'seconds': round(time.monotonic() - started, 3),
+        'finished_at': time.time(),
+    }
+    _last_check.clear()
+    _last_check.update(report)
+    return report
+
+
+def stats():
+    return {'last_check': dict(_last_check)}
+
+
+def prepare():
+    """
+    Build catalog_product on first start, or bring it up to date on later
+    ones. One worker process does it; the others wait here and find it done.
+    """
+    lock = fetchone("SELECT GET_LOCK('catalog_prepare', 60) AS got")
+    if not lock or not lock['got']:
+        return
+    try:
+        if fetchone("SELECT 1 AS present FROM catalog_product LIMIT 1"):
+            verify()
+        else:
+            rebuild()
+    finally:
+        fetchone("SELECT RELEASE_LOCK('catalog_prepare') AS released")
+
+
+def refresh_products(product_ids):
+    """Re-derive the catalog rows of the given products (one statement)."""
+    ids, placeholders = _in_list(product_ids)
+    if not ids:
+        return
+    execute(f"REPLACE INTO catalog_product ({COLUMNS}) {SOURCE} WHERE p.ProductID IN ({placeholders})",
+            tuple(ids))
+    _changed(product_ids=ids)
+
+
+def refresh_farmer(farmer_id):
+    """Re-derive every catalog row of a farmer, e.g. after a profile edit."""
+    execute(f"REPLACE INTO catalog_product ({COLUMNS}) {SOURCE} WHERE p.FarmerID = %s",
+            (farmer_id,))
+    _changed(farmer_id=farmer_id)
+
+
+def remove_products(product_ids):
+    ids, placeholders = _in_list(product_ids)
+    if not ids:
+        return
+    execute(f"DELETE FROM catalog_product WHERE ProductID IN ({placeholders})", tuple(ids))
+    _changed(removed=ids)
+
+
+def adjust_stock(deltas):
+    """Apply {product_id: delta} stock changes with one CASE update."""
+    deltas = {int(pid): int(d) for pid, d in deltas.items() if int(d)}
+    if not deltas:
+        return 0
+    ids, placeholders = _in_list(deltas)
+    cases = " ".join(["WHEN %s THEN %s"] * len(ids))
+    params = [v for pid in ids for v in (pid, deltas[pid])] + ids
+    updated = execute_rowcount(
+        f"UPDATE catalog_product SET QuantityAvailable = QuantityAvailable + CASE ProductID {cases} END "
+        f"WHERE ProductID IN ({placeholders})", tuple(params))
+    _changed(product_ids=ids)
+    return updated
+
+
+def subscribe(index):
+    """
+    Register an in-process index. It must provide load(rows), called with
+    every catalog row, and apply(rows, removed_ids), called with the rows
+    changed by a committed write.
+    """
+    _listeners.append(index)
+
+
+def load_rows(product_ids=None, farmer_id=None):
+    q = f"SELECT {INDEX_COLUMNS} FROM catalog_product"
+    if product_ids is not None:
+        ids, placeholders = _in_list(product_ids)
+        if not ids:
+            return []
+        return fetchall(f"{q} WHERE ProductID IN ({placeholders})", tuple(ids))
+    if farmer_id is not None:
+        return fetchall(f"{q} WHERE FarmerID = %s", (farmer_id,))
+    return fetchall(q)
+
+
+def _changed(product_ids=None, farmer_id=None, removed=()):
+    if not _listeners:
+        return
+
+    def publish():
+        try:
+            rows = load_rows(product_ids, farmer_id) if (product_ids or farmer_id) else []
+        except Exception:
+            return   # the write is committed; the periodic refresh picks it up
+        for index in _listeners:
+            try:
+                index.apply(rows, list(removed))
+            except Exception:
+                pass   # as above; one index failing must not starve the others
+
+    # indexes only ever see committed rows
+    after_commit(publish)
+
+
+def refresh_indexes():
+    """Reload every subscribed index from catalog_product."""
+    if not _listeners:
+        return
+    rows = load_rows()
+    for index in _listeners:
+        index.load(rows)
+
+
+def _verify_forever(app):
+    while True:
+        time.sleep(CATALOG_CONFIG['verify_interval'])
+        try:
+            with app.app_context():
+                report = verify()
+            if report['drifted_count'] or report['removed']:
+                app.logger.warning("catalog check repaired %s drifted and %s removed products",
+                                   report['drifted_count'], report['removed'])
+        except Exception:
+            app.logger.exception("catalog check failed")
+
+
+def _refresh_forever(app):
+    while True:
+        time.sleep(CATALOG_CONFIG['index_refresh'])
+        try:
+            with app.app_context():
+                refresh_indexes()
+        except Exception:
+            app.logger.exception("catalog index refresh failed")
+
+
+def encode_cursor(row, sort):
+    column = SORTS[sort][0]
+    key = [str(row[column]) if column else None, row['ProductID']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """[sort value, ProductID] from a page cursor, or None if it is unusable."""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return key[0], int(key[1])
+    except (ValueError, TypeError, IndexError):
+        return None
+
+
+def page(category=None, season=None, farmer_id=None, min_price=None, max_price=None,
+         in_stock=False, sort='newest', cursor=None, limit=24):
+    """
+    One page of shop rows and the cursor of the next page (None on the last
+    page). Filters and ordering run in SQL on indexed columns, and the cursor
+    resumes after the last row seen, so page N costs the same as page 1.
+    """
+    if sort not in SORTS:
+        sort = 'newest'
+    column, direction = SORTS[sort]
+    where, params = [], []
+    if category and category.lower() != 'all':
+        where.append("CategoryName = %s"); params.append(category)
+    if season and season.lower() != 'all':
+        # year-round produce belongs to every season, as in the shop's season buttons
+        where.append("""EXISTS (SELECT 1 FROM product_season ps JOIN season s ON ps.SeasonID = s.SeasonID
+                                WHERE ps.ProductID = catalog_product.ProductID
+                                AND s.SeasonName IN (%s, 'Year-Round'))""")
+        params.append(season)
+    if farmer_id:
+        where.append("FarmerID = %s"); params.append(farmer_id)
+    if min_price is not None:
+        where.append("Price >= %s"); params.append(min_price)
+    if max_price is not None:
+        where.append("Price <= %s"); params.append(max_price)
+    if in_stock:
+        where.append("QuantityAvailable > 0")
+
+    key = decode_cursor(cursor)
+    op = '>' if direction == 'ASC' else '<'
+    if key:
+        value, last_id = key
+        if column:
+            where.append(f"({column} {op} %s OR ({column} = %s AND ProductID {op} %s))")
+            params += [value, value, last_id]
+        else:
+            where.append(f"ProductID {op} %s"); params.append(last_id)
+
+    q = f"SELECT {SHOP_COLUMNS} FROM catalog_product"
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    q += f" ORDER BY {column} {direction}, ProductID {direction}" if column else f" ORDER BY ProductID {direction}"
+    q += " LIMIT %s"
+    params.append(limit + 1)
+
+    rows = fetchall(q, tuple(params), cache=True)
+    next_cursor = encode_cursor(rows[limit - 1], sort) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def rows(product_ids):
+    """Shop rows for the given products, in the order the IDs were given."""
+    found = fetch_by_ids(f"SELECT {SHOP_COLUMNS} FROM catalog_product WHERE ProductID IN ({{ids}})",
+                         product_ids, 'ProductID')
+    return [found[pid] for pid in product_ids if pid in found]
+
+
+def init_app(app):
+    """Create and prepare the catalog table, load the in-process indexes and start the background jobs."""
+    global _refresher, _checker
+    with app.app_context():
+        ensure_schema()
+        prepare()
+        refresh_indexes()
+    if _listeners and _refresher is None:
+        _refresher = threading.Thread(target=_refresh_forever, args=(app,),
+                                      name="catalog-index-refresh", daemon=True)
+        _refresher.start()
+    if _checker is None and CATALOG_CONFIG['verify_interval']:
+        _checker = threading.Thread(target=_verify_forever, args=(app,),
+                                    name="catalog-check", daemon=True)
+        _checker.start()
@@ -1,6 +1,8 @@
 # Database Configuration
 # Update these settings to match your MySQL setup
 
+import os
+
 DB_CONFIG = {
     'host': 'localhost',
     'database': 'localfarmermanagement',
@@ -8,6 +10,112 @@ DB_CONFIG = {
     'password': ''  # Add your MySQL password here
 }
 
+# Connection Pool Settings (per worker process)
+POOL_CONFIG = {
+    'min_size': 2,           # connections opened at startup and kept while idle
+    'max_size': 5,           # connections kept open for reuse
+    'max_overflow': 5,       # extra connections allowed under burst, closed on return
+    'timeout': 10,           # seconds a caller waits for a free connection
+    'recycle': 1800,         # reopen connections older than this (seconds)
+    'pre_ping_after': 30,    # ping connections idle longer than this before reuse
+    'idle_timeout': 300      # close idle connections above min_size after this
+}
+
+# Query Result Cache Settings (per worker process)
+CACHE_CONFIG = {
+    'max_entries': 512,      # LRU bound on cached query results
+    'ttl': 60                # seconds before a cached result is re-read
+}
+
+# Inventory Reservation Settings (per worker process)
+RESERVATION_CONFIG = {
+    'cart_ttl': 600,         # seconds an add-to-cart hold lasts
+    'checkout_ttl': 300,     # minimum hold left once checkout starts
+    'sweep_interval': 15     # seconds between expired-hold sweeps
+}
+
+# Order Intake Settings
+ORDER_CONFIG = {
+    'intake_mode': 'sync',   # 'sync' commits in the request; 'queued' uses group commit
+    'workers': 2,            # queue worker threads per process
+    'batch_size': 20,        # most orders committed in one transaction
+    'max_wait': 0.05,        # seconds a worker waits to fill a batch
+    'max_queue': 1000,       # pending orders before new ones are turned away
+    'result_ttl': 600        # seconds an order token stays pollable
+}
+
+# Cart Settings
+CART_CONFIG = {
+    'backend': 'mysql',      # 'mysql' (cart_item table) or 'memory' (single-process dev only)
+    'lru_size': 5000,        # carts cached per worker process
+    'lru_ttl': 30,           # seconds a cached cart is served before re-reading the backend
+    'retention_days': 30     # carts untouched this long are purged at startup
+}
+
+# Invoice Cache Settings (memory tier is per worker process)
+INVOICE_CONFIG = {
+    'memory_bytes': 32 * 1024 * 1024,    # rendered PDFs kept in memory
+    'disk_dir': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'invoices')
+}
+
+# PDF Render Settings (per worker process)
+RENDER_CONFIG = {
+    'mode': 'process',       # 'process' renders in a worker pool; 'inline' on the request thread
+    'workers': 2,            # render processes
+    'max_pending': 8,        # documents rendering or queued before new requests get a 503
+    'wait_timeout': 5,       # seconds a request waits before handing back a job to poll
+    'result_ttl': 300        # seconds a finished job stays downloadable
+}
+
+# Catalog Settings
+CATALOG_CONFIG = {
+    'index_refresh': 300,    # seconds between full reloads of in-process catalog indexes
+    'verify_interval': 900   # seconds between checks of catalog_product against the source tables (0 = off)
+}
+
+# Loyalty Settings (per worker process)
+LOYALTY_CONFIG = {
+    'api_max_age': 30,           # seconds browsers may reuse a loyalty-points response
+    'reconcile_interval': 3600   # seconds between ledger checks against order history (0 = off)
+}
+
+# Farmer Dashboard Settings (per worker process)
+FARMER_STATS_CONFIG = {
+    'verify_interval': 900       # seconds between checks of the snapshots against a full recompute (0 = off)
+}
+
+# Demand Forecast Settings (per worker process)
+FORECAST_CONFIG = {
+    'history_days': 56,      # days of sales a fresh fit starts from (rounded down to whole weeks)
+    'alpha': 0.3,            # level smoothing: higher follows recent days more closely
+    'gamma': 0.1,            # day-of-week pattern smoothing
+    'horizon_days': 60,      # days ahead the forecast looks for days of cover
+    'cover_days': 14,        # days of demand a suggested restock should cover
+    'service_z': 1.65,       # safety stock in forecast errors (1.65 ~ 95% of periods without a stockout)
+    'refit_days': 7,         # days of incremental updates before a fit starts over
+    'max_farmers': 256       # farmers whose fits are cached
+}
+
+# Low-Stock Alert Settings (per worker process)
+STOCK_ALERT_CONFIG = {
+    'default_threshold': 10,     # units at or below which a product counts as low, unless the farmer set its own
+    'reload_interval': 60        # seconds between reloads of the low-stock set (picks up other workers' writes)
+}
+
+# Platform Counter Settings (per worker process)
+PLATFORM_CONFIG = {
+    'cache_ttl': 10,             # seconds a worker reuses the admin dashboard totals
+    'slots': 8,                  # rows per counter, so concurrent orders do not contend on one row
+    'check_interval': 3600       # seconds between checks of the counters against the source tables (0 = off)
+}
+
+# Bulk Product Import Settings
+IMPORT_CONFIG = {
+    'chunk_size': 500,       # rows written per transaction
+    'max_rows': 20000,       # rows read from one upload; the rest are reported as skipped
+    'max_errors': 200        # row errors listed in the report (all are counted)
+}
+
 # Application Settings
 APP_CONFIG = {
     'title': 'FarmConnect',
@@ -0,0 +1,3 @@
+# test_registration.py and test_shop_query.py are manual checks against a
+# live MySQL database; run them directly with python
+collect_ignore = ['test_registration.py', 'test_shop_query.py']
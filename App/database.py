@@ -2,150 +2,686 @@
 database.py
 Utility functions to interact with MySQL using mysql-connector with pooling.
 Wraps stored procedures and functions from your schema (see local SQL dump).
+
+Inside a Flask app context every helper shares one pooled connection, bound on
+first use and handed back by release_conn() at teardown, so a request costs a
+single pool checkout however many queries it runs. Outside an app context each
+helper checks out and returns its own connection as before.
 """
 
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+
 import mysql.connector
-from mysql.connector import pooling
-from config import DB_CONFIG
+from mysql.connector import errorcode
+from mysql.connector.errors import PoolError
+from flask import g, has_app_context
+from config import DB_CONFIG, POOL_CONFIG, CACHE_CONFIG
+
+log = logging.getLogger(__name__)
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection frees up within the pool timeout."""
+
+
+class PooledConnection:
+    """Proxy for a pooled connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, cnx, created):
+        self._pool = pool
+        self._cnx = cnx
+        self._created = created
+
+    def __getattr__(self, name):
+        return getattr(self._cnx, name)
+
+    def close(self):
+        if self._cnx is None:
+            return
+        cnx, self._cnx = self._cnx, None
+        self._pool._release(cnx, self._created)
+
+
+class ConnectionPool:
+    """
+    Elastic connection pool: keeps between min_size and max_size connections
+    open, lets up to max_overflow extra connections exist during bursts, and
+    makes callers wait up to `timeout` seconds instead of failing outright
+    when everything is checked out.
+    """
+
+    def __init__(self, min_size=2, max_size=5, max_overflow=5, timeout=10,
+                 recycle=1800, pre_ping_after=30, idle_timeout=300, **db_config):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping_after = pre_ping_after
+        self.idle_timeout = idle_timeout
+        self._db_config = db_config
+        self._cond = threading.Condition()
+        self._idle = deque()  # (cnx, created, last_used), most recent on the right
+        self._size = 0        # open connections, idle + checked out
+        self._in_use = 0
+        self._waiting = 0
+        self._waits = deque(maxlen=1000)
+        self._counters = {'checkouts': 0, 'waited': 0, 'exhausted': 0,
+                          'opened': 0, 'recycled': 0, 'broken': 0}
+        self._peak_in_use = 0
+
+    def _connect(self):
+        cnx = mysql.connector.connect(**self._db_config)
+        self._counters['opened'] += 1
+        return cnx
+
+    @staticmethod
+    def _close_quietly(cnx):
+        try:
+            cnx.close()
+        except mysql.connector.Error:
+            pass
+
+    def warm(self):
+        """Open connections up to min_size."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                cnx = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            now = time.monotonic()
+            with self._cond:
+                self._idle.append((cnx, now, now))
+                self._cond.notify()
+
+    def get_connection(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        cnx = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    cnx, created, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size + self.max_overflow:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['exhausted'] += 1
+                    raise PoolTimeout(
+                        f"No connection available within {timeout}s "
+                        f"({self._in_use} in use, max {self.max_size + self.max_overflow})")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            waited = time.monotonic() - start
+            self._waits.append(waited)
+            self._counters['checkouts'] += 1
+            if waited > 0.001:
+                self._counters['waited'] += 1
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+        try:
+            now = time.monotonic()
+            if cnx is None:
+                cnx, created = self._connect(), now
+            elif now - created > self.recycle:
+                self._close_quietly(cnx)
+                self._counters['recycled'] += 1
+                cnx, created = self._connect(), now
+            elif now - last_used > self.pre_ping_after:
+                try:
+                    cnx.ping(reconnect=False)
+                except mysql.connector.Error:
+                    self._close_quietly(cnx)
+                    self._counters['broken'] += 1
+                    cnx, created = self._connect(), now
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, cnx, created)
+
+    def _release(self, cnx, created):
+        healthy = True
+        try:
+            if cnx.in_transaction:
+                cnx.rollback()
+        except mysql.connector.Error:
+            healthy = False
+        now = time.monotonic()
+        to_close = []
+        with self._cond:
+            self._in_use -= 1
+            if healthy and self._size <= self.max_size:
+                self._idle.append((cnx, created, now))
+            else:
+                # overflow or broken connection: don't keep it around
+                self._size -= 1
+                to_close.append(cnx)
+            # shrink back towards min_size once the burst has passed
+            while (self._idle and self._size > self.min_size
+                   and now - self._idle[0][2] > self.idle_timeout):
+                to_close.append(self._idle.popleft()[0])
+                self._size -= 1
+            self._cond.notify()
+        for c in to_close:
+            self._close_quietly(c)
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            stats = {
+                'pid': os.getpid(),
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'overflow': max(0, self._size - self.max_size),
+                'peak_in_use': self._peak_in_use,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'max_overflow': self.max_overflow,
+            }
+            stats.update(self._counters)
+
+        def pct(p):
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2)
+
+        stats['wait_ms'] = {'p50': pct(0.50), 'p95': pct(0.95), 'p99': pct(0.99),
+                            'max': round(waits[-1] * 1000, 2) if waits else 0.0}
+        return stats
+
+
+# Tables read through views / stored routines, and tables written by procedures
+# and triggers, so cached results can be tied to the base tables they depend on.
+READ_DEPENDENCIES = {
+    'v_productdetails': {'product', 'category', 'farmer', 'review'},
+    'getseasonalproducts': {'product', 'season', 'product_season', 'category', 'farmer', 'review'},
+}
+WRITE_PROCEDURES = {
+    'placeorder': {'orders', 'order_product', 'product'},
+    'updateorderstatus': {'orders'},
+    'addproductreview': {'review'},
+}
+TRIGGER_WRITES = {
+    'product': {'product_price_audit'},
+}
+
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?", re.IGNORECASE)
+_WRITE_TABLES = re.compile(
+    r"\b(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)\s+`?(\w+)`?",
+    re.IGNORECASE)
+
+def _expand(tables, mapping):
+    expanded = set(tables)
+    for t in tables:
+        expanded |= mapping.get(t, set())
+    return expanded
+
+def read_tables(query):
+    return _expand({t.lower() for t in _READ_TABLES.findall(query)}, READ_DEPENDENCIES)
+
+def written_tables(query):
+    return _expand({t.lower() for t in _WRITE_TABLES.findall(query)}, TRIGGER_WRITES)
 
-pool = pooling.MySQLConnectionPool(
-    pool_name="lfm_pool",
-    pool_size=5,
-    **DB_CONFIG
-)
+
+class QueryCache:
+    """
+    LRU + TTL cache of query results keyed by (SQL, params). Each entry
+    records the tables it was read from; a write to any of those tables
+    drops the entry.
+    """
+
+    def __init__(self, max_entries=512, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires, tables, value)
+        self._by_table = defaultdict(set)
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0,
+                          'expired': 0, 'invalidations': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return False, None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self._counters['expired'] += 1
+                self._counters['misses'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return True, entry[2]
+
+    def put(self, key, tables, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (expires, tables, value)
+            for t in tables:
+                self._by_table[t].add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+
+    def _drop(self, key):
+        _, tables, _ = self._entries.pop(key)
+        for t in tables:
+            keys = self._by_table.get(t)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[t]
+
+    def invalidate(self, tables):
+        with self._lock:
+            for t in tables:
+                for key in list(self._by_table.get(t, ())):
+                    self._drop(key)
+                    self._counters['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters, entries=len(self._entries),
+                         max_entries=self.max_entries, ttl=self.ttl)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+pool = ConnectionPool(**POOL_CONFIG, **DB_CONFIG)
+query_cache = QueryCache(**CACHE_CONFIG)
+
+# holds the bound connection for code running outside an app context
+_local = threading.local()
 
 def get_conn():
+    """Check out a dedicated connection. The caller must close() it."""
     return pool.get_connection()
 
-def fetchone(query, params=None):
-    cnx = get_conn()
-    cursor = cnx.cursor(dictionary=True)
-    cursor.execute(query, params or ())
-    row = cursor.fetchone()
-    cursor.close()
-    cnx.close()
-    return row
+def _scope():
+    return g if has_app_context() else _local
+
+def in_transaction():
+    return getattr(_scope(), 'lfm_tx', False)
 
-def fetchall(query, params=None):
+@contextmanager
+def _cursor(dictionary=False):
+    """Yield (connection, cursor) on the connection bound to the current scope."""
+    scope = _scope()
+    cnx = getattr(scope, 'lfm_cnx', None)
+    owned = False
+    if cnx is None:
+        cnx = get_conn()
+        if has_app_context():
+            scope.lfm_cnx = cnx  # reused until release_conn() at teardown
+        else:
+            owned = True
+    cursor = cnx.cursor(dictionary=dictionary)
+    try:
+        yield cnx, cursor
+    finally:
+        cursor.close()
+        if owned:
+            cnx.close()
+
+def _commit(cnx):
+    # statements inside transaction() are committed together when it exits
+    if not in_transaction():
+        cnx.commit()
+
+def invalidate_tables(*tables):
+    """Drop cached results that read any of `tables`."""
+    tables = {t.lower() for t in tables}
+    query_cache.invalidate(tables)
+    if in_transaction():
+        # other requests may re-cache pre-commit rows; drop them again on commit
+        _scope().lfm_tx_tables |= tables
+
+def _cache_key(kind, query, params):
+    return (kind, query, tuple(params) if params else ())
+
+def _cached(kind, query, params, tables, load):
+    # reads inside a transaction must see its own uncommitted writes
+    if in_transaction():
+        return load()
+    key = _cache_key(kind, query, params)
+    found, value = query_cache.get(key)
+    if not found:
+        value = load()
+        query_cache.put(key, tables, value)
+    return _copy_rows(value)
+
+def _copy_rows(value):
+    # callers decorate rows in place, so never hand out the cached objects
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return [_copy_rows(v) for v in value]
+    return value
+
+@contextmanager
+def transaction():
+    """
+    Run the enclosed helpers as one unit of work: they share a connection and
+    are committed together on exit, or rolled back if the block raises.
+    Nested calls join the outer transaction.
+    """
+    scope = _scope()
+    if in_transaction():
+        yield scope.lfm_cnx
+        return
+    cnx = getattr(scope, 'lfm_cnx', None)
+    owned = cnx is None
+    if owned:
+        cnx = get_conn()
+        scope.lfm_cnx = cnx
+    elif cnx.in_transaction:
+        # end the read snapshot left open by earlier queries in this request
+        cnx.commit()
+    scope.lfm_tx = True
+    scope.lfm_tx_tables = set()
+    scope.lfm_after_commit = []
+    try:
+        yield cnx
+        cnx.commit()
+    except Exception:
+        cnx.rollback()
+        raise
+    finally:
+        tables, callbacks = scope.lfm_tx_tables, scope.lfm_after_commit
+        scope.lfm_tx = False
+        scope.lfm_tx_tables = set()
+        scope.lfm_after_commit = []
+        if owned and not has_app_context():
+            scope.lfm_cnx = None
+            cnx.close()
+    # only reached once the commit went through: the write stands whatever
+    # happens below, so failures here are logged rather than raised
+    try:
+        query_cache.invalidate(tables)
+    except Exception:
+        log.exception("query cache invalidation after commit failed")
+    for fn in callbacks:
+        try:
+            fn()
+        except Exception:
+            log.exception("after-commit callback %r failed", fn)
+
+def after_commit(fn):
+    """Run fn once the current transaction commits (right away outside one)."""
+    if in_transaction():
+        _scope().lfm_after_commit.append(fn)
+    else:
+        fn()
+
+def release_conn(exc=None):
+    """Return the request's bound connection to the pool (teardown handler)."""
+    cnx = g.pop('lfm_cnx', None)
+    g.pop('lfm_tx', None)
+    if cnx is None:
+        return
+    try:
+        if cnx.in_transaction:
+            cnx.rollback()
+    finally:
+        cnx.close()
+
+def init_app(app):
+    pool.warm()
+    app.teardown_appcontext(release_conn)
+
+def pool_stats():
+    return pool.stats()
+
+def cache_stats():
+    return query_cache.stats()
+
+def _fetchone(query, params):
+    with _cursor(dictionary=True) as (cnx, cursor):
+        cursor.execute(query, params or ())
+        row = cursor.fetchone()
+        # drain anything left so the shared connection stays usable
+        cursor.fetchall()
+        return row
+
+def _fetchall(query, params):
+    with _cursor(dictionary=True) as (cnx, cursor):
+        cursor.execute(query, params or ())
+        return cursor.fetchall()
+
+def fetchone(query, params=None, cache=False):
+    if cache:
+        return _cached('one', query, params, read_tables(query),
+                       lambda: _fetchone(query, params))
+    return _fetchone(query, params)
+
+def fetchall(query, params=None, cache=False):
+    if cache:
+        return _cached('all', query, params, read_tables(query),
+                       lambda: _fetchall(query, params))
+    return _fetchall(query, params)
+
+def stream(query, params=None, batch_size=500):
+    """
+    Yield rows of a large result one batch at a time from an unbuffered
+    cursor on a dedicated connection, so memory stays flat however many rows
+    match. Safe to consume after the request has ended (e.g. from a
+    streamed response); abandoning the generator early discards the
+    connection rather than reading out the rest of the result.
+    """
     cnx = get_conn()
     cursor = cnx.cursor(dictionary=True)
-    cursor.execute(query, params or ())
-    rows = cursor.fetchall()
-    cursor.close()
-    cnx.close()
+    try:
+        cursor.execute(query, params or ())
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            pass  # unread rows left behind; the pool drops the connection
+        cnx.close()
+
+def ensure_index(table, name, columns):
+    """
+    Create index `name` on `table` unless it already exists. Worker
+    processes starting together may race to create it; losing that race
+    is fine.
+    """
+    exists = fetchone("""
+        SELECT 1 AS present FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, name))
+    if not exists:
+        try:
+            execute(f"CREATE INDEX {name} ON {table} ({columns})")
+        except mysql.connector.Error as e:
+            if e.errno != errorcode.ER_DUP_KEYNAME:
+                raise
+
+def fetch_by_ids(query, ids, key, chunk_size=500):
+    """
+    Resolve a set of IDs with one `IN (...)` query per chunk and return
+    {id: row}. `query` holds an `{ids}` placeholder for the IN list, e.g.
+    "SELECT ... FROM product WHERE ProductID IN ({ids})".
+    """
+    ids = sorted({int(i) for i in ids})
+    rows = {}
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        q = query.format(ids=", ".join(["%s"] * len(chunk)))
+        for row in fetchall(q, tuple(chunk)):
+            rows[row[key]] = row
     return rows
 
+def get_products_by_ids(ids, columns="ProductID, Name, Price, QuantityAvailable"):
+    """Batched product lookup: {ProductID: row} for every ID that exists."""
+    return fetch_by_ids(f"SELECT {columns} FROM Product WHERE ProductID IN ({{ids}})",
+                        ids, 'ProductID')
+
+def _run(query, params=None, many=False):
+    with _cursor() as (cnx, cursor):
+        if many:
+            cursor.executemany(query, params)
+        else:
+            cursor.execute(query, params or ())
+        _commit(cnx)
+        invalidate_tables(*written_tables(query))
+        return cursor.lastrowid, cursor.rowcount
+
 def execute(query, params=None):
-    cnx = get_conn()
-    cursor = cnx.cursor()
-    cursor.execute(query, params or ())
-    cnx.commit()
-    lastrowid = cursor.lastrowid
-    cursor.close()
-    cnx.close()
-    return lastrowid
-
-def call_proc(procname, args=()):
-    cnx = get_conn()
-    cursor = cnx.cursor(dictionary=True)
-    res = cursor.callproc(procname, args)
-    # for stored procs returning result sets:
-    results = []
-    for result in cursor.stored_results():
-        results.append(result.fetchall())
-    cursor.close()
-    cnx.close()
-    return results or res
+    return _run(query, params)[0]
+
+def execute_rowcount(query, params=None):
+    """Like execute() but returns the number of affected rows."""
+    return _run(query, params)[1]
+
+def executemany(query, seq_params):
+    """Run one statement for every parameter tuple; returns affected rows."""
+    seq_params = list(seq_params)
+    if not seq_params:
+        return 0
+    return _run(query, seq_params, many=True)[1]
+
+def insert_many(query, seq_params):
+    """
+    Multi-row INSERT into an AUTO_INCREMENT table; returns the new IDs in
+    parameter order. The connector sends the rows as one INSERT ... VALUES
+    statement, whose IDs InnoDB allocates as one consecutive run.
+    """
+    seq_params = list(seq_params)
+    if not seq_params:
+        return []
+    first_id, rowcount = _run(query, seq_params, many=True)
+    if rowcount != len(seq_params):
+        raise RuntimeError(f"insert_many: expected {len(seq_params)} rows, inserted {rowcount}")
+    step = fetchone("SELECT @@auto_increment_increment AS step")['step']
+    return [first_id + i * step for i in range(rowcount)]
+
+def _call_proc(procname, args):
+    with _cursor(dictionary=True) as (cnx, cursor):
+        res = cursor.callproc(procname, args)
+        # for stored procs returning result sets:
+        results = []
+        for result in cursor.stored_results():
+            results.append(result.fetchall())
+        _commit_proc(cnx, procname)
+        return results or res
+
+def _commit_proc(cnx, procname):
+    tables = WRITE_PROCEDURES.get(procname.lower())
+    if tables:
+        _commit(cnx)
+        invalidate_tables(*tables)
+
+def call_proc(procname, args=(), cache=False):
+    if cache:
+        tables = READ_DEPENDENCIES.get(procname.lower(), set())
+        return _cached('proc', procname, args, tables,
+                       lambda: _call_proc(procname, args))
+    return _call_proc(procname, args)
 
 # Convenience wrappers for your DB functions / procs:
 
 def calculate_order_total(order_id):
-    cnx = get_conn()
-    cursor = cnx.cursor()
-    cursor.execute("SELECT CalculateOrderTotal(%s) AS total", (order_id,))
-    r = cursor.fetchone()
-    cursor.close()
-    cnx.close()
-    return r[0] if r else 0.0
+    with _cursor() as (cnx, cursor):
+        cursor.execute("SELECT CalculateOrderTotal(%s) AS total", (order_id,))
+        r = cursor.fetchone()
+        return r[0] if r else 0.0
 
 def get_farmer_report(farmer_id):
     # Calls GetFarmerReport which returns 2 result sets.
-    cnx = get_conn()
-    cursor = cnx.cursor(dictionary=True)
-    cursor.callproc('GetFarmerReport', (farmer_id,))
-    reports = []
-    for result in cursor.stored_results():
-        reports.append(result.fetchall())
-    cursor.close()
-    cnx.close()
-    return reports  # [overview_rows, product_rows]
+    with _cursor(dictionary=True) as (cnx, cursor):
+        cursor.callproc('GetFarmerReport', (farmer_id,))
+        reports = []
+        for result in cursor.stored_results():
+            reports.append(result.fetchall())
+        return reports  # [overview_rows, product_rows]
 
 def place_order_proc(customer_id, product_id, quantity):
-    cnx = get_conn()
-    cursor = cnx.cursor()
-    # prepare out parameter
-    # mysql-connector doesn't support OUT variables directly via callproc return; use work-around
-    cursor.callproc('PlaceOrder', (customer_id, product_id, quantity, 0))
-    # fetch order id from last insert
-    cnx.commit()
-    order_id = None
-    cursor.execute("SELECT LAST_INSERT_ID()")
-    order_id = cursor.fetchone()[0]
-    cursor.close()
-    cnx.close()
-    return order_id
+    with _cursor() as (cnx, cursor):
+        # prepare out parameter
+        # mysql-connector doesn't support OUT variables directly via callproc return; use work-around
+        cursor.callproc('PlaceOrder', (customer_id, product_id, quantity, 0))
+        # fetch order id from last insert
+        _commit_proc(cnx, 'PlaceOrder')
+        cursor.execute("SELECT LAST_INSERT_ID()")
+        return cursor.fetchone()[0]
 
 def add_product_review(customer_id, product_id, rating, comment):
-    cnx = get_conn()
-    cursor = cnx.cursor(dictionary=True)
-    try:
-        cursor.callproc('AddProductReview', (customer_id, product_id, rating, comment))
-        # read any resultsets
-        results = []
-        for res in cursor.stored_results():
-            results.append(res.fetchall())
-        cnx.commit()
-        return {'success': True, 'results': results}
-    except mysql.connector.Error as e:
-        cnx.rollback()
-        return {'success': False, 'error': str(e)}
-    finally:
-        cursor.close()
-        cnx.close()
+    with _cursor(dictionary=True) as (cnx, cursor):
+        try:
+            cursor.callproc('AddProductReview', (customer_id, product_id, rating, comment))
+            # read any resultsets
+            results = []
+            for res in cursor.stored_results():
+                results.append(res.fetchall())
+            _commit_proc(cnx, 'AddProductReview')
+            return {'success': True, 'results': results}
+        except mysql.connector.Error as e:
+            if in_transaction():
+                raise
+            cnx.rollback()
+            return {'success': False, 'error': str(e)}
 
 def get_customer_loyalty_points(customer_id):
     """Get loyalty points for a customer using GetCustomerLoyaltyPoints function"""
-    cnx = get_conn()
-    cursor = cnx.cursor()
-    cursor.execute("SELECT GetCustomerLoyaltyPoints(%s) AS points", (customer_id,))
-    r = cursor.fetchone()
-    cursor.close()
-    cnx.close()
-    return r[0] if r else 0
+    with _cursor() as (cnx, cursor):
+        cursor.execute("SELECT GetCustomerLoyaltyPoints(%s) AS points", (customer_id,))
+        r = cursor.fetchone()
+        return r[0] if r else 0
 
 def get_seasonal_products(season_name=None):
-    """Get seasonal products using GetSeasonalProducts stored procedure"""
-    cnx = get_conn()
-    cursor = cnx.cursor(dictionary=True)
-    cursor.callproc('GetSeasonalProducts', (season_name,))
-    products = []
-    for result in cursor.stored_results():
-        products = result.fetchall()
-    cursor.close()
-    cnx.close()
-    return products
+    """Get seasonal products using GetSeasonalProducts stored procedure (cached)"""
+    results = call_proc('GetSeasonalProducts', (season_name,), cache=True)
+    # the procedure's product list is its last result set
+    return results[-1] if results and isinstance(results[-1], list) else []
 
 def update_order_status(order_id, new_status):
     """Update order status using UpdateOrderStatus stored procedure"""
-    cnx = get_conn()
-    cursor = cnx.cursor()
-    try:
-        cursor.callproc('UpdateOrderStatus', (order_id, new_status))
-        cnx.commit()
-        return {'success': True, 'message': 'Order status updated successfully'}
-    except mysql.connector.Error as e:
-        cnx.rollback()
-        return {'success': False, 'error': str(e)}
-    finally:
-        cursor.close()
-        cnx.close()
+    with _cursor() as (cnx, cursor):
+        try:
+            cursor.callproc('UpdateOrderStatus', (order_id, new_status))
+            _commit_proc(cnx, 'UpdateOrderStatus')
+            return {'success': True, 'message': 'Order status updated successfully'}
+        except mysql.connector.Error as e:
+            if in_transaction():
+                raise
+            cnx.rollback()
+            return {'success': False, 'error': str(e)}
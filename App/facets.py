@@ -0,0 +1,202 @@
+"""
+facets.py
+In-process faceted index over catalog_product.
+
+Every facet value (category, season, farmer, price band, in stock) maps to a
+bitmap held in a Python int, with bit N set when product N carries the value.
+A shop filter is then a handful of AND/OR operations over those ints, and the
+facet counts for the same filter come from popcounts in the same pass instead
+of one COUNT query per facet. The index subscribes to catalog.py, which keeps
+it in step with product writes.
+"""
+
+import threading
+
+import catalog
+
+# "Under ₹X" bands offered by the shop's price filter
+PRICE_BANDS = (50, 100, 250, 500, 1000)
+
+# products listed under this season show up in every season filter
+YEAR_ROUND = 'year-round'
+
+FACETS = ('category', 'season', 'farmer', 'price', 'in_stock')
+
+# facets counted unless the caller asks for others; farmer counts cost one
+# popcount per farmer, so they are opt-in
+DEFAULT_COUNTS = ('category', 'season', 'price', 'in_stock')
+
+
+def _bits(ids):
+    # set bits in a byte buffer and convert once; OR-ing into an int per id
+    # would copy the whole bitmap every time
+    ids = list(ids)
+    if not ids:
+        return 0
+    buf = bytearray(max(ids) // 8 + 1)
+    for pid in ids:
+        buf[pid >> 3] |= 1 << (pid & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def _seasons(row):
+    return {s.strip().lower() for s in (row.get('SeasonName') or '').split(',') if s.strip()}
+
+
+class FacetIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.loaded = False
+        self._all = 0
+        self._bitmaps = {facet: {} for facet in FACETS}
+        self._values = {}        # product_id -> {facet: set of values}, to clear old bits
+        self._prices = {}        # product_id -> price, for ranges that aren't a band
+        self._farmer_names = {}
+
+    @staticmethod
+    def _facet_values(row):
+        price = float(row['Price'])
+        return {
+            'category': {(row.get('CategoryName') or '').lower()} - {''},
+            'season': _seasons(row),
+            'farmer': {row['FarmerID']} if row.get('FarmerID') is not None else set(),
+            'price': {band for band in PRICE_BANDS if price <= band},
+            'in_stock': {True} if (row.get('QuantityAvailable') or 0) > 0 else set(),
+        }
+
+    def _remove(self, pid):
+        bit = 1 << pid
+        for facet, values in self._values.pop(pid, {}).items():
+            bitmaps = self._bitmaps[facet]
+            for value in values:
+                bitmaps[value] &= ~bit
+                if not bitmaps[value]:
+                    del bitmaps[value]
+        self._all &= ~bit
+        self._prices.pop(pid, None)
+
+    def _add(self, row):
+        pid = int(row['ProductID'])
+        bit = 1 << pid
+        values = self._facet_values(row)
+        for facet, vals in values.items():
+            bitmaps = self._bitmaps[facet]
+            for value in vals:
+                bitmaps[value] = bitmaps.get(value, 0) | bit
+        self._values[pid] = values
+        self._all |= bit
+        self._prices[pid] = float(row['Price'])
+        if row.get('FarmerID') is not None:
+            self._farmer_names[row['FarmerID']] = row.get('FarmerName')
+
+    def load(self, rows):
+        # build the bitmaps from id lists in one go rather than bit by bit
+        ids = {facet: {} for facet in FACETS}
+        values, prices, names = {}, {}, {}
+        for row in rows:
+            pid = int(row['ProductID'])
+            values[pid] = self._facet_values(row)
+            prices[pid] = float(row['Price'])
+            for facet, vals in values[pid].items():
+                for value in vals:
+                    ids[facet].setdefault(value, []).append(pid)
+            if row.get('FarmerID') is not None:
+                names[row['FarmerID']] = row.get('FarmerName')
+        bitmaps = {facet: {value: _bits(pids) for value, pids in by_value.items()}
+                   for facet, by_value in ids.items()}
+        with self._lock:
+            self._all = _bits(values)
+            self._bitmaps = bitmaps
+            self._values = values
+            self._prices = prices
+            self._farmer_names = names
+            self.loaded = True
+
+    def apply(self, rows, removed_ids):
+        with self._lock:
+            for pid in removed_ids:
+                self._remove(int(pid))
+            for row in rows:
+                self._remove(int(row['ProductID']))
+                self._add(row)
+
+    def _selection(self, filters):
+        """{facet: bitmap} for every facet the filters constrain."""
+        selected = {}
+        category = (filters.get('category') or 'all').lower()
+        if category != 'all':
+            selected['category'] = self._bitmaps['category'].get(category, 0)
+        season = (filters.get('season') or 'all').lower()
+        if season != 'all':
+            seasons = self._bitmaps['season']
+            selected['season'] = seasons.get(season, 0) | seasons.get(YEAR_ROUND, 0)
+        if filters.get('farmer_id'):
+            selected['farmer'] = self._bitmaps['farmer'].get(int(filters['farmer_id']), 0)
+        min_price, max_price = filters.get('min_price'), filters.get('max_price')
+        if min_price is None and max_price in PRICE_BANDS:
+            selected['price'] = self._bitmaps['price'].get(int(max_price), 0)
+        elif min_price is not None or max_price is not None:
+            lo = min_price if min_price is not None else float('-inf')
+            hi = max_price if max_price is not None else float('inf')
+            selected['price'] = _bits(pid for pid, price in self._prices.items() if lo <= price <= hi)
+        if filters.get('in_stock'):
+            selected['in_stock'] = self._bitmaps['in_stock'].get(True, 0)
+        return selected
+
+    def query(self, filters, limit=0, facets=DEFAULT_COUNTS, within=None):
+        """
+        Matching product count, counts for `facets` and (up to `limit`)
+        matching IDs, newest first, for shop-style filters. Counts are disjunctive: each
+        facet is counted under every filter except its own, so the numbers
+        next to the options say what picking that option would return.
+        `within` restricts everything to the given product IDs, e.g. search
+        hits. Returns None until the index has been loaded.
+        """
+        with self._lock:
+            if not self.loaded:
+                return None
+            selected = self._selection(filters)
+            if within is not None:
+                selected['within'] = _bits(within)
+            match = self._all
+            for bm in selected.values():
+                match &= bm
+
+            counts = {}
+            for facet in facets:
+                base = self._all
+                for other, bm in selected.items():
+                    if other != facet:
+                        base &= bm
+                bitmaps = self._bitmaps[facet]
+                if facet == 'season':
+                    year_round = bitmaps.get(YEAR_ROUND, 0)
+                    counts[facet] = {v: (base & (bm | year_round)).bit_count() for v, bm in bitmaps.items()}
+                elif facet == 'in_stock':
+                    counts[facet] = (base & bitmaps.get(True, 0)).bit_count()
+                else:
+                    counts[facet] = {v: (base & bm).bit_count() for v, bm in bitmaps.items()}
+            farmer_names = {}
+            if 'farmer' in counts:
+                counts['farmer'] = {fid: n for fid, n in counts['farmer'].items() if n}
+                farmer_names = {fid: self._farmer_names.get(fid) for fid in counts['farmer']}
+
+        total = match.bit_count()
+        ids = []
+        while match and len(ids) < limit:
+            pid = match.bit_length() - 1
+            ids.append(pid)
+            match ^= 1 << pid
+        return {'total': total, 'counts': counts, 'farmer_names': farmer_names, 'ids': ids}
+
+    def stats(self):
+        with self._lock:
+            return {'loaded': self.loaded, 'products': len(self._values),
+                    'values': {facet: len(bitmaps) for facet, bitmaps in self._bitmaps.items()}}
+
+
+product_facets = FacetIndex()
+catalog.subscribe(product_facets)
@@ -0,0 +1,284 @@
+"""
+farmer_stats.py
+Per-farmer dashboard statistics snapshot.
+
+One farmer_stats row per farmer holds the farmer dashboard's figures:
+product and stock counts, orders, revenue, average rating and, in a JSON
+column, units sold and revenue per product. The dashboard renders from
+that single row (low-stock counts come from stock_alerts). Revenue is what orders were charged: the
+order lines recorded by sales_rollup, at the prices of the day. Writes
+keep it current incrementally once they commit: a placed order adds its
+units and revenue and bumps its farmers' order counts, and
+restocks, price edits, reviews and product changes re-read only the
+products they touched. A background checker recomputes every farmer's
+stats in bulk and repairs snapshots that drifted.
+"""
+
+import json
+import threading
+import time
+
+from config import FARMER_STATS_CONFIG
+from database import (execute, execute_rowcount, fetchall, fetchone, transaction,
+                      after_commit, get_products_by_ids)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS farmer_stats (
+        FarmerID INT NOT NULL PRIMARY KEY,
+        TotalProducts INT NOT NULL DEFAULT 0,
+        TotalStock INT NOT NULL DEFAULT 0,
+        TotalOrders INT NOT NULL DEFAULT 0,
+        TotalRevenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+        AvgRating DECIMAL(3,2) NOT NULL DEFAULT 0,
+        ReviewCount INT NOT NULL DEFAULT 0,
+        ProductStats JSON NOT NULL,
+        Version INT NOT NULL DEFAULT 0,
+        UpdatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+"""
+
+# columns written from a snapshot dict, in order
+COLUMNS = ('TotalProducts', 'TotalStock', 'TotalOrders', 'TotalRevenue', 'AvgRating', 'ReviewCount')
+
+# per-product figures; correlated subqueries stay on the ProductID indexes
+PRODUCT_QUERY = """
+    SELECT
+        p.FarmerID,
+        p.ProductID,
+        p.Name AS ProductName,
+        p.Price,
+        p.QuantityAvailable,
+        (SELECT COALESCE(SUM(op.Quantity), 0) FROM order_product op WHERE op.ProductID = p.ProductID) AS TotalUnitsSold,
+        (SELECT COALESCE(SUM(l.Units * l.UnitPrice), 0) FROM sales_line l WHERE l.ProductID = p.ProductID) AS ProductRevenue,
+        (SELECT COALESCE(AVG(r.Rating), 0) FROM review r WHERE r.ProductID = p.ProductID) AS AvgRating,
+        (SELECT COUNT(*) FROM review r WHERE r.ProductID = p.ProductID) AS ReviewCount
+    FROM product p
+"""
+
+ORDER_COUNT_QUERY = """
+    SELECT p.FarmerID, COUNT(DISTINCT op.OrderID) AS TotalOrders
+    FROM order_product op
+    JOIN product p ON op.ProductID = p.ProductID
+"""
+
+_checker = None
+_last_check = {}
+
+
+def ensure_schema():
+    execute(SCHEMA)
+
+
+def _entry(row):
+    return {
+        'ProductID': int(row['ProductID']),
+        'ProductName': row['ProductName'],
+        'Price': round(float(row['Price']), 2),
+        'QuantityAvailable': int(row['QuantityAvailable'] or 0),
+        'TotalUnitsSold': int(row['TotalUnitsSold'] or 0),
+        'ProductRevenue': round(float(row['ProductRevenue'] or 0), 2),
+        'AvgRating': round(float(row['AvgRating'] or 0), 2),
+        'ReviewCount': int(row['ReviewCount'] or 0),
+    }
+
+
+def _summarize(farmer_id, products, total_orders):
+    """Snapshot dict from {product_id: entry} and the farmer's order count."""
+    entries = list(products.values())
+    reviews = sum(e['ReviewCount'] for e in entries)
+    return {
+        'FarmerID': farmer_id,
+        'TotalProducts': len(entries),
+        'TotalStock': sum(e['QuantityAvailable'] for e in entries),
+        'TotalOrders': total_orders,
+        'TotalRevenue': round(sum(e['ProductRevenue'] for e in entries), 2),
+        'AvgRating': round(sum(e['AvgRating'] * e['ReviewCount'] for e in entries) / reviews, 2) if reviews else 0.0,
+        'ReviewCount': reviews,
+        'products': sorted(entries, key=lambda e: (-e['ProductRevenue'], e['ProductID'])),
+    }
+
+
+def compute(farmer_id=None):
+    """{farmer_id: snapshot} recomputed from the source tables (every farmer by default)."""
+    where, params = ("", ()) if farmer_id is None else (" WHERE p.FarmerID = %s", (farmer_id,))
+    products = {}
+    for row in fetchall(PRODUCT_QUERY + where, params):
+        products.setdefault(row['FarmerID'], {})[int(row['ProductID'])] = _entry(row)
+    orders = {r['FarmerID']: int(r['TotalOrders'])
+              for r in fetchall(ORDER_COUNT_QUERY + where + " GROUP BY p.FarmerID", params)}
+    farmer_ids = set(products) | set(orders)
+    if farmer_id is not None:
+        farmer_ids.add(farmer_id)
+    return {fid: _summarize(fid, products.get(fid, {}), orders.get(fid, 0)) for fid in farmer_ids}
+
+
+def _decode(row):
+    stats = {column: row[column] for column in COLUMNS}
+    stats['FarmerID'] = row['FarmerID']
+    stats['TotalRevenue'] = float(stats['TotalRevenue'])
+    stats['AvgRating'] = float(stats['AvgRating'])
+    stats['products'] = json.loads(row['ProductStats'])
+    return stats
+
+
+def _save(stats):
+    values = [stats[column] for column in COLUMNS] + [json.dumps(stats['products'])]
+    execute(f"""
+        INSERT INTO farmer_stats (FarmerID, {", ".join(COLUMNS)}, ProductStats)
+        VALUES (%s, {", ".join(["%s"] * (len(COLUMNS) + 1))})
+        ON DUPLICATE KEY UPDATE {", ".join(f"{c} = VALUES({c})" for c in COLUMNS)},
+            ProductStats = VALUES(ProductStats), Version = Version + 1
+    """, tuple([stats['FarmerID']] + values))
+
+
+def refresh(farmer_id):
+    """Recompute and store one farmer's snapshot; returns it."""
+    stats = compute(farmer_id)[farmer_id]
+    _save(stats)
+    return stats
+
+
+def _modify(farmer_id, change):
+    """Apply change(products, stats) to a stored snapshot under a row lock."""
+    with transaction():
+        row = fetchone("SELECT * FROM farmer_stats WHERE FarmerID = %s FOR UPDATE", (farmer_id,))
+        if row is None:
+            refresh(farmer_id)
+            return
+        stats = _decode(row)
+        products = {e['ProductID']: e for e in stats['products']}
+        change(products, stats)
+        _save(_summarize(farmer_id, products, stats['TotalOrders']))
+
+
+def _after_commit(fn):
+    def run():
+        try:
+            fn()
+        except Exception:
+            pass   # the write is committed; the background check repairs the snapshot
+    after_commit(run)
+
+
+def record_order(lines, prices):
+    """
+    Count a placed order ({product_id: quantity}, charged {product_id:
+    unit price}) towards its farmers' stats.
+    """
+    def apply():
+        products = get_products_by_ids(lines, "ProductID, FarmerID, QuantityAvailable")
+        by_farmer = {}
+        for pid, qty in lines.items():
+            if pid in products:
+                by_farmer.setdefault(products[pid]['FarmerID'], {})[pid] = qty
+
+        for farmer_id, sold in by_farmer.items():
+            def change(entries, stats, sold=sold):
+                for pid, qty in sold.items():
+                    entry = entries.get(pid)
+                    if entry is not None:
+                        entry['TotalUnitsSold'] += qty
+                        entry['ProductRevenue'] = round(entry['ProductRevenue'] + qty * float(prices[pid]), 2)
+                        entry['QuantityAvailable'] = int(products[pid]['QuantityAvailable'])
+                stats['TotalOrders'] += 1
+            _modify(farmer_id, change)
+    _after_commit(apply)
+
+
+def products_changed(product_ids, farmer_id=None):
+    """
+    Re-read the given products (restock, price edit, review, new product)
+    into their farmers' snapshots. Pass the farmer for deleted products,
+    whose rows are gone.
+    """
+    product_ids = sorted({int(pid) for pid in product_ids})
+
+    def apply():
+        rows = fetchall(PRODUCT_QUERY + f" WHERE p.ProductID IN ({', '.join(['%s'] * len(product_ids))})",
+                        tuple(product_ids)) if product_ids else []
+        by_farmer = {}
+        for row in rows:
+            by_farmer.setdefault(row['FarmerID'], []).append(_entry(row))
+        if len(rows) < len(product_ids) and farmer_id is not None:
+            # a deleted product can take orders out of the count: recompute
+            refresh(farmer_id)
+            by_farmer.pop(farmer_id, None)
+        for fid, entries in by_farmer.items():
+            def change(products, stats, entries=entries):
+                for entry in entries:
+                    products[entry['ProductID']] = entry
+            _modify(fid, change)
+    _after_commit(apply)
+
+
+def snapshot(farmer_id):
+    """The farmer's stored stats, creating them on first use."""
+    row = fetchone("SELECT * FROM farmer_stats WHERE FarmerID = %s", (farmer_id,))
+    return _decode(row) if row else refresh(farmer_id)
+
+
+def _same(a, b):
+    return all(a[column] == b[column] for column in COLUMNS) and a['products'] == b['products']
+
+
+def verify():
+    """
+    Recompute every farmer's stats in bulk and repair stored snapshots that
+    differ. A snapshot updated while this runs is left for the next pass.
+    """
+    started = time.monotonic()
+    expected = compute()
+    stored = {r['FarmerID']: r for r in fetchall("SELECT * FROM farmer_stats")}
+    drifted, repaired = [], 0
+    for farmer_id, row in stored.items():
+        stats = expected.get(farmer_id) or _summarize(farmer_id, {}, 0)
+        if _same(_decode(row), stats):
+            continue
+        drifted.append(farmer_id)
+        values = [stats[column] for column in COLUMNS] + [json.dumps(stats['products'])]
+        # compare-and-set on the version read above
+        repaired += execute_rowcount(f"""
+            UPDATE farmer_stats SET {", ".join(f"{c} = %s" for c in COLUMNS)}, ProductStats = %s,
+                Version = Version + 1
+            WHERE FarmerID = %s AND Version = %s
+        """, tuple(values + [farmer_id, row['Version']]))
+    report = {
+        'checked': len(stored),
+        'drifted': drifted[:100],
+        'drifted_count': len(drifted),
+        'repaired': repaired,
+        'seconds': round(time.monotonic() - started, 3),
+        'finished_at': time.time(),
+    }
+    _last_check.clear()
+    _last_check.update(report)
+    return report
+
+
+def stats():
+    row = fetchone("SELECT COUNT(*) AS snapshots FROM farmer_stats")
+    return {'snapshots': row['snapshots'], 'last_check': dict(_last_check)}
+
+
+def _verify_forever(app):
+    while True:
+        time.sleep(FARMER_STATS_CONFIG['verify_interval'])
+        try:
+            with app.app_context():
+                report = verify()
+            if report['drifted_count']:
+                app.logger.warning("farmer stats check repaired %s of %s drifted snapshots",
+                                   report['repaired'], report['drifted_count'])
+        except Exception:
+            app.logger.exception("farmer stats check failed")
+
+
+def init_app(app):
+    """Create the snapshot table and start the background checker."""
+    global _checker
+    with app.app_context():
+        ensure_schema()
+    if _checker is None and FARMER_STATS_CONFIG['verify_interval']:
+        _checker = threading.Thread(target=_verify_forever, args=(app,),
+                                    name="farmer-stats-check", daemon=True)
+        _checker.start()
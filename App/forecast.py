@@ -0,0 +1,191 @@
+"""
+forecast.py
+Demand forecasts and restock suggestions for a farmer's products.
+
+Daily unit sales per product come from the sales_daily buckets kept by
+sales_rollup, in one query per farmer. All of the farmer's products are
+fitted together as rows of one NumPy matrix, with additive exponential
+smoothing: a level plus a day-of-week seasonal term. The model loops
+over days and never over products. The fitted state is cached per farmer in
+each worker process and advanced only by the days completed since the
+last fit, so a dashboard view normally costs one small query for
+yesterday's sales, or none. From the forecast and current stock come days
+of cover and a suggested restock quantity covering
+FORECAST_CONFIG['cover_days'] plus safety stock for the forecast error.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+from config import FORECAST_CONFIG
+from database import fetchall
+from sales_rollup import ALL_PRODUCTS
+
+WEEK = 7
+
+_fits = OrderedDict()    # farmer_id -> _Fit, least recently used first
+_lock = threading.Lock()
+_counters = {'hits': 0, 'full_fits': 0, 'incremental_fits': 0}
+
+
+class _Fit:
+    """Smoothing state for one farmer's products, fitted through `through` (a date)."""
+
+    def __init__(self, product_ids, level, season, sse, count, through):
+        self.product_ids = list(product_ids)
+        self.index = {pid: i for i, pid in enumerate(self.product_ids)}
+        self.level = level          # (n,)
+        self.season = season        # (n, 7), column = weekday
+        self.sse = sse              # (n,) squared one-step errors
+        self.count = count          # days fitted
+        self.through = through
+        self.steps_since_full = 0
+
+    def extend(self, product_ids):
+        """Add zero state for products first seen after the last fit."""
+        new = [pid for pid in product_ids if pid not in self.index]
+        if not new:
+            return
+        for pid in new:
+            self.index[pid] = len(self.product_ids)
+            self.product_ids.append(pid)
+        self.level = np.concatenate([self.level, np.zeros(len(new))])
+        self.season = np.vstack([self.season, np.zeros((len(new), WEEK))])
+        self.sse = np.concatenate([self.sse, np.zeros(len(new))])
+
+    def step(self, sales, first_day):
+        """Fold in a (n, days) matrix of daily units starting at first_day."""
+        alpha, gamma = FORECAST_CONFIG['alpha'], FORECAST_CONFIG['gamma']
+        weekday = first_day.weekday()
+        for t in range(sales.shape[1]):
+            w = (weekday + t) % WEEK
+            y, s = sales[:, t], self.season[:, w]
+            self.sse += (y - self.level - s) ** 2
+            self.level = alpha * (y - s) + (1 - alpha) * self.level
+            self.season[:, w] = gamma * (y - self.level) + (1 - gamma) * s
+        self.count += sales.shape[1]
+        self.through = first_day + timedelta(days=sales.shape[1] - 1)
+
+
+def _daily_sales(farmer_id, first_day, last_day):
+    """(product_ids, (n, days) units matrix) for the farmer over [first_day, last_day]."""
+    rows = fetchall("""
+        SELECT ProductID, Day, Units FROM sales_daily
+        WHERE FarmerID = %s AND ProductID <> %s AND Day BETWEEN %s AND %s
+    """, (farmer_id, ALL_PRODUCTS, first_day, last_day))
+    days = (last_day - first_day).days + 1
+    product_ids = sorted({r['ProductID'] for r in rows})
+    index = {pid: i for i, pid in enumerate(product_ids)}
+    sales = np.zeros((len(product_ids), days))
+    if rows:
+        np.add.at(sales,
+                  (np.fromiter((index[r['ProductID']] for r in rows), dtype=np.intp, count=len(rows)),
+                   np.fromiter(((r['Day'] - first_day).days for r in rows), dtype=np.intp, count=len(rows))),
+                  np.fromiter((r['Units'] for r in rows), dtype=float, count=len(rows)))
+    return product_ids, sales
+
+
+def _full_fit(farmer_id, through):
+    """Fit from scratch over the last history_days (whole weeks) ending at `through`."""
+    days = max(WEEK, FORECAST_CONFIG['history_days'] // WEEK * WEEK)
+    first_day = through - timedelta(days=days - 1)
+    product_ids, sales = _daily_sales(farmer_id, first_day, through)
+    n = len(product_ids)
+    # start from the window's mean level and mean weekday profile
+    level = sales.mean(axis=1)
+    by_weekday = sales.reshape(n, days // WEEK, WEEK).mean(axis=1) - level[:, None]
+    season = np.roll(by_weekday, first_day.weekday(), axis=1)
+    fit = _Fit(product_ids, level, season, np.zeros(n), 0, first_day - timedelta(days=1))
+    fit.step(sales, first_day)
+    return fit
+
+
+def _fit(farmer_id):
+    """The farmer's fit through yesterday, from the cache where possible."""
+    through = date.today() - timedelta(days=1)
+    with _lock:
+        fit = _fits.get(farmer_id)
+        if fit is not None:
+            _fits.move_to_end(farmer_id)
+    if fit is not None and fit.through >= through:
+        with _lock:
+            _counters['hits'] += 1
+        return fit
+
+    gap = (through - fit.through).days if fit is not None else None
+    if fit is None or gap > WEEK or fit.steps_since_full >= FORECAST_CONFIG['refit_days']:
+        # cold, long idle, or due a refit that also picks up cancellations of fitted days
+        fit = _full_fit(farmer_id, through)
+        counter = 'full_fits'
+    else:
+        product_ids, sales = _daily_sales(farmer_id, fit.through + timedelta(days=1), through)
+        new = _Fit(fit.product_ids, fit.level.copy(), fit.season.copy(), fit.sse.copy(),
+                   fit.count, fit.through)
+        new.steps_since_full = fit.steps_since_full + gap
+        new.extend(product_ids)
+        full = np.zeros((len(new.product_ids), gap))
+        if product_ids:
+            full[[new.index[pid] for pid in product_ids]] = sales
+        new.step(full, fit.through + timedelta(days=1))
+        fit, counter = new, 'incremental_fits'
+
+    with _lock:
+        _fits[farmer_id] = fit
+        _fits.move_to_end(farmer_id)
+        while len(_fits) > FORECAST_CONFIG['max_farmers']:
+            _fits.popitem(last=False)
+        _counters[counter] += 1
+    return fit
+
+
+def recommendations(farmer_id, products):
+    """
+    Forecast for the given products (dicts with ProductID, ProductName and
+    QuantityAvailable, e.g. a farmer_stats snapshot), one dict each:
+    the product fields plus DailyDemand, DaysOfCover and SuggestedRestock.
+    DaysOfCover is None when nothing is expected to sell and is capped at
+    horizon_days. Sorted by days of cover, least first.
+    """
+    if not products:
+        return []
+    fit = _fit(farmer_id)
+    horizon, cover_days = FORECAST_CONFIG['horizon_days'], FORECAST_CONFIG['cover_days']
+
+    # state rows for the requested products; products without sales read
+    # the all-zero row appended at the end (index -1)
+    rows = np.array([fit.index.get(p['ProductID'], -1) for p in products], dtype=np.intp)
+    level = np.append(fit.level, 0.0)[rows]
+    season = np.vstack([fit.season, np.zeros(WEEK)])[rows]
+    rmse = np.sqrt(np.append(fit.sse, 0.0)[rows] / max(fit.count, 1))
+    stock = np.array([p['QuantityAvailable'] for p in products], dtype=float)
+
+    # daily forecast from today on, never negative
+    weekdays = (date.today().weekday() + np.arange(horizon)) % WEEK
+    demand = np.clip(level[:, None] + season[:, weekdays], 0, None)
+    cumulative = np.cumsum(demand, axis=1)
+    days_of_cover = (cumulative < stock[:, None]).sum(axis=1)
+    sells = cumulative[:, -1] > 0
+    needed = cumulative[:, cover_days - 1] + FORECAST_CONFIG['service_z'] * rmse * np.sqrt(cover_days)
+    restock = np.where(sells, np.ceil(np.clip(needed - stock, 0, None)), 0)
+    daily = demand[:, :WEEK].mean(axis=1)
+
+    result = []
+    for i, p in enumerate(products):
+        result.append({
+            'ProductID': p['ProductID'],
+            'ProductName': p['ProductName'],
+            'QuantityAvailable': p['QuantityAvailable'],
+            'DailyDemand': round(float(daily[i]), 2),
+            'DaysOfCover': int(days_of_cover[i]) if sells[i] else None,
+            'SuggestedRestock': int(restock[i]),
+        })
+    result.sort(key=lambda r: (r['DaysOfCover'] is None, r['DaysOfCover'] or 0, -r['SuggestedRestock']))
+    return result
+
+
+def stats():
+    with _lock:
+        return dict(_counters, cached_farmers=len(_fits))
@@ -0,0 +1,240 @@
+"""
+invoices.py
+Cached invoice PDFs.
+
+An invoice is a pure function of its order rows, so rendered documents are
+stored under the order ID plus a hash of those rows (status, quantities,
+prices, names). A bounded in-memory tier sits in front of an on-disk tier;
+the hash doubles as a strong ETag so a repeat download is a 304. A changed
+order hashes differently and is simply rendered again; invalidate() drops
+the stale copies. export_zip() streams many invoices out as one archive.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, wait
+from itertools import groupby
+
+from config import INVOICE_CONFIG
+from database import fetchall, stream
+from reports import INVOICE_VERSION
+from render_service import render_service
+
+INVOICE_QUERY = """
+    SELECT 
+        o.OrderID, 
+        o.OrderDate, 
+        o.Status, 
+        o.TotalAmount,
+        op.Quantity,
+        p.Name as ProductName,
+        p.Price as UnitPrice,
+        c.Name as CustomerName,
+        c.Location as CustomerLocation,
+        c.Email as CustomerEmail,
+        f.Name as FarmerName,
+        f.Location as FarmerLocation
+    FROM orders o
+    JOIN order_product op ON o.OrderID = op.OrderID
+    JOIN product p ON op.ProductID = p.ProductID
+    JOIN customer c ON o.CustomerID = c.CustomerID
+    JOIN farmer f ON p.FarmerID = f.FarmerID
+"""
+
+
+def load_rows(order_id, customer_id=None):
+    """Invoice rows of one order; limited to the customer's own orders when given."""
+    if customer_id is None:
+        return fetchall(INVOICE_QUERY + " WHERE o.OrderID = %s", (order_id,))
+    return fetchall(INVOICE_QUERY + " WHERE o.OrderID = %s AND o.CustomerID = %s",
+                    (order_id, customer_id))
+
+
+def content_hash(order_items):
+    payload = json.dumps([INVOICE_VERSION, order_items], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+class InvoiceCache:
+    def __init__(self, memory_bytes=32 * 1024 * 1024, disk_dir=None):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self._memory = OrderedDict()   # (order_id, hash) -> pdf bytes
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'renders': 0, 'invalidations': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _path(self, order_id, digest):
+        return os.path.join(self.disk_dir, f"{order_id}-{digest}.pdf")
+
+    def _remember(self, key, pdf):
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = pdf
+            self._size += len(pdf)
+            while self._size > self.memory_bytes and self._memory:
+                _, old = self._memory.popitem(last=False)
+                self._size -= len(old)
+
+    def _read_disk(self, order_id, digest):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(order_id, digest), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, order_id, digest, pdf):
+        if not self.disk_dir:
+            return
+        # write then rename, so readers never see a half-written file
+        fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pdf)
+            os.replace(tmp, self._path(order_id, digest))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def lookup(self, order_id, digest):
+        """Cached PDF bytes for this version of the order, or None."""
+        key = (order_id, digest)
+        with self._lock:
+            pdf = self._memory.get(key)
+            if pdf is not None:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return pdf
+        pdf = self._read_disk(order_id, digest)
+        if pdf is not None:
+            with self._lock:
+                self._counters['disk_hits'] += 1
+            self._remember(key, pdf)
+        return pdf
+
+    def store(self, order_id, digest, pdf):
+        # an order only ever needs its latest rendering
+        self.invalidate(order_id, keep=digest)
+        self._write_disk(order_id, digest, pdf)
+        with self._lock:
+            self._counters['renders'] += 1
+        self._remember((order_id, digest), pdf)
+
+    def invalidate(self, order_id, keep=None):
+        """Drop cached renderings of an order (except the `keep` hash)."""
+        with self._lock:
+            for key in [k for k in self._memory if k[0] == order_id and k[1] != keep]:
+                self._size -= len(self._memory.pop(key))
+            if keep is None:
+                self._counters['invalidations'] += 1
+        if self.disk_dir:
+            for path in glob.glob(os.path.join(self.disk_dir, f"{int(order_id)}-*.pdf")):
+                if keep is None or not path.endswith(f"-{keep}.pdf"):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, memory_entries=len(self._memory), memory_bytes=self._size)
+
+
+invoice_cache = InvoiceCache(**INVOICE_CONFIG)
+
+
+class _ZipStream:
+    """Write-only file object that hands zipfile's output back in chunks."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def export_zip(start, end, status=None, window=None):
+    """
+    Yield a ZIP archive of the invoices of orders placed in [start, end)
+    (optionally only those with `status`), chunk by chunk. Line items come
+    from one streamed query and invoices already in the cache are reused;
+    the rest render in the render_service pool, at most `window` (default
+    half of max_pending) at a time, each written out as it finishes. Memory
+    holds only the PDFs in flight, however many orders match.
+    """
+    query = INVOICE_QUERY + " WHERE o.OrderDate >= %s AND o.OrderDate < %s"
+    params = [start, end]
+    if status:
+        query += " AND o.Status = %s"
+        params.append(status)
+    query += " ORDER BY o.OrderID"
+    window = window or max(1, render_service.max_pending // 2)
+
+    out = _ZipStream()
+    pending = {}   # future -> (order_id, digest, zip timestamp)
+
+    def write(archive, name, date_time, data):
+        # PDFs are already compressed; storing them keeps this cheap
+        info = zipfile.ZipInfo(name, date_time=date_time)
+        info.compress_type = zipfile.ZIP_STORED
+        archive.writestr(info, data)
+
+    def finish(archive, future):
+        order_id, digest, date_time = pending.pop(future)
+        try:
+            pdf = future.result()
+        except Exception as e:
+            write(archive, f"invoice_{order_id}.error.txt", date_time,
+                  f"Invoice for order #{order_id} could not be generated: {e}\n")
+        else:
+            invoice_cache.store(order_id, digest, pdf)
+            write(archive, f"invoice_{order_id}.pdf", date_time, pdf)
+
+    try:
+        # the response body isn't seekable, so zipfile writes data descriptors
+        with zipfile.ZipFile(out, 'w', zipfile.ZIP_STORED) as archive:
+            for order_id, rows in groupby(stream(query, params), key=lambda r: r['OrderID']):
+                order_items = list(rows)
+                order_date = order_items[0]['OrderDate']
+                date_time = order_date.timetuple()[:6] if order_date else (1980, 1, 1, 0, 0, 0)
+                digest = content_hash(order_items)
+                pdf = invoice_cache.lookup(order_id, digest)
+                if pdf is not None:
+                    write(archive, f"invoice_{order_id}.pdf", date_time, pdf)
+                else:
+                    pending[render_service.start('invoice', (order_items,))] = (order_id, digest, date_time)
+                    while len(pending) >= window:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            finish(archive, future)
+                yield out.drain()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(archive, future)
+                yield out.drain()
+        yield out.drain()
+    finally:
+        # client went away mid-download: don't keep rendering for nobody
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,176 @@
+"""
+loyalty.py
+Loyalty points ledger.
+
+Each customer's points live in one loyalty_ledger row: Earned, as computed
+by GetCustomerLoyaltyPoints, and Redeemed, the points spent as checkout
+discounts, with one loyalty_redemption row per order that spent them. The
+balance is then a primary-key read instead of re-aggregating the customer's
+order history on every page view. Earned is refreshed when an order changes
+status, redemptions are written in the order's own transaction, and a
+periodic reconciliation checks every ledger row against the order history
+and the redemption entries in bulk, repairing any drift.
+"""
+
+import math
+import threading
+import time
+
+from config import LOYALTY_CONFIG
+from database import execute, executemany, fetchall, fetchone
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS loyalty_ledger (
+        CustomerID INT NOT NULL PRIMARY KEY,
+        Earned INT NOT NULL DEFAULT 0,
+        Redeemed INT NOT NULL DEFAULT 0,
+        UpdatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS loyalty_redemption (
+        OrderID INT NOT NULL PRIMARY KEY,
+        CustomerID INT NOT NULL,
+        Points INT NOT NULL,
+        CreatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        KEY idx_loyalty_redemption_customer (CustomerID)
+    )
+    """,
+)
+
+_reconciler = None
+_last_report = {}
+
+
+def ensure_schema():
+    for statement in SCHEMA:
+        execute(statement)
+
+
+def _open(customer_id):
+    # a customer without a ledger row yet starts from their order history
+    execute("""
+        INSERT IGNORE INTO loyalty_ledger (CustomerID, Earned, Redeemed)
+        VALUES (%s, GetCustomerLoyaltyPoints(%s), 0)
+    """, (customer_id, customer_id))
+
+
+def account(customer_id, for_update=False):
+    """{'Earned', 'Redeemed', 'Balance', 'UpdatedAt'} for a customer."""
+    query = "SELECT Earned, Redeemed, UpdatedAt FROM loyalty_ledger WHERE CustomerID = %s"
+    if for_update:
+        query += " FOR UPDATE"
+    row = fetchone(query, (customer_id,))
+    if row is None:
+        _open(customer_id)
+        row = fetchone(query, (customer_id,))
+    row['Balance'] = row['Earned'] - row['Redeemed']
+    return row
+
+
+def balance(customer_id):
+    return account(customer_id)['Balance']
+
+
+def redeem(customer_id, points_requested, total):
+    """
+    Discount for spending up to `points_requested` points (1 point = ₹1) on
+    an order of `total`, capped by the balance. Locks the ledger row, so it
+    must run inside the order's transaction, followed by record_redemption()
+    once the order ID is known. Returns (discount, points spent).
+    """
+    if points_requested <= 0:
+        return 0.0, 0
+    available = account(customer_id, for_update=True)['Balance']
+    discount = round(max(0, min(points_requested, available, total)), 2)
+    # points are whole: a discount of ₹45.50 spends 46 of them
+    return discount, math.ceil(discount)
+
+
+def record_redemption(customer_id, order_id, points):
+    if points <= 0:
+        return
+    execute("INSERT INTO loyalty_redemption (OrderID, CustomerID, Points) VALUES (%s, %s, %s)",
+            (order_id, customer_id, points))
+    execute("UPDATE loyalty_ledger SET Redeemed = Redeemed + %s WHERE CustomerID = %s",
+            (points, customer_id))
+
+
+def order_status_changed(order_id):
+    """Refresh Earned for the customer of an order whose status just changed."""
+    execute("""
+        INSERT INTO loyalty_ledger (CustomerID, Earned, Redeemed)
+        SELECT CustomerID, GetCustomerLoyaltyPoints(CustomerID), 0 FROM orders WHERE OrderID = %s
+        ON DUPLICATE KEY UPDATE Earned = VALUES(Earned)
+    """, (order_id,))
+
+
+def reconcile():
+    """
+    Check every ledger row against the order history and the redemption
+    entries in one query and repair the rows that drifted. A row changed by
+    an order while this runs is left alone until the next pass.
+    """
+    started = time.monotonic()
+    rows = fetchall("""
+        SELECT l.CustomerID, l.Earned, l.Redeemed,
+               GetCustomerLoyaltyPoints(l.CustomerID) AS ExpectedEarned,
+               COALESCE(r.Points, 0) AS ExpectedRedeemed
+        FROM loyalty_ledger l
+        LEFT JOIN (
+            SELECT CustomerID, SUM(Points) AS Points FROM loyalty_redemption GROUP BY CustomerID
+        ) r ON r.CustomerID = l.CustomerID
+    """)
+    drifted = [r for r in rows
+               if r['Earned'] != int(r['ExpectedEarned'] or 0) or r['Redeemed'] != int(r['ExpectedRedeemed'])]
+    repaired = 0
+    if drifted:
+        # compare-and-set on the values read above
+        repaired = executemany("""
+            UPDATE loyalty_ledger SET Earned = %s, Redeemed = %s
+            WHERE CustomerID = %s AND Earned = %s AND Redeemed = %s
+        """, [(int(r['ExpectedEarned'] or 0), int(r['ExpectedRedeemed']), r['CustomerID'],
+               r['Earned'], r['Redeemed']) for r in drifted])
+    report = {
+        'checked': len(rows),
+        'drifted': [r['CustomerID'] for r in drifted][:100],
+        'drifted_count': len(drifted),
+        'repaired': repaired,
+        'seconds': round(time.monotonic() - started, 3),
+        'finished_at': time.time(),
+    }
+    _last_report.clear()
+    _last_report.update(report)
+    return report
+
+
+def stats():
+    row = fetchone("SELECT COUNT(*) AS accounts, COALESCE(SUM(Earned - Redeemed), 0) AS outstanding "
+                   "FROM loyalty_ledger")
+    return {'accounts': row['accounts'], 'outstanding_points': int(row['outstanding']),
+            'last_reconcile': dict(_last_report)}
+
+
+def _reconcile_forever(app):
+    while True:
+        time.sleep(LOYALTY_CONFIG['reconcile_interval'])
+        try:
+            with app.app_context():
+                report = reconcile()
+            if report['drifted_count']:
+                app.logger.warning("loyalty reconcile repaired %s of %s drifted ledger rows",
+                                   report['repaired'], report['drifted_count'])
+        except Exception:
+            app.logger.exception("loyalty reconcile failed")
+
+
+def init_app(app):
+    """Create the ledger tables and start the periodic reconciliation."""
+    global _reconciler
+    with app.app_context():
+        ensure_schema()
+    if _reconciler is None and LOYALTY_CONFIG['reconcile_interval']:
+        _reconciler = threading.Thread(target=_reconcile_forever, args=(app,),
+                                       name="loyalty-reconcile", daemon=True)
+        _reconciler.start()
@@ -0,0 +1,161 @@
+"""
+order_engine.py
+Places a whole cart as a single order: one orders row, one order_product row
+per cart line, conditional stock decrements and the loyalty discount, all
+committed in one transaction.
+"""
+
+from database import transaction, execute, executemany, execute_rowcount, get_products_by_ids
+from reservations import reservations
+from suggest import suggestions
+import catalog
+import loyalty
+import farmer_stats
+import sales_rollup
+import stock_alerts
+import platform_counters
+
+
+class OrderError(Exception):
+    """The order was not placed; `failures` reports the offending cart lines."""
+
+    def __init__(self, message, failures=None):
+        super().__init__(message)
+        self.message = message
+        self.failures = failures or []
+
+
+def normalize_cart(cart):
+    """Cart dict as {product_id: quantity} with int keys, sorted by product ID."""
+    lines = {}
+    for pid, qty in cart.items():
+        qty = int(qty)
+        if qty > 0:
+            lines[int(pid)] = lines.get(int(pid), 0) + qty
+    return dict(sorted(lines.items()))
+
+
+def _decrement_stock(customer_id, lines, products):
+    """Take stock for every line; returns the lines that could not be filled."""
+    failures = []
+    # sorted product IDs give every buyer the same row-lock order
+    for pid, qty in lines.items():
+        product = products.get(pid)
+        if product is None:
+            failures.append({'product_id': pid, 'requested': qty, 'reason': 'not_found',
+                             'message': f'Product ID {pid} not found'})
+            continue
+        # stock other shoppers are holding in their carts is not for sale here
+        held = reservations.held_by_others(pid, customer_id)
+        # conditional decrement: no separate stock check to race against
+        updated = execute_rowcount("""
+            UPDATE product
+            SET QuantityAvailable = QuantityAvailable - %s
+            WHERE ProductID = %s AND QuantityAvailable >= %s
+        """, (qty, pid, qty + held))
+        if not updated:
+            available = max(0, product['QuantityAvailable'] - held)
+            failures.append({
+                'product_id': pid, 'name': product['Name'], 'requested': qty,
+                'available': available, 'reason': 'insufficient_stock',
+                'message': f'Insufficient stock for {product["Name"]}. '
+                           f'Only {available} available.'
+            })
+    return failures
+
+
+def validate_cart(customer_id, cart):
+    """
+    Read-only pre-check of a cart against current stock and other shoppers'
+    holds. Returns (lines, failures) without writing anything.
+    """
+    lines = normalize_cart(cart)
+    products = get_products_by_ids(lines)
+    failures = []
+    for pid, qty in lines.items():
+        product = products.get(pid)
+        if product is None:
+            failures.append({'product_id': pid, 'requested': qty, 'reason': 'not_found',
+                             'message': f'Product ID {pid} not found'})
+            continue
+        available = reservations.available(pid, product['QuantityAvailable'], customer_id)
+        if available < qty:
+            failures.append({
+                'product_id': pid, 'name': product['Name'], 'requested': qty,
+                'available': available, 'reason': 'insufficient_stock',
+                'message': f'Insufficient stock for {product["Name"]}. Only {available} available.'
+            })
+    return lines, failures
+
+
+def write_order(customer_id, lines, loyalty_points_used=0):
+    """
+    Write one order for normalized `lines` inside the caller's transaction.
+    Raises OrderError, leaving the caller to roll back, if any line cannot
+    be filled.
+    """
+    products = get_products_by_ids(lines)
+    failures = _decrement_stock(customer_id, lines, products)
+    if failures:
+        raise OrderError(failures[0]['message'], failures)
+    catalog.adjust_stock({pid: -qty for pid, qty in lines.items()})
+    stock_alerts.stock_changed({pid: -qty for pid, qty in lines.items()})
+
+    total = round(sum(float(products[pid]['Price']) * qty for pid, qty in lines.items()), 2)
+    # locks the customer's ledger row until the order commits
+    discount, points_spent = loyalty.redeem(customer_id, loyalty_points_used, total)
+    final_total = round(total - discount, 2)
+
+    order_id = execute("""
+        INSERT INTO orders (CustomerID, OrderDate, Status, TotalAmount)
+        VALUES (%s, NOW(), 'Pending', %s)
+    """, (customer_id, final_total))
+    executemany(
+        "INSERT INTO order_product (OrderID, ProductID, Quantity) VALUES (%s, %s, %s)",
+        [(order_id, pid, qty) for pid, qty in lines.items()]
+    )
+    loyalty.record_redemption(customer_id, order_id, points_spent)
+    platform_counters.add({'orders': 1, 'revenue': final_total, 'total_stock': -sum(lines.values())})
+    prices = {pid: products[pid]['Price'] for pid in lines}
+    sales_rollup.record_order(order_id, prices)
+    # dashboard snapshots are bumped once the order commits
+    farmer_stats.record_order(lines, prices)
+    return {
+        'order_id': order_id,
+        'lines': lines,
+        'total': total,
+        'discount_applied': discount,
+        'points_spent': points_spent,
+        'final_total': final_total,
+    }
+
+
+def place_order(customer_id, cart, loyalty_points_used=0):
+    """
+    Place `cart` ({product_id: quantity}) as one order for `customer_id`.
+
+    Stock is taken with conditional updates that leave other shoppers'
+    reservations alone, the loyalty discount (1 point = ₹1, capped by the
+    customer's balance and the order total) is folded into the order total,
+    and everything commits together. Raises OrderError with a per-line
+    failure report if any line cannot be filled; nothing is written in that
+    case.
+    """
+    result = commit_order(customer_id, cart, loyalty_points_used)
+    order_committed(customer_id, result['lines'])
+    return result
+
+
+def commit_order(customer_id, cart, loyalty_points_used=0):
+    """place_order() without the post-commit bookkeeping."""
+    lines = normalize_cart(cart)
+    if not lines:
+        raise OrderError('Cart empty')
+    with transaction():
+        return write_order(customer_id, lines, loyalty_points_used)
+
+
+def order_committed(customer_id, lines):
+    """Bookkeeping once an order's transaction has committed."""
+    reservations.release(customer_id, lines)
+    suggestions.record_order(lines)
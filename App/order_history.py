@@ -0,0 +1,96 @@
+"""
+order_history.py
+A customer's order history, one page at a time.
+
+Orders are paged newest first with a keyset cursor on (OrderDate, OrderID),
+read off the (CustomerID, OrderDate) index, so page N costs the same as
+page 1 however long the history. The line items of just the visible orders
+come from one batched query.
+"""
+
+import base64
+import json
+from datetime import timedelta
+
+from database import fetchall, ensure_index
+
+STATUSES = ('Pending', 'Processing', 'Shipped', 'Delivered', 'Completed', 'Cancelled')
+
+
+def ensure_schema():
+    ensure_index('orders', 'idx_orders_customer_date', 'CustomerID, OrderDate')
+
+
+def encode_cursor(order):
+    key = [str(order['OrderDate']), order['OrderID']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """[OrderDate, OrderID] from a page cursor, or None if it is unusable."""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return key[0], int(key[1])
+    except (ValueError, TypeError, IndexError):
+        return None
+
+
+def line_items(order_ids):
+    """{order_id: [line rows]} for the given orders, in one query."""
+    order_ids = sorted({int(i) for i in order_ids})
+    items = {oid: [] for oid in order_ids}
+    if not order_ids:
+        return items
+    rows = fetchall(f"""
+        SELECT op.OrderID, op.ProductID, op.Quantity, p.Name AS ProductName, p.Price AS UnitPrice
+        FROM order_product op
+        JOIN product p ON op.ProductID = p.ProductID
+        WHERE op.OrderID IN ({", ".join(["%s"] * len(order_ids))})
+        ORDER BY op.OrderID, p.Name
+    """, tuple(order_ids))
+    for row in rows:
+        items[row['OrderID']].append(row)
+    return items
+
+
+def page(customer_id, status=None, start=None, end=None, cursor=None, limit=10):
+    """
+    One page of a customer's orders, newest first, each with its `items`,
+    and the cursor of the next page (None on the last page). `start` and
+    `end` are dates, both inclusive.
+    """
+    where, params = ["CustomerID = %s"], [customer_id]
+    if status in STATUSES:
+        where.append("Status = %s"); params.append(status)
+    if start:
+        where.append("OrderDate >= %s"); params.append(start)
+    if end:
+        where.append("OrderDate < %s"); params.append(end + timedelta(days=1))
+    key = decode_cursor(cursor)
+    if key:
+        order_date, last_id = key
+        where.append("(OrderDate < %s OR (OrderDate = %s AND OrderID < %s))")
+        params += [order_date, order_date, last_id]
+
+    orders = fetchall(f"""
+        SELECT OrderID, OrderDate, Status, TotalAmount
+        FROM orders
+        WHERE {" AND ".join(where)}
+        ORDER BY OrderDate DESC, OrderID DESC
+        LIMIT %s
+    """, tuple(params) + (limit + 1,))
+    next_cursor = encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+    orders = orders[:limit]
+
+    items = line_items(o['OrderID'] for o in orders)
+    for order in orders:
+        order['items'] = items[order['OrderID']]
+    return orders, next_cursor
+
+
+def init_app(app):
+    """Index orders for per-customer history pages."""
+    with app.app_context():
+        ensure_schema()
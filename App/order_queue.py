@@ -0,0 +1,180 @@
+"""
+order_queue.py
+Optional group-commit intake for orders.
+
+In 'queued' mode order_place validates the cart, enqueues it and hands the
+client a token to poll. Worker threads drain the queue in small batches and
+commit every order of a batch in one transaction, each under its own
+savepoint so a failed order doesn't take the rest of the batch with it.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+from config import ORDER_CONFIG
+from database import transaction, execute
+from order_engine import OrderError, write_order, commit_order, order_committed
+
+
+class OrderIntake:
+    def __init__(self, intake_mode='sync', workers=2, batch_size=20, max_wait=0.05,
+                 max_queue=1000, result_ttl=600):
+        self.enabled = intake_mode == 'queued'
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.result_ttl = result_ttl
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._tickets = {}   # token -> ticket dict
+        self._lock = threading.Lock()
+        self._threads = []
+        self._batch_sizes = Counter()
+        self._latencies = deque(maxlen=1000)
+        self._counters = {'submitted': 0, 'rejected': 0, 'committed': 0, 'failed': 0,
+                          'batches': 0, 'batch_fallbacks': 0}
+
+    def start(self):
+        if not self.enabled or self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"order-intake-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, customer_id, lines, loyalty_points_used=0):
+        """Queue validated `lines` for `customer_id`; returns the polling token."""
+        token = uuid.uuid4().hex
+        ticket = {'token': token, 'customer_id': customer_id, 'state': 'queued',
+                  'lines': lines, 'loyalty_points_used': loyalty_points_used,
+                  'created': time.monotonic(), 'result': None, 'message': None,
+                  'failures': []}
+        with self._lock:
+            self._prune()
+            try:
+                self._queue.put_nowait(ticket)
+            except queue.Full:
+                self._counters['rejected'] += 1
+                raise OrderError('Too many orders in progress, please try again shortly')
+            self._tickets[token] = ticket
+            self._counters['submitted'] += 1
+        return token
+
+    def status(self, token, customer_id):
+        with self._lock:
+            ticket = self._tickets.get(token)
+            if ticket is None or ticket['customer_id'] != customer_id:
+                return None
+            return {k: ticket[k] for k in ('token', 'state', 'lines', 'result', 'message', 'failures')}
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.result_ttl
+        for token in [t for t, tk in self._tickets.items()
+                      if tk['state'] != 'queued' and tk['created'] < cutoff]:
+            del self._tickets[token]
+
+    def _work(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                outcomes = self._commit_batch(batch)
+            except Exception:
+                # the batch transaction failed as a whole, so nothing of it was
+                # written: place the orders one by one
+                with self._lock:
+                    self._counters['batch_fallbacks'] += 1
+                for ticket in batch:
+                    self._commit_single(ticket)
+                continue
+            # the group commit succeeded: report its results, never retry them
+            with self._lock:
+                self._counters['batches'] += 1
+                self._batch_sizes[len(batch)] += 1
+            for ticket, result, error in outcomes:
+                self._finish(ticket, result, error)
+
+    def _commit_batch(self, batch):
+        """Write the batch in one transaction; [(ticket, result, error)] once it commits."""
+        outcomes = []
+        with transaction():
+            for ticket in batch:
+                execute("SAVEPOINT intake_order")
+                try:
+                    result = write_order(ticket['customer_id'], ticket['lines'],
+                                         ticket['loyalty_points_used'])
+                except OrderError as e:
+                    execute("ROLLBACK TO SAVEPOINT intake_order")
+                    outcomes.append((ticket, None, e))
+                else:
+                    execute("RELEASE SAVEPOINT intake_order")
+                    outcomes.append((ticket, result, None))
+        return outcomes
+
+    def _commit_single(self, ticket):
+        try:
+            result = commit_order(ticket['customer_id'], ticket['lines'],
+                                  ticket['loyalty_points_used'])
+        except OrderError as e:
+            self._finish(ticket, None, e)
+        except Exception as e:
+            self._finish(ticket, None, OrderError(f'Error placing order: {str(e)}'))
+        else:
+            self._finish(ticket, result, None)
+
+    def _finish(self, ticket, result, error):
+        if error is None:
+            try:
+                order_committed(ticket['customer_id'], ticket['lines'])
+            except Exception:
+                pass   # the order is committed; held stock expires with its reservation
+        with self._lock:
+            if error is None:
+                ticket.update(state='committed', result={
+                    'order_id': result['order_id'],
+                    'discount_applied': result['discount_applied'],
+                    'final_total': result['final_total'],
+                })
+                self._counters['committed'] += 1
+            else:
+                ticket.update(state='failed', message=error.message, failures=error.failures)
+                self._counters['failed'] += 1
+            self._latencies.append(time.monotonic() - ticket['created'])
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self._counters,
+                         enabled=self.enabled,
+                         queue_depth=self._queue.qsize(),
+                         workers=len(self._threads),
+                         batch_size_limit=self.batch_size,
+                         batch_sizes=dict(sorted(self._batch_sizes.items())))
+        orders = sum(size * n for size, n in stats['batch_sizes'].items())
+        stats['avg_batch_size'] = round(orders / stats['batches'], 2) if stats['batches'] else 0.0
+
+        def pct(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        stats['latency_ms'] = {'p50': pct(0.50), 'p95': pct(0.95), 'p99': pct(0.99)}
+        return stats
+
+
+order_intake = OrderIntake(**ORDER_CONFIG)
+
+
+def init_app(app):
+    """Start the intake workers when ORDER_CONFIG selects queued mode."""
+    order_intake.start()
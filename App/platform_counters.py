@@ -0,0 +1,179 @@
+"""
+platform_counters.py
+Platform-wide totals for the admin dashboard.
+
+The counts of farmers, customers, products and orders, total revenue and
+total stock are kept in platform_counter and adjusted by the writes that
+change them, in the writer's own transaction. Each counter is spread over
+PLATFORM_CONFIG['slots'] rows and a write adds to a random one, so
+concurrent orders do not queue on a single row lock. Reading the totals
+sums a few dozen rows, cached in each worker process for
+PLATFORM_CONFIG['cache_ttl'] seconds, so the admin landing page costs the
+same however large the tables grow. recount() derives every total from the
+source tables in a single statement; it seeds the counters on first start
+and a background check uses it to repair drift (e.g. stock returned by a
+stored procedure).
+"""
+
+import random
+import threading
+import time
+
+from config import PLATFORM_CONFIG
+from database import execute, fetchall, fetchone, transaction
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS platform_counter (
+        Name VARCHAR(40) NOT NULL,
+        Slot TINYINT NOT NULL,
+        Value DECIMAL(16,2) NOT NULL DEFAULT 0,
+        UpdatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (Name, Slot)
+    )
+"""
+
+# every total in one round-trip
+SOURCE = """
+    SELECT
+        (SELECT COUNT(*) FROM farmer) AS farmers,
+        (SELECT COUNT(*) FROM customer) AS customers,
+        (SELECT COUNT(*) FROM product) AS products,
+        (SELECT COUNT(*) FROM orders) AS orders,
+        (SELECT COALESCE(SUM(TotalAmount), 0) FROM orders) AS revenue,
+        (SELECT COALESCE(SUM(QuantityAvailable), 0) FROM product) AS total_stock
+"""
+
+COUNTERS = ('farmers', 'customers', 'products', 'orders', 'revenue', 'total_stock')
+
+_UPSERT = """
+    INSERT INTO platform_counter (Name, Slot, Value) VALUES {rows}
+    ON DUPLICATE KEY UPDATE Value = Value + VALUES(Value)
+"""
+
+_cache = {'values': None, 'at': 0.0}
+_lock = threading.Lock()
+_checker = None
+_last_check = {}
+
+
+def ensure_schema():
+    execute(SCHEMA)
+
+
+def _typed(values):
+    """Counts as ints and revenue as a float."""
+    return {name: float(values[name]) if name == 'revenue' else int(values[name]) for name in COUNTERS}
+
+
+def add(changes):
+    """Adjust counters by {name: delta}; inside a transaction, only if it commits."""
+    changes = {name: delta for name, delta in changes.items() if delta}
+    if not changes:
+        return
+    slot = random.randrange(PLATFORM_CONFIG['slots'])
+    execute(_UPSERT.format(rows=", ".join(["(%s, %s, %s)"] * len(changes))),
+            tuple(v for name, delta in changes.items() for v in (name, slot, delta)))
+
+
+def _stored():
+    return {r['Name']: r['Value'] for r in
+            fetchall("SELECT Name, SUM(Value) AS Value FROM platform_counter GROUP BY Name")}
+
+
+def compute():
+    """Every total derived from the source tables (one statement)."""
+    return _typed(fetchone(SOURCE))
+
+
+def recount(wait=0, unseeded_only=False):
+    """
+    Compare the counters with the source tables and add the difference to
+    the ones that drifted (or were never seeded). Both are read from one
+    transaction snapshot, and the correction is an increment, so writes
+    that land meanwhile are neither lost nor counted twice. Runs in one
+    worker process at a time: returns None if another holds the recount
+    lock for longer than `wait` seconds, or if `unseeded_only` and the
+    counters are already seeded.
+    """
+    lock = fetchone("SELECT GET_LOCK('platform_counters_recount', %s) AS got", (wait,))
+    if not lock or not lock['got']:
+        return None
+    try:
+        if unseeded_only and len(_stored()) >= len(COUNTERS):
+            return None
+        return _recount()
+    finally:
+        fetchone("SELECT RELEASE_LOCK('platform_counters_recount') AS released")
+
+
+def _recount():
+    started = time.monotonic()
+    with transaction():
+        stored = _stored()
+        expected = compute()
+        corrections = {name: round(expected[name] - float(stored.get(name, 0)), 2) for name in COUNTERS}
+        corrections = {name: delta for name, delta in corrections.items() if delta}
+        if corrections:
+            execute(_UPSERT.format(rows=", ".join(["(%s, 0, %s)"] * len(corrections))),
+                    tuple(v for item in corrections.items() for v in item))
+    report = {
+        'seeded': [name for name in COUNTERS if name not in stored],
+        'drifted': {name: {'stored': float(stored[name]), 'expected': expected[name]}
+                    for name in corrections if name in stored},
+        'seconds': round(time.monotonic() - started, 3),
+        'finished_at': time.time(),
+    }
+    _last_check.clear()
+    _last_check.update(report)
+    with _lock:
+        _cache['values'] = None
+    return report
+
+
+def totals():
+    """{counter: value}, from the in-process cache while it is fresh."""
+    with _lock:
+        if _cache['values'] is not None and time.monotonic() - _cache['at'] < PLATFORM_CONFIG['cache_ttl']:
+            return dict(_cache['values'])
+    stored = _stored()
+    if all(name in stored for name in COUNTERS):
+        values = _typed(stored)
+    else:
+        # not seeded yet: answer from the source tables
+        values = compute()
+    with _lock:
+        _cache['values'], _cache['at'] = values, time.monotonic()
+    return dict(values)
+
+
+def stats():
+    with _lock:
+        age = time.monotonic() - _cache['at'] if _cache['values'] is not None else None
+    return {'cache_age': round(age, 3) if age is not None else None, 'last_check': dict(_last_check)}
+
+
+def _check_forever(app):
+    while True:
+        time.sleep(PLATFORM_CONFIG['check_interval'])
+        try:
+            with app.app_context():
+                report = recount()
+            if report and report['drifted']:
+                app.logger.warning("platform counter check repaired drifted counters: %s",
+                                   ", ".join(report['drifted']))
+        except Exception:
+            app.logger.exception("platform counter check failed")
+
+
+def init_app(app):
+    """Create and seed the counters and start the background check."""
+    global _checker
+    with app.app_context():
+        ensure_schema()
+        if len(_stored()) < len(COUNTERS):
+            # one worker process seeds; the others wait here and find it done
+            recount(wait=60, unseeded_only=True)
+    if _checker is None and PLATFORM_CONFIG['check_interval']:
+        _checker = threading.Thread(target=_check_forever, args=(app,),
+                                    name="platform-counter-check", daemon=True)
+        _checker.start()
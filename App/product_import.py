@@ -0,0 +1,196 @@
+"""
+product_import.py
+Bulk product import from a CSV or NDJSON upload.
+
+The upload is parsed row by row straight off the request stream, so memory
+stays flat however long the file is. Each row is checked against category
+and season lookups loaded once per import, and valid rows are written in
+chunks of IMPORT_CONFIG['chunk_size']: one multi-row product INSERT and one
+product_season INSERT per chunk, committed as one transaction. A chunk the
+database rejects is retried row by row, so one bad row costs only itself.
+The result is a report of what was imported and which rows failed, and why.
+
+Columns (CSV header or NDJSON keys, case-insensitive):
+name, category, season, price, quantity (default 100), freshness (default
+Fresh). category and season take an ID or a name.
+"""
+
+import csv
+import io
+import json
+import math
+import time
+
+from config import IMPORT_CONFIG
+from database import fetchall, insert_many, executemany, transaction
+import catalog
+import farmer_stats
+import stock_alerts
+import platform_counters
+
+FORMATS = ('csv', 'ndjson')
+FRESHNESS = ('Fresh', 'Good', 'Premium', 'Organic')
+NAME_LENGTH = 100
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; the message goes into the report."""
+
+
+def detect_format(filename, requested=None):
+    """'csv' or 'ndjson' from an explicit choice or the file extension, else None."""
+    if requested in FORMATS:
+        return requested
+    ext = (filename or '').rsplit('.', 1)[-1].lower()
+    return {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(ext)
+
+
+def _lookup(rows, id_key, name_key):
+    """{id or lowercased name: id} for a reference table."""
+    table = {}
+    for row in rows:
+        table[str(row[id_key])] = row[id_key]
+        table[row[name_key].strip().lower()] = row[id_key]
+    return table
+
+
+def lookups():
+    categories = fetchall("SELECT CategoryID, CategoryName FROM category", cache=True)
+    seasons = fetchall("SELECT SeasonID, SeasonName FROM season", cache=True)
+    return (_lookup(categories, 'CategoryID', 'CategoryName'),
+            _lookup(seasons, 'SeasonID', 'SeasonName'))
+
+
+def read_rows(stream, fmt):
+    """Yield (row number, {column: value} or None, error or None) from a binary stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None:
+            return
+        reader.fieldnames = [(f or '').strip().lower() for f in reader.fieldnames]
+        for fields in reader:
+            yield reader.line_num, fields, None
+        return
+    for number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(fields, dict):
+            yield number, None, "Expected a JSON object"
+            continue
+        yield number, {str(k).strip().lower(): v for k, v in fields.items()}, None
+
+
+def _text(fields, key):
+    value = fields.get(key)
+    return '' if value is None else str(value).strip()
+
+
+def validate(fields, categories, seasons):
+    """(name, price, freshness, category_id, quantity, season_id) for a row, or raise RowError."""
+    name = _text(fields, 'name')
+    if not name:
+        raise RowError("Missing name")
+    if len(name) > NAME_LENGTH:
+        raise RowError(f"Name is longer than {NAME_LENGTH} characters")
+
+    category = _text(fields, 'category')
+    category_id = categories.get(category.lower())
+    if category_id is None:
+        raise RowError(f"Unknown category '{category}'" if category else "Missing category")
+    season = _text(fields, 'season')
+    season_id = seasons.get(season.lower())
+    if season_id is None:
+        raise RowError(f"Unknown season '{season}'" if season else "Missing season")
+
+    try:
+        price = round(float(_text(fields, 'price')), 2)
+    except ValueError:
+        price = math.nan
+    if not math.isfinite(price):
+        raise RowError("Price must be a number")
+    if price < 0:
+        raise RowError("Price must be positive")
+    try:
+        quantity = int(_text(fields, 'quantity') or 100)
+    except ValueError:
+        raise RowError("Quantity must be a whole number")
+    if quantity < 0:
+        raise RowError("Quantity must be positive")
+
+    freshness = _text(fields, 'freshness').capitalize() or 'Fresh'
+    if freshness not in FRESHNESS:
+        raise RowError(f"Freshness must be one of {', '.join(FRESHNESS)}")
+    return name, price, freshness, category_id, quantity, season_id
+
+
+def _write(farmer_id, rows):
+    """Insert [(name, price, freshness, category_id, quantity, season_id)] in one transaction; returns the IDs."""
+    with transaction():
+        product_ids = insert_many(
+            "INSERT INTO product (FarmerID, Name, Price, Freshness, CategoryID, QuantityAvailable) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [(farmer_id,) + row[:5] for row in rows])
+        executemany("INSERT INTO product_season (ProductID, SeasonID) VALUES (%s, %s)",
+                    [(pid, row[5]) for pid, row in zip(product_ids, rows)])
+        catalog.refresh_products(product_ids)
+        farmer_stats.products_changed(product_ids)
+        stock_alerts.products_added(product_ids)
+        platform_counters.add({'products': len(rows), 'total_stock': sum(row[4] for row in rows)})
+    return product_ids
+
+
+def import_products(farmer_id, stream, fmt):
+    """
+    Import products for a farmer from a CSV or NDJSON byte stream. Returns
+    {'rows', 'imported', 'failed', 'skipped', 'errors': [{'row', 'error'}],
+    'product_ids', 'seconds'}; rows written before a failure stay imported.
+    """
+    started = time.monotonic()
+    categories, seasons = lookups()
+    report = {'rows': 0, 'imported': 0, 'failed': 0, 'skipped': 0, 'errors': [], 'product_ids': []}
+
+    def fail(number, error):
+        report['failed'] += 1
+        if len(report['errors']) < IMPORT_CONFIG['max_errors']:
+            report['errors'].append({'row': number, 'error': str(error)})
+
+    def flush(batch):
+        try:
+            report['product_ids'] += _write(farmer_id, [row for _, row in batch])
+            report['imported'] += len(batch)
+        except Exception:
+            # find the rows the database rejected
+            for number, row in batch:
+                try:
+                    report['product_ids'] += _write(farmer_id, [row])
+                    report['imported'] += 1
+                except Exception as e:
+                    fail(number, e)
+
+    batch = []
+    for number, fields, error in read_rows(stream, fmt):
+        if report['rows'] >= IMPORT_CONFIG['max_rows']:
+            report['skipped'] += 1
+            continue
+        report['rows'] += 1
+        try:
+            if error:
+                raise RowError(error)
+            batch.append((number, validate(fields, categories, seasons)))
+        except RowError as e:
+            fail(number, e)
+            continue
+        if len(batch) >= IMPORT_CONFIG['chunk_size']:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    report['errors'].sort(key=lambda e: e['row'])
+    report['seconds'] = round(time.monotonic() - started, 3)
+    return report
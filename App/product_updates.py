@@ -0,0 +1,154 @@
+"""
+product_updates.py
+Batch price changes and restocks for a farmer's products.
+
+A batch is checked and applied in one transaction: one locking SELECT
+resolves ownership and current values for every product in it, and one
+CASE update writes all the accepted items. Each item gets its own result,
+so a batch with a few bad entries still applies the rest. Prices that do
+not change are not written, which keeps them out of the
+product_price_audit trail (filled by a trigger on product updates).
+"""
+
+import math
+
+from database import fetchall, execute_rowcount, transaction
+import catalog
+import farmer_stats
+import stock_alerts
+import platform_counters
+
+MAX_ITEMS = 1000
+
+
+def _lock_owned(farmer_id, product_ids):
+    """{ProductID: row} of the farmer's products among product_ids, locked for update."""
+    ids = sorted(set(product_ids))
+    if not ids:
+        return {}
+    rows = fetchall(f"""
+        SELECT ProductID, Name, Price, QuantityAvailable FROM product
+        WHERE FarmerID = %s AND ProductID IN ({", ".join(["%s"] * len(ids))})
+        FOR UPDATE
+    """, tuple([farmer_id] + ids))
+    return {r['ProductID']: r for r in rows}
+
+
+def _case_update(column, expression, values):
+    """SET column = CASE ProductID WHEN id THEN expression(%s) ... END for {id: value}."""
+    ids = sorted(values)
+    cases = " ".join([f"WHEN %s THEN {expression}"] * len(ids))
+    params = [v for pid in ids for v in (pid, values[pid])] + ids
+    return execute_rowcount(
+        f"UPDATE product SET {column} = CASE ProductID {cases} END "
+        f"WHERE ProductID IN ({', '.join(['%s'] * len(ids))})", tuple(params))
+
+
+def _parse(items, field, convert):
+    """
+    ([(index, product_id, value)], {index: result}) from [{'product_id', field}]:
+    the items that parsed and the results of those that did not.
+    """
+    parsed, results, seen = [], {}, set()
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        try:
+            product_id = int(item.get('product_id'))
+        except (TypeError, ValueError):
+            results[index] = {'product_id': item.get('product_id'), 'status': 'invalid',
+                              'message': 'Missing or invalid product_id'}
+            continue
+        try:
+            value = convert(item.get(field))
+        except ValueError as e:
+            results[index] = {'product_id': product_id, 'status': 'invalid', 'message': str(e)}
+            continue
+        if product_id in seen:
+            results[index] = {'product_id': product_id, 'status': 'invalid',
+                              'message': 'Product is listed more than once'}
+            continue
+        seen.add(product_id)
+        parsed.append((index, product_id, value))
+    return parsed, results
+
+
+def _price(value):
+    try:
+        price = round(float(value), 2)
+    except (TypeError, ValueError):
+        raise ValueError("Price must be a number")
+    if not math.isfinite(price) or price < 0:
+        raise ValueError("Price must be a positive number")
+    return price
+
+
+def _quantity(value):
+    try:
+        quantity = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("Quantity must be a whole number")
+    if not quantity.is_integer():
+        raise ValueError("Quantity must be a whole number")
+    if quantity <= 0:
+        raise ValueError("Quantity must be positive")
+    return int(quantity)
+
+
+def set_prices(farmer_id, items):
+    """
+    Apply [{'product_id', 'price'}] to the farmer's products. Returns one
+    result per item, in order: {'product_id', 'status': updated, unchanged,
+    not_found or invalid, 'message', and 'price', 'old_price' when found}.
+    """
+    parsed, results = _parse(items, 'price', _price)
+    with transaction():
+        owned = _lock_owned(farmer_id, [pid for _, pid, _ in parsed])
+        changes = {}
+        for index, product_id, price in parsed:
+            product = owned.get(product_id)
+            if product is None:
+                results[index] = {'product_id': product_id, 'status': 'not_found',
+                                  'message': 'No such product'}
+                continue
+            old = float(product['Price'])
+            result = {'product_id': product_id, 'price': price, 'old_price': old}
+            if round(old, 2) == price:
+                result.update(status='unchanged', message=f'{product["Name"]} already costs ₹{price:.2f}')
+            else:
+                changes[product_id] = price
+                result.update(status='updated', message=f'{product["Name"]} now costs ₹{price:.2f}')
+            results[index] = result
+        if changes:
+            _case_update('Price', '%s', changes)
+            catalog.refresh_products(changes)
+            farmer_stats.products_changed(changes)
+    return [results[i] for i in range(len(items))]
+
+
+def restock(farmer_id, items):
+    """
+    Add [{'product_id', 'quantity'}] units to the farmer's products. Returns
+    one result per item, in order: {'product_id', 'status': updated,
+    not_found or invalid, 'message', and 'new_quantity' when updated}.
+    """
+    parsed, results = _parse(items, 'quantity', _quantity)
+    with transaction():
+        owned = _lock_owned(farmer_id, [pid for _, pid, _ in parsed])
+        deltas = {}
+        for index, product_id, quantity in parsed:
+            product = owned.get(product_id)
+            if product is None:
+                results[index] = {'product_id': product_id, 'status': 'not_found',
+                                  'message': 'No such product'}
+                continue
+            deltas[product_id] = quantity
+            results[index] = {'product_id': product_id, 'status': 'updated',
+                              'message': f'Added {quantity} units to {product["Name"]}',
+                              'new_quantity': product['QuantityAvailable'] + quantity}
+        if deltas:
+            _case_update('QuantityAvailable', 'QuantityAvailable + %s', deltas)
+            catalog.adjust_stock(deltas)
+            stock_alerts.stock_changed(deltas)
+            platform_counters.add({'total_stock': sum(deltas.values())})
+            farmer_stats.products_changed(deltas)
+    return [results[i] for i in range(len(items))]
@@ -0,0 +1,161 @@
+"""
+render_service.py
+Off-thread PDF rendering.
+
+ReportLab's doc.build is CPU bound, so documents are rendered by a small
+process pool instead of on the web worker's request thread. A route
+submits a job and waits up to RENDER_CONFIG['wait_timeout'] for it; a
+document that takes longer keeps rendering and the client is sent to
+/jobs/<id> to poll and download it. At most `max_pending` jobs run or wait
+per web process, so a burst of PDF requests is turned away (503) rather
+than queueing up behind page traffic.
+"""
+
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from config import RENDER_CONFIG
+import reports
+
+# job kinds -> module-level render functions (picklable for the pool)
+RENDERERS = {
+    'invoice': reports.render_invoice,
+    'sales_report': reports.render_sales_report,
+}
+
+
+class RenderBusy(Exception):
+    """Too many documents are already rendering; try again shortly."""
+
+
+class RenderService:
+    def __init__(self, mode='process', workers=2, max_pending=8, wait_timeout=5, result_ttl=300):
+        self.mode = mode
+        self.workers = workers
+        self.max_pending = max_pending
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._jobs = {}    # job_id -> job dict
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'waited_out': 0}
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs threads is unsafe
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _discard_pool(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.result_ttl
+        for job_id in [j for j, job in self._jobs.items() if job['future'].done() and job['created'] < cutoff]:
+            del self._jobs[job_id]
+
+    def _start(self, kind, args):
+        """Start a render in an already acquired slot; the slot is freed when it finishes."""
+        try:
+            if self.mode == 'process':
+                try:
+                    future = self._pool().submit(RENDERERS[kind], *args)
+                except BrokenProcessPool:
+                    self._discard_pool()
+                    future = self._pool().submit(RENDERERS[kind], *args)
+            else:
+                # 'inline' renders on the calling thread, e.g. for debugging
+                future = Future()
+                try:
+                    future.set_result(RENDERERS[kind](*args))
+                except Exception as e:
+                    future.set_exception(e)
+        except Exception:
+            self._slots.release()
+            raise
+
+        def finished(f):
+            self._slots.release()
+            failed = f.cancelled() or f.exception() is not None
+            if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool):
+                # a render process died; start a fresh pool for the next job
+                self._discard_pool()
+            with self._lock:
+                self._counters['failed' if failed else 'completed'] += 1
+
+        future.add_done_callback(finished)
+        return future
+
+    def submit(self, kind, args, owner, filename, on_done=None):
+        """
+        Queue a render of RENDERERS[kind](*args) and return the job ID.
+        `owner` is who may download it; `on_done(pdf)` runs once it succeeds.
+        Raises RenderBusy when max_pending jobs are already in flight.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise RenderBusy('Too many documents are being generated, please try again shortly')
+        future = self._start(kind, args)
+        job_id = uuid.uuid4().hex
+        job = {'id': job_id, 'kind': kind, 'owner': owner, 'filename': filename,
+               'future': future, 'created': time.monotonic()}
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = job
+            self._counters['submitted'] += 1
+        if on_done is not None:
+            future.add_done_callback(
+                lambda f: f.cancelled() or f.exception() is not None or on_done(f.result()))
+        return job_id
+
+    def start(self, kind, args):
+        """
+        Future for RENDERERS[kind](*args), for bulk work that consumes the
+        results itself. Waits for a free slot instead of raising RenderBusy,
+        so batch renders share max_pending with interactive downloads.
+        """
+        self._slots.acquire()
+        return self._start(kind, args)
+
+    def wait(self, job_id, timeout=None):
+        """The PDF bytes once the job is done, or None if it is still rendering after `timeout`."""
+        job = self._jobs[job_id]
+        try:
+            return job['future'].result(timeout=self.wait_timeout if timeout is None else timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._counters['waited_out'] += 1
+            return None
+
+    def job(self, job_id, owner):
+        """Job dict for its owner, else None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job['owner'] != owner:
+            return None
+        return job
+
+    def render(self, kind, args, owner, filename, on_done=None):
+        """(pdf bytes or None, job_id): submit and wait up to wait_timeout."""
+        job_id = self.submit(kind, args, owner, filename, on_done)
+        return self.wait(job_id), job_id
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if not job['future'].done())
+            return dict(self._counters, mode=self.mode, workers=self.workers,
+                        max_pending=self.max_pending, in_flight=running, jobs=len(self._jobs))
+
+
+render_service = RenderService(**RENDER_CONFIG)
@@ -0,0 +1,341 @@
+"""
+reports.py
+PDF rendering for invoices and farmer sales reports. Pure functions of the
+rows they are given, with no database access, so a document can be rendered
+(and cached) anywhere, including a render_service worker process.
+"""
+
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER
+
+# bump when the layout changes so cached documents are re-rendered
+INVOICE_VERSION = 1
+
+
+@lru_cache(maxsize=None)
+def _invoice_styles():
+    """Paragraph styles for invoices, built once per process."""
+    styles = getSampleStyleSheet()
+    
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#10b981'),
+        spaceAfter=30,
+        alignment=TA_CENTER
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        textColor=colors.HexColor('#059669'),
+        spaceAfter=12,
+        spaceBefore=12
+    )
+    
+    footer_style = ParagraphStyle(
+        'Footer',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=colors.grey,
+        alignment=TA_CENTER
+    )
+    
+    return title_style, heading_style, footer_style
+
+
+def render_invoice(order_items):
+    """
+    Invoice PDF bytes for one order. `order_items` are the order's line rows
+    as selected by invoices.INVOICE_QUERY; the first row carries the order
+    and customer fields.
+    """
+    order = order_items[0]
+    
+    # Create PDF in memory
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72,
+                          topMargin=72, bottomMargin=18)
+    
+    # Container for PDF elements
+    elements = []
+    title_style, heading_style, footer_style = _invoice_styles()
+    
+    # Title
+    elements.append(Paragraph("FARMCONNECT INVOICE", title_style))
+    elements.append(Spacer(1, 12))
+    
+    # Invoice details
+    invoice_data = [
+        ['Invoice Number:', f'INV-{order["OrderID"]:06d}', 'Order ID:', f'#{order["OrderID"]}'],
+        ['Date:', str(order['OrderDate']), 'Status:', order['Status']]
+    ]
+    
+    invoice_table = Table(invoice_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 2*inch])
+    invoice_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
+        ('BACKGROUND', (2, 0), (2, -1), colors.HexColor('#f3f4f6')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+    ]))
+    
+    elements.append(invoice_table)
+    elements.append(Spacer(1, 20))
+    
+    # Customer Details
+    elements.append(Paragraph("Customer Details", heading_style))
+    customer_data = [
+        ['Name:', order['CustomerName']],
+        ['Email:', order['CustomerEmail']],
+        ['Location:', order['CustomerLocation']]
+    ]
+    
+    customer_table = Table(customer_data, colWidths=[1.5*inch, 5*inch])
+    customer_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#fef3c7')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+    ]))
+    
+    elements.append(customer_table)
+    elements.append(Spacer(1, 20))
+    
+    # Order Items
+    elements.append(Paragraph("Order Details", heading_style))
+    
+    # Table header
+    items_data = [['Product', 'Farmer', 'Quantity', 'Unit Price', 'Subtotal']]
+    
+    # Add each product
+    for item in order_items:
+        subtotal = float(item['UnitPrice']) * int(item['Quantity'])
+        items_data.append([
+            item['ProductName'],
+            f"{item['FarmerName']}\n{item['FarmerLocation']}",
+            str(item['Quantity']),
+            f"₹{item['UnitPrice']:.2f}",
+            f"₹{subtotal:.2f}"
+        ])
+    
+    items_table = Table(items_data, colWidths=[2*inch, 1.8*inch, 0.8*inch, 1*inch, 1*inch])
+    items_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (2, 0), (2, -1), 'CENTER'),
+        ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')])
+    ]))
+    
+    elements.append(items_table)
+    elements.append(Spacer(1, 20))
+    
+    # Totals
+    totals_data = [
+        ['Subtotal:', f"₹{order['TotalAmount']:.2f}"],
+        ['Shipping:', '₹0.00'],
+        ['Tax (0%):', '₹0.00'],
+        ['', ''],
+        ['Total Amount:', f"₹{order['TotalAmount']:.2f}"]
+    ]
+    
+    totals_table = Table(totals_data, colWidths=[5*inch, 1.5*inch])
+    totals_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (0, 2), 'Helvetica'),
+        ('FONTNAME', (0, 4), (-1, 4), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 3), 10),
+        ('FONTSIZE', (0, 4), (-1, 4), 14),
+        ('TEXTCOLOR', (0, 4), (-1, 4), colors.HexColor('#10b981')),
+        ('LINEABOVE', (0, 4), (-1, 4), 2, colors.HexColor('#10b981')),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    
+    elements.append(totals_table)
+    elements.append(Spacer(1, 30))
+    
+    # Footer
+    elements.append(Paragraph("Thank you for shopping with FarmConnect!", footer_style))
+    elements.append(Paragraph("Support local farmers, eat fresh & healthy.", footer_style))
+    elements.append(Spacer(1, 10))
+    elements.append(Paragraph("FarmConnect - Fresh from Farm to Table", footer_style))
+    elements.append(Paragraph("Email: support@farmconnect.com", footer_style))
+    
+    # Build PDF
+    doc.build(elements)
+    
+    pdf_data = buffer.getvalue()
+    buffer.close()
+    return pdf_data
+
+
+@lru_cache(maxsize=None)
+def _sales_report_styles():
+    """Paragraph styles for sales reports, built once per process."""
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#047857'),
+        spaceAfter=12,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=16,
+        textColor=colors.HexColor('#059669'),
+        spaceAfter=10,
+        spaceBefore=10,
+        fontName='Helvetica-Bold'
+    )
+    
+    normal_style = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=colors.HexColor('#374151')
+    )
+    
+    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.grey, alignment=TA_CENTER)
+    
+    return title_style, heading_style, normal_style, footer_style
+
+
+def render_sales_report(farmer_name, overview, product_rows, generated_at, period=None):
+    """
+    Sales report PDF bytes for a farmer: the overview and per-product rows
+    of sales_rollup.report() for the (start, end) `period`.
+    """
+    # Create a BytesIO buffer for the PDF
+    buffer = BytesIO()
+    
+    # Create the PDF document
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    elements = []
+    title_style, heading_style, normal_style, footer_style = _sales_report_styles()
+    
+    # Title
+    title = Paragraph("Sales Report", title_style)
+    elements.append(title)
+    
+    # Farmer info and date
+    date_str = generated_at.strftime("%B %d, %Y")
+    period_str = f"<br/><b>Period:</b> {period[0].strftime('%B %d, %Y')} to {period[1].strftime('%B %d, %Y')}" if period else ""
+    farmer_info = Paragraph(f"<b>Farmer:</b> {farmer_name}<br/><b>Report Date:</b> {date_str}{period_str}", normal_style)
+    elements.append(farmer_info)
+    elements.append(Spacer(1, 0.3*inch))
+    
+    # Summary section
+    elements.append(Paragraph("Summary", heading_style))
+    
+    summary_data = [
+        ['Metric', 'Value'],
+        ['Total Products', str(overview.get('TotalProducts', 0))],
+        ['Total Orders', str(overview.get('TotalOrders', 0))],
+        ['Units Sold', str(overview.get('TotalUnits', 0))],
+        ['Total Revenue', f"₹{float(overview.get('TotalRevenue') or 0):.2f}"],
+        ['Average Product Rating', f"{overview.get('AverageProductRating', '0.0')} ★"]
+    ]
+    
+    summary_table = Table(summary_data, colWidths=[3*inch, 3*inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('TOPPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f0fdf4')),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#d1fae5')),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('TOPPADDING', (0, 1), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ]))
+    
+    elements.append(summary_table)
+    elements.append(Spacer(1, 0.3*inch))
+    
+    # Products breakdown section
+    if product_rows:
+        elements.append(Paragraph("Product Sales Breakdown", heading_style))
+        
+        product_data = [['Product Name', 'Price', 'Units Sold', 'Revenue']]
+        
+        for p in product_rows:
+            product_data.append([
+                str(p.get('ProductName', 'N/A')),
+                f"₹{float(p.get('Price') or 0):.2f}",
+                str(p.get('TotalUnitsSold', 0)),
+                f"₹{float(p.get('ProductRevenue') or 0):.2f}"
+            ])
+        
+        product_table = Table(product_data, colWidths=[2.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
+        product_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('TOPPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0fdf4')]),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#d1fae5')),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('TOPPADDING', (0, 1), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+        ]))
+        
+        elements.append(product_table)
+    else:
+        elements.append(Paragraph("No product sales data available.", normal_style))
+    
+    # Add footer
+    elements.append(Spacer(1, 0.5*inch))
+    footer_text = Paragraph(
+        f"<i>Generated by FarmConnect on {generated_at.strftime('%B %d, %Y at %I:%M %p')}</i>",
+        footer_style
+    )
+    elements.append(footer_text)
+    
+    # Build PDF
+    doc.build(elements)
+    
+    pdf_data = buffer.getvalue()
+    buffer.close()
+    return pdf_data
@@ -0,0 +1,140 @@
+"""
+reservations.py
+Short-lived stock holds for items sitting in carts and checkouts.
+
+Holds live in process memory, so reading available-to-sell never touches or
+locks the product row. They are per worker process; the conditional stock
+decrement in order_engine remains the final guard against overselling.
+"""
+
+import heapq
+import threading
+import time
+from collections import defaultdict
+
+from config import RESERVATION_CONFIG
+
+
+class ReservationStore:
+    """Per-product holds keyed by holder (the customer ID), each with an expiry."""
+
+    def __init__(self, cart_ttl=600, checkout_ttl=300, sweep_interval=15):
+        self.cart_ttl = cart_ttl
+        self.checkout_ttl = checkout_ttl
+        self.sweep_interval = sweep_interval
+        self._holds = defaultdict(dict)   # product_id -> {holder: (qty, expires)}
+        self._held = defaultdict(int)     # product_id -> qty under active holds
+        self._expiry = []                 # heap of (expires, product_id, holder)
+        self._lock = threading.Lock()
+        self._counters = {'reserved': 0, 'rejected': 0, 'released': 0, 'expired': 0}
+
+    def _set(self, product_id, holder, qty, expires):
+        holds = self._holds[product_id]
+        old = holds.get(holder)
+        if old:
+            self._held[product_id] -= old[0]
+        if qty > 0:
+            holds[holder] = (qty, expires)
+            self._held[product_id] += qty
+            heapq.heappush(self._expiry, (expires, product_id, holder))
+        else:
+            holds.pop(holder, None)
+        if not holds:
+            self._holds.pop(product_id, None)
+            self._held.pop(product_id, None)
+
+    def _expire(self, now):
+        removed = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, product_id, holder = heapq.heappop(self._expiry)
+            hold = self._holds.get(product_id, {}).get(holder)
+            # stale heap entry if the hold was changed or extended since
+            if hold and hold[1] == expires:
+                self._set(product_id, holder, 0, 0)
+                removed += 1
+        self._counters['expired'] += removed
+        return removed
+
+    def held_by_others(self, product_id, holder=None):
+        product_id = int(product_id)
+        with self._lock:
+            own = self._holds.get(product_id, {}).get(holder)
+            return self._held.get(product_id, 0) - (own[0] if own else 0)
+
+    def available(self, product_id, stock, holder=None):
+        """Available-to-sell for `holder`: stock minus everyone else's holds."""
+        return max(0, int(stock) - self.held_by_others(product_id, holder))
+
+    def reserve(self, holder, product_id, qty, stock, ttl=None):
+        """
+        Set `holder`'s hold on a product to `qty` (0 releases it). Returns
+        (ok, available); nothing changes when the stock cannot cover it.
+        """
+        product_id, qty = int(product_id), int(qty)
+        now = time.monotonic()
+        with self._lock:
+            own = self._holds.get(product_id, {}).get(holder)
+            others = self._held.get(product_id, 0) - (own[0] if own else 0)
+            if qty > stock - others:
+                # retry once with lapsed holds cleared before turning it down
+                self._expire(now)
+                own = self._holds.get(product_id, {}).get(holder)
+                others = self._held.get(product_id, 0) - (own[0] if own else 0)
+                if qty > stock - others:
+                    self._counters['rejected'] += 1
+                    return False, max(0, int(stock) - others)
+            expires = now + (self.cart_ttl if ttl is None else ttl)
+            if own and qty > 0:
+                expires = max(expires, own[1])
+            self._set(product_id, holder, qty, expires)
+            self._counters['reserved'] += 1
+            return True, int(stock) - others
+
+    def extend(self, holder, product_ids, ttl=None):
+        """Make sure `holder`'s holds last at least `ttl` more seconds."""
+        expires = time.monotonic() + (self.checkout_ttl if ttl is None else ttl)
+        with self._lock:
+            for product_id in product_ids:
+                product_id = int(product_id)
+                hold = self._holds.get(product_id, {}).get(holder)
+                if hold and hold[1] < expires:
+                    self._set(product_id, holder, hold[0], expires)
+
+    def release(self, holder, product_ids=None):
+        with self._lock:
+            if product_ids is None:
+                product_ids = [pid for pid, holds in self._holds.items() if holder in holds]
+            for product_id in product_ids:
+                product_id = int(product_id)
+                if holder in self._holds.get(product_id, {}):
+                    self._set(product_id, holder, 0, 0)
+                    self._counters['released'] += 1
+
+    def sweep(self):
+        with self._lock:
+            return self._expire(time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters,
+                        products_held=len(self._holds),
+                        units_held=sum(self._held.values()),
+                        holds=sum(len(h) for h in self._holds.values()))
+
+
+reservations = ReservationStore(**RESERVATION_CONFIG)
+_sweeper = None
+
+
+def _sweep_forever():
+    while True:
+        time.sleep(reservations.sweep_interval)
+        reservations.sweep()
+
+
+def init_app(app):
+    """Start the background sweeper that releases expired holds."""
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = threading.Thread(target=_sweep_forever, name="reservation-sweeper", daemon=True)
+        _sweeper.start()
@@ -1,7 +1,19 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, Response
 from functools import wraps
-from database import fetchall, fetchone, execute, update_order_status
+from datetime import datetime, timedelta
+from database import fetchall, fetchone, execute, update_order_status, pool_stats, cache_stats, transaction
 from config import APP_CONFIG
+from order_queue import order_intake
+from cart_store import cart_store
+import invoices
+from invoices import invoice_cache
+from render_service import render_service
+import loyalty
+import catalog
+import farmer_stats
+import sales_rollup
+import stock_alerts
+import platform_counters
 
 admin_bp = Blueprint("admin", __name__, template_folder="../templates/admin")
 
@@ -30,26 +42,13 @@ def admin_required(f):
 @login_required
 @admin_required
 def dashboard():
-    totals = {}
-    totals['farmers'] = fetchone("SELECT COUNT(*) AS cnt FROM farmer")['cnt']
-    totals['customers'] = fetchone("SELECT COUNT(*) AS cnt FROM customer")['cnt']
-    totals['products'] = fetchone("SELECT COUNT(*) AS cnt FROM product")['cnt']
-    totals['orders'] = fetchone("SELECT COUNT(*) AS cnt FROM orders")['cnt']
-    totals['revenue'] = fetchone("SELECT COALESCE(SUM(TotalAmount),0) as r FROM orders")['r']
-    
-    # Add inventory statistics
-    inventory_stats = fetchone("""
-        SELECT 
-            COALESCE(SUM(QuantityAvailable), 0) as total_stock,
-            COALESCE(SUM(CASE WHEN QuantityAvailable <= 10 THEN 1 ELSE 0 END), 0) as low_stock_count,
-            COALESCE(SUM(CASE WHEN QuantityAvailable = 0 THEN 1 ELSE 0 END), 0) as out_of_stock_count
-        FROM product
-    """)
-    
-    if inventory_stats:
-        totals['total_stock'] = inventory_stats['total_stock']
-        totals['low_stock_count'] = inventory_stats['low_stock_count']
-        totals['out_of_stock_count'] = inventory_stats['out_of_stock_count']
+    # farmers, customers, products, orders, revenue and total_stock from
+    # the platform counters: no table scans, cached for a few seconds
+    totals = platform_counters.totals()
+    # low/out-of-stock counts come from the in-memory low-stock set
+    stock_counts = stock_alerts.counts()
+    totals['low_stock_count'] = stock_counts['low']
+    totals['out_of_stock_count'] = stock_counts['out']
     
     return flask_render("admin/dashboard.html", totals=totals)
 
@@ -72,6 +71,34 @@ def orders():
     """)
     return flask_render("admin/orders.html", orders=rows)
 
+ORDER_STATUSES = ('Pending', 'Processing', 'Shipped', 'Delivered', 'Completed', 'Cancelled')
+
+@admin_bp.route("/invoices/export")
+@login_required
+@admin_required
+def export_invoices():
+    """Every invoice of orders placed between two dates (inclusive) as one streamed ZIP"""
+    try:
+        start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d')
+        end = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d')
+    except ValueError:
+        flash("Pick a start and end date for the export", "danger")
+        return redirect(url_for('admin.orders'))
+    if end < start:
+        flash("The end date is before the start date", "danger")
+        return redirect(url_for('admin.orders'))
+    status = request.args.get('status') or None
+    if status and status not in ORDER_STATUSES:
+        flash("Unknown order status", "danger")
+        return redirect(url_for('admin.orders'))
+
+    filename = f"invoices_{start:%Y%m%d}_{end:%Y%m%d}{'_' + status.lower() if status else ''}.zip"
+    # the body is generated while it is sent; rows, renders and the archive
+    # never sit in memory all at once
+    return Response(invoices.export_zip(start, end + timedelta(days=1), status),
+                    mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 @admin_bp.route("/inventory")
 @login_required
 @admin_required
@@ -95,6 +122,7 @@ def inventory():
     """)
     
     # Group products by farmer
+    low = stock_alerts.low_products()
     farmers_inventory = {}
     for product in products:
         farmer_id = product['FarmerID']
@@ -109,7 +137,7 @@ def inventory():
         
         farmers_inventory[farmer_id]['products'].append(product)
         farmers_inventory[farmer_id]['total_stock_value'] += float(product['Price']) * int(product['QuantityAvailable'])
-        if product['QuantityAvailable'] <= 10:
+        if product['ProductID'] in low:
             farmers_inventory[farmer_id]['low_stock_count'] += 1
     
     return flask_render("admin/inventory.html", farmers_inventory=farmers_inventory, products=products)
@@ -132,9 +160,132 @@ def update_order_status_route():
     if not order_id or not new_status:
         return jsonify({'success': False, 'message': 'Missing order ID or status'}), 400
     
-    result = update_order_status(int(order_id), new_status)
+    try:
+        with transaction():
+            # the old status decides whether the order's sales leave or rejoin the rollups
+            order = fetchone("SELECT Status FROM orders WHERE OrderID = %s FOR UPDATE", (int(order_id),))
+            if not order:
+                return jsonify({'success': False, 'message': 'Order not found'}), 404
+            result = update_order_status(int(order_id), new_status)
+            sales_rollup.status_changed(int(order_id), order['Status'], new_status)
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    if result.get('success'):
+        # the status is printed on the invoice
+        invoice_cache.invalidate(int(order_id))
+        # completed (or no longer completed) orders change the points earned
+        loyalty.order_status_changed(int(order_id))
     return jsonify(result)
 
+@admin_bp.route("/api/pool-stats")
+@login_required
+@admin_required
+def api_pool_stats():
+    """Live connection pool telemetry for this worker process"""
+    return jsonify(pool_stats())
+
+@admin_bp.route("/api/cache-stats")
+@login_required
+@admin_required
+def api_cache_stats():
+    """Query cache hit/miss counters for this worker process"""
+    return jsonify(cache_stats())
+
+@admin_bp.route("/api/order-intake-stats")
+@login_required
+@admin_required
+def api_order_intake_stats():
+    """Order queue depth and group-commit batch metrics for this worker process"""
+    return jsonify(order_intake.stats())
+
+@admin_bp.route("/api/cart-stats")
+@login_required
+@admin_required
+def api_cart_stats():
+    """Cart LRU hit/miss counters for this worker process"""
+    return jsonify(cart_store.stats())
+
+@admin_bp.route("/api/invoice-cache-stats")
+@login_required
+@admin_required
+def api_invoice_cache_stats():
+    """Invoice PDF cache hits, renders and memory use for this worker process"""
+    return jsonify(invoice_cache.stats())
+
+@admin_bp.route("/api/render-stats")
+@login_required
+@admin_required
+def api_render_stats():
+    """PDF render pool load and job counters for this worker process"""
+    return jsonify(render_service.stats())
+
+@admin_bp.route("/api/loyalty-stats")
+@login_required
+@admin_required
+def api_loyalty_stats():
+    """Loyalty ledger totals and the last reconciliation report"""
+    return jsonify(loyalty.stats())
+
+@admin_bp.route("/api/loyalty-reconcile", methods=["POST"])
+@login_required
+@admin_required
+def api_loyalty_reconcile():
+    """Check every loyalty ledger row against order history now"""
+    return jsonify(loyalty.reconcile())
+
+@admin_bp.route("/api/farmer-stats-check", methods=["GET", "POST"])
+@login_required
+@admin_required
+def api_farmer_stats_check():
+    """Last farmer dashboard snapshot check; POST runs one now"""
+    if request.method == "POST":
+        return jsonify(farmer_stats.verify())
+    return jsonify(farmer_stats.stats())
+
+@admin_bp.route("/api/catalog-check", methods=["GET", "POST"])
+@login_required
+@admin_required
+def api_catalog_check():
+    """Last catalog read model check; POST runs one now"""
+    if request.method == "POST":
+        return jsonify(catalog.verify())
+    return jsonify(catalog.stats())
+
+@admin_bp.route("/api/sales-rollup-rebuild", methods=["POST"])
+@login_required
+@admin_required
+def api_sales_rollup_rebuild():
+    """Recompute the sales rollups from order history"""
+    sales_rollup.rebuild()
+    return jsonify({'success': True})
+
+@admin_bp.route("/api/platform-counters-check", methods=["GET", "POST"])
+@login_required
+@admin_required
+def api_platform_counters_check():
+    """Last platform counter check; POST runs one now"""
+    if request.method == "POST":
+        report = platform_counters.recount()
+        if report is None:
+            return jsonify({'success': False, 'message': 'A platform counter check is already running'}), 409
+        return jsonify(report)
+    return jsonify(platform_counters.stats())
+
+@admin_bp.route("/api/stock-alerts")
+@login_required
+@admin_required
+def api_stock_alerts():
+    """Low-stock set of this worker process"""
+    return jsonify(stock_alerts.counts())
+
+@admin_bp.route("/api/stock-alerts-reload", methods=["POST"])
+@login_required
+@admin_required
+def api_stock_alerts_reload():
+    """Reload this worker's low-stock set from product"""
+    stock_alerts.load()
+    return jsonify(dict(stock_alerts.counts(), success=True))
+
 @admin_bp.route("/settings", methods=["GET", "POST"])
 @login_required
 @admin_required
@@ -1,8 +1,8 @@
 from flask import Blueprint, request, render_template, redirect, url_for, session, flash
 from werkzeug.security import generate_password_hash, check_password_hash
-from database import fetchone, fetchall, execute
-from database import get_conn
+from database import fetchone, execute, transaction
 from config import APP_CONFIG
+import platform_counters
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -57,12 +57,7 @@ def login():
         if stored == password:
             # update to hashed password
             hashed = generate_password_hash(password)
-            conn = get_conn()
-            cur = conn.cursor()
-            cur.execute("UPDATE users SET Password=%s WHERE UserID=%s", (hashed, user['UserID']))
-            conn.commit()
-            cur.close()
-            conn.close()
+            execute("UPDATE users SET Password=%s WHERE UserID=%s", (hashed, user['UserID']))
             user['Password'] = hashed
         # Now check hashed
         if check_password_hash(user['Password'], password):
@@ -117,22 +112,25 @@ def register():
             
             if user_type == 'Farmer':
                 # Create Farmer first
-                farmer_query = """
-                    INSERT INTO farmer (Name, Contact, Location)
-                    VALUES (%s, %s, %s)
-                """
-                execute(farmer_query, (full_name, phone, location))
+                # the account, its user row and the platform count commit together
+                with transaction():
+                    farmer_query = """
+                        INSERT INTO farmer (Name, Contact, Location)
+                        VALUES (%s, %s, %s)
+                    """
+                    execute(farmer_query, (full_name, phone, location))
+                    platform_counters.add({'farmers': 1})
                 
-                # Get the inserted farmer ID
-                farmer = fetchone("SELECT FarmerID FROM farmer WHERE Name = %s AND Contact = %s", (full_name, phone))
-                farmer_id = farmer['FarmerID'] if farmer else None
+                    # Get the inserted farmer ID
+                    farmer = fetchone("SELECT FarmerID FROM farmer WHERE Name = %s AND Contact = %s", (full_name, phone))
+                    farmer_id = farmer['FarmerID'] if farmer else None
                 
-                # Create user entry
-                user_query = """
-                    INSERT INTO users (Email, Password, UserType, RelatedID, CreatedAt)
-                    VALUES (%s, %s, %s, %s, NOW())
-                """
-                execute(user_query, (email, hashed_password, 'Farmer', farmer_id))
+                    # Create user entry
+                    user_query = """
+                        INSERT INTO users (Email, Password, UserType, RelatedID, CreatedAt)
+                        VALUES (%s, %s, %s, %s, NOW())
+                    """
+                    execute(user_query, (email, hashed_password, 'Farmer', farmer_id))
                 
                 # Auto-login the user
                 user = get_user_by_email(email)
@@ -142,22 +140,25 @@ def register():
                     return redirect(url_for('farmer.dashboard'))
             else:
                 # Create Customer
-                customer_query = """
-                    INSERT INTO customer (Name, Email, Location)
-                    VALUES (%s, %s, %s)
-                """
-                execute(customer_query, (full_name, email, location))
+                # the account, its user row and the platform count commit together
+                with transaction():
+                    customer_query = """
+                        INSERT INTO customer (Name, Email, Location)
+                        VALUES (%s, %s, %s)
+                    """
+                    execute(customer_query, (full_name, email, location))
+                    platform_counters.add({'customers': 1})
                 
-                # Get the inserted customer ID
-                customer = fetchone("SELECT CustomerID FROM customer WHERE Name = %s AND Email = %s", (full_name, email))
-                customer_id = customer['CustomerID'] if customer else None
+                    # Get the inserted customer ID
+                    customer = fetchone("SELECT CustomerID FROM customer WHERE Name = %s AND Email = %s", (full_name, email))
+                    customer_id = customer['CustomerID'] if customer else None
                 
-                # Create user entry
-                user_query = """
-                    INSERT INTO users (Email, Password, UserType, RelatedID, CreatedAt)
-                    VALUES (%s, %s, %s, %s, NOW())
-                """
-                execute(user_query, (email, hashed_password, 'Customer', customer_id))
+                    # Create user entry
+                    user_query = """
+                        INSERT INTO users (Email, Password, UserType, RelatedID, CreatedAt)
+                        VALUES (%s, %s, %s, %s, NOW())
+                    """
+                    execute(user_query, (email, hashed_password, 'Customer', customer_id))
                 
                 # Auto-login the user
                 user = get_user_by_email(email)
@@ -1,14 +1,40 @@
-from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for, flash
-from database import fetchall, fetchone, place_order_proc, call_proc, add_product_review, get_customer_loyalty_points, get_seasonal_products
+from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for, flash, make_response
+from database import fetchall, fetchone, add_product_review, get_products_by_ids
 from functools import wraps
-from config import APP_CONFIG
+from datetime import datetime
+from config import APP_CONFIG, LOYALTY_CONFIG
+from order_engine import place_order, validate_cart, OrderError
+from order_queue import order_intake
+from reservations import reservations
+from facets import product_facets, FACETS, DEFAULT_COUNTS
+from search import product_search
+from suggest import suggestions
+from cart_store import cart_store
+from invoices import invoice_cache
+import invoices
+from render_service import render_service, RenderBusy
+from routes.jobs import pdf_response
+import catalog
+import order_history
+import farmer_stats
+# the module name is taken by the loyalty page view below
+import loyalty as loyalty_ledger
 
 customer_bp = Blueprint("customer", __name__, template_folder="../templates/customer")
 
+ORDERS_PAGE_SIZE = 10
+
 # helper
 def flask_render(tpl, **kwargs):
     return render_template(tpl, app_config=APP_CONFIG, **kwargs)
 
+def _parse_date(value):
+    """A YYYY-MM-DD query parameter as a date, or None"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
 def login_required(f):
     from functools import wraps
     @wraps(f)
@@ -35,23 +61,17 @@ def role_required(role):
 @role_required("Customer")
 def orders():
     customer_id = session['user']['RelatedID']
-    # Fetch orders for this customer with product details from order_product junction table
-    orders_list = fetchall("""
-        SELECT 
-            o.OrderID, 
-            o.OrderDate, 
-            o.Status, 
-            o.TotalAmount,
-            p.Name as ProductName,
-            op.Quantity,
-            p.Price as UnitPrice
-        FROM orders o
-        JOIN order_product op ON o.OrderID = op.OrderID
-        JOIN product p ON op.ProductID = p.ProductID
-        WHERE o.CustomerID = %s
-        ORDER BY o.OrderDate DESC
-    """, (customer_id,))
-    return flask_render("customer/orders.html", orders=orders_list)
+    filters = {
+        'status': request.args.get('status') or None,
+        'start': _parse_date(request.args.get('from')),
+        'end': _parse_date(request.args.get('to')),
+    }
+    # one page of orders with their lines, not the whole history
+    orders_list, next_cursor = order_history.page(
+        customer_id, cursor=request.args.get('cursor'), limit=ORDERS_PAGE_SIZE, **filters)
+    return flask_render("customer/orders.html", orders=orders_list, next_cursor=next_cursor,
+                        filters=filters, statuses=order_history.STATUSES,
+                        paged=bool(request.args.get('cursor')))
 
 @customer_bp.route("/order/<int:order_id>")
 @login_required
@@ -90,257 +110,168 @@ def order_detail(order_id):
 @login_required
 @role_required("Customer")
 def download_invoice(order_id):
-    from flask import make_response
-    from io import BytesIO
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.lib import colors
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-    
     customer_id = session['user']['RelatedID']
     
     # Fetch order details with all products
-    order_items = fetchall("""
-        SELECT 
-            o.OrderID, 
-            o.OrderDate, 
-            o.Status, 
-            o.TotalAmount,
-            op.Quantity,
-            p.Name as ProductName,
-            p.Price as UnitPrice,
-            c.Name as CustomerName,
-            c.Location as CustomerLocation,
-            c.Email as CustomerEmail,
-            f.Name as FarmerName,
-            f.Location as FarmerLocation
-        FROM orders o
-        JOIN order_product op ON o.OrderID = op.OrderID
-        JOIN product p ON op.ProductID = p.ProductID
-        JOIN customer c ON o.CustomerID = c.CustomerID
-        JOIN farmer f ON p.FarmerID = f.FarmerID
-        WHERE o.OrderID = %s AND o.CustomerID = %s
-    """, (order_id, customer_id))
+    order_items = invoices.load_rows(order_id, customer_id)
     
     if not order_items:
         flash("Order not found", "error")
         return redirect(url_for('customer.orders'))
     
-    # First item contains order and customer info
-    order = order_items[0]
-    
-    # Create PDF in memory
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72,
-                          topMargin=72, bottomMargin=18)
-    
-    # Container for PDF elements
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#10b981'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#059669'),
-        spaceAfter=12,
-        spaceBefore=12
-    )
-    
-    # Title
-    elements.append(Paragraph("FARMCONNECT INVOICE", title_style))
-    elements.append(Spacer(1, 12))
-    
-    # Invoice details
-    invoice_data = [
-        ['Invoice Number:', f'INV-{order["OrderID"]:06d}', 'Order ID:', f'#{order["OrderID"]}'],
-        ['Date:', str(order['OrderDate']), 'Status:', order['Status']]
-    ]
-    
-    invoice_table = Table(invoice_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 2*inch])
-    invoice_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
-        ('BACKGROUND', (2, 0), (2, -1), colors.HexColor('#f3f4f6')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
-    ]))
-    
-    elements.append(invoice_table)
-    elements.append(Spacer(1, 20))
-    
-    # Customer Details
-    elements.append(Paragraph("Customer Details", heading_style))
-    customer_data = [
-        ['Name:', order['CustomerName']],
-        ['Email:', order['CustomerEmail']],
-        ['Location:', order['CustomerLocation']]
-    ]
-    
-    customer_table = Table(customer_data, colWidths=[1.5*inch, 5*inch])
-    customer_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#fef3c7')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
-    ]))
-    
-    elements.append(customer_table)
-    elements.append(Spacer(1, 20))
-    
-    # Order Items
-    elements.append(Paragraph("Order Details", heading_style))
-    
-    # Table header
-    items_data = [['Product', 'Farmer', 'Quantity', 'Unit Price', 'Subtotal']]
-    
-    # Add each product
-    for item in order_items:
-        subtotal = float(item['UnitPrice']) * int(item['Quantity'])
-        items_data.append([
-            item['ProductName'],
-            f"{item['FarmerName']}\n{item['FarmerLocation']}",
-            str(item['Quantity']),
-            f"₹{item['UnitPrice']:.2f}",
-            f"₹{subtotal:.2f}"
-        ])
-    
-    items_table = Table(items_data, colWidths=[2*inch, 1.8*inch, 0.8*inch, 1*inch, 1*inch])
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (2, 0), (2, -1), 'CENTER'),
-        ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')])
-    ]))
-    
-    elements.append(items_table)
-    elements.append(Spacer(1, 20))
-    
-    # Totals
-    totals_data = [
-        ['Subtotal:', f"₹{order['TotalAmount']:.2f}"],
-        ['Shipping:', '₹0.00'],
-        ['Tax (0%):', '₹0.00'],
-        ['', ''],
-        ['Total Amount:', f"₹{order['TotalAmount']:.2f}"]
-    ]
-    
-    totals_table = Table(totals_data, colWidths=[5*inch, 1.5*inch])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (0, 2), 'Helvetica'),
-        ('FONTNAME', (0, 4), (-1, 4), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 3), 10),
-        ('FONTSIZE', (0, 4), (-1, 4), 14),
-        ('TEXTCOLOR', (0, 4), (-1, 4), colors.HexColor('#10b981')),
-        ('LINEABOVE', (0, 4), (-1, 4), 2, colors.HexColor('#10b981')),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    
-    elements.append(totals_table)
-    elements.append(Spacer(1, 30))
-    
-    # Footer
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.grey,
-        alignment=TA_CENTER
-    )
-    
-    elements.append(Paragraph("Thank you for shopping with FarmConnect!", footer_style))
-    elements.append(Paragraph("Support local farmers, eat fresh & healthy.", footer_style))
-    elements.append(Spacer(1, 10))
-    elements.append(Paragraph("FarmConnect - Fresh from Farm to Table", footer_style))
-    elements.append(Paragraph("Email: support@farmconnect.com", footer_style))
-    
-    # Build PDF
-    doc.build(elements)
-    
-    # Get PDF data
-    pdf_data = buffer.getvalue()
-    buffer.close()
-    
-    # Send PDF as response
-    response = make_response(pdf_data)
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=invoice_{order_id}.pdf'
+    # Rendered at most once per version of the order; repeat downloads are 304s
+    etag = invoices.content_hash(order_items)
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        pdf_data = invoice_cache.lookup(order_id, etag)
+        if pdf_data is None:
+            # rendered in the render_service pool; slow documents come back as a job to poll
+            try:
+                pdf_data, job_id = render_service.render(
+                    'invoice', (order_items,), owner=session['user']['UserID'],
+                    filename=f'invoice_{order_id}.pdf',
+                    on_done=lambda pdf: invoice_cache.store(order_id, etag, pdf))
+            except RenderBusy as e:
+                flash(str(e), "error")
+                return redirect(url_for('customer.order_detail', order_id=order_id))
+            if pdf_data is None:
+                return redirect(url_for('jobs.status', job_id=job_id))
+        response = pdf_response(pdf_data, f'invoice_{order_id}.pdf')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
     return response
 
+SHOP_PAGE_SIZE = 24
+SEARCH_LIMIT = 100
+
+def _shop_filters():
+    """Catalog filters and sort order from the query string"""
+    args = request.args
+    return {
+        'category': args.get('category'),
+        'season': args.get('season'),
+        'farmer_id': args.get('farmer', type=int),
+        'min_price': args.get('min_price', type=float),
+        'max_price': args.get('max_price', type=float),
+        'in_stock': args.get('in_stock') == '1',
+        'sort': args.get('sort', 'newest'),
+    }
+
+def _apply_holds(products):
+    # show what is actually available to this customer after other carts' holds
+    customer_id = session['user']['RelatedID']
+    for p in products:
+        if p.get('QuantityAvailable') is not None:
+            p['QuantityAvailable'] = reservations.available(p['ProductID'], p['QuantityAvailable'], customer_id)
+    return products
+
+def _search(q, filters, limit=SEARCH_LIMIT):
+    """Search hits narrowed by the shop filters, plus facet counts over the hits"""
+    hits = product_search.search(q, limit=limit)
+    scores = dict(hits)
+    ids = [pid for pid, _ in hits]
+    facets = product_facets.query(filters, limit=len(ids), within=ids)
+    if facets is not None:
+        allowed = set(facets['ids'])
+        ids = [pid for pid in ids if pid in allowed]
+    products = catalog.rows(ids)
+    # relevance order unless the customer picked another sort
+    column, direction = catalog.SORTS.get(filters['sort'], (None, None))
+    if column:
+        products.sort(key=lambda p: p[column], reverse=direction == 'DESC')
+    for p in products:
+        p['score'] = scores[p['ProductID']]
+    return products, facets
+
 @customer_bp.route("/shop")
 @login_required
 @role_required("Customer")
 def shop():
-    # basic shop with filters
-    category = request.args.get('category')
-    season = request.args.get('season')
-    
-    # Use GetSeasonalProducts stored procedure if season filter is applied
-    if season and season.lower() != 'all':
-        products = get_seasonal_products(season)
-        # Filter by category if also specified
-        if category and category.lower() != 'all':
-            products = [p for p in products if p.get('CategoryName', '').lower() == category.lower()]
+    filters = _shop_filters()
+    q = request.args.get('q', '').strip()
+    if q:
+        products, facets = _search(q, filters)
+        next_cursor = None
     else:
-        # Regular query with category filter - include season data and quantity
-        q = """SELECT v.*, p.ImagePath, p.QuantityAvailable,
-               GROUP_CONCAT(s.SeasonName SEPARATOR ', ') as SeasonName
-               FROM v_productdetails v 
-               JOIN Product p ON v.ProductID = p.ProductID
-               LEFT JOIN product_season ps ON p.ProductID = ps.ProductID
-               LEFT JOIN season s ON ps.SeasonID = s.SeasonID"""
-        params = []
-        where = []
-        if category and category.lower() != 'all':
-            where.append("v.CategoryName=%s"); params.append(category)
-        if where:
-            q += " WHERE " + " AND ".join(where)
-        q += " GROUP BY v.ProductID, v.ProductName, v.Price, v.CategoryName, v.FarmerName, p.ImagePath, p.QuantityAvailable"
-        products = fetchall(q, tuple(params))
-    
-    return flask_render("customer/shop.html", products=products)
+        # first page only; further pages come from api_products as the user scrolls
+        products, next_cursor = catalog.page(limit=SHOP_PAGE_SIZE, **filters)
+        # option counts for the filter controls, from the in-memory facet index
+        facets = product_facets.query(filters)
+    _apply_holds(products)
+    return flask_render("customer/shop.html", products=products, next_cursor=next_cursor,
+                        filters=filters, facets=facets, query=q)
+
+@customer_bp.route("/api/search")
+@login_required
+@role_required("Customer")
+def api_search():
+    """Ranked, typo-tolerant product search narrowed by the shop filters"""
+    q = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', SHOP_PAGE_SIZE, type=int), SEARCH_LIMIT))
+    products, facets = _search(q, _shop_filters(), limit) if q else ([], None)
+    _apply_holds(products)
+    return jsonify({
+        'query': q,
+        'products': products,
+        'counts': facets['counts'] if facets else None,
+        'html': render_template("customer/_product_cards.html", products=products)
+    })
+
+@customer_bp.route("/api/products")
+@login_required
+@role_required("Customer")
+def api_products():
+    """Keyset-paginated catalog page for infinite scroll"""
+    limit = max(1, min(request.args.get('limit', SHOP_PAGE_SIZE, type=int), 100))
+    products, next_cursor = catalog.page(cursor=request.args.get('cursor'), limit=limit, **_shop_filters())
+    _apply_holds(products)
+    return jsonify({
+        'products': products,
+        'next_cursor': next_cursor,
+        'html': render_template("customer/_product_cards.html", products=products)
+    })
+
+@customer_bp.route("/api/facets")
+@login_required
+@role_required("Customer")
+def api_facets():
+    """Facet counts (and optionally matching product IDs) for the shop filters"""
+    requested = [f for f in request.args.get('facets', '').split(',') if f in FACETS]
+    limit = max(0, min(request.args.get('limit', 0, type=int), 1000))
+    result = product_facets.query(_shop_filters(), limit=limit, facets=requested or DEFAULT_COUNTS)
+    if result is None:
+        return jsonify({'error': 'Facet index is still loading'}), 503
+    return jsonify(result)
+
+@customer_bp.route("/api/suggest")
+@login_required
+@role_required("Customer")
+def api_suggest():
+    """Autocomplete for the shop search box; answered from memory"""
+    limit = max(1, min(request.args.get('limit', 8, type=int), 20))
+    return jsonify({'suggestions': suggestions.suggest(request.args.get('q', ''), limit)})
+
+# CART stored server-side; the session only keeps its ID
+def _cart_id(create=False):
+    cart_id = session.get('cart_id')
+    if cart_id is None and create:
+        cart_id = session['cart_id'] = cart_store.new_id()
+    return cart_id
+
+def _cart(fresh=False):
+    return cart_store.get(session.get('cart_id'), fresh=fresh)
 
-# CART stored in session
 @customer_bp.route("/cart")
 @login_required
 @role_required("Customer")
 def cart():
-    cart = session.get('cart', {})
-    # load product details
+    cart = _cart()
+    # load product details in one batched query
+    products = get_products_by_ids(cart.keys())
     items = []
     for pid, qty in cart.items():
-        row = fetchone("SELECT ProductID, Name, Price, QuantityAvailable FROM Product WHERE ProductID=%s", (pid,))
+        row = products.get(int(pid))
         if row:
             row['quantity'] = qty
             row['subtotal'] = float(row['Price']) * int(qty)
@@ -353,34 +284,38 @@ def cart():
 @role_required("Customer")
 def checkout():
     customer_id = session['user']['RelatedID']
-    cart = session.get('cart', {})
+    # read past the per-process cache: lines may have been added on another worker
+    cart = _cart(fresh=True)
     
     if not cart:
         flash("Your cart is empty", "error")
         return redirect(url_for('customer.shop'))
     
     # Get loyalty points
-    loyalty_points = get_customer_loyalty_points(customer_id)
+    loyalty_points = loyalty_ledger.balance(customer_id)
     
     # load product details and check stock availability
     items = []
     out_of_stock = []
     insufficient_stock = []
     
+    products = get_products_by_ids(cart.keys())
     for pid, qty in cart.items():
-        row = fetchone("SELECT ProductID, Name, Price, QuantityAvailable FROM Product WHERE ProductID=%s", (pid,))
+        row = products.get(int(pid))
         if row:
             row['quantity'] = qty
             row['subtotal'] = float(row['Price']) * int(qty)
             
-            # Check stock availability
-            if row['QuantityAvailable'] == 0:
+            # Check stock availability and hold it for the rest of checkout
+            ok, available = reservations.reserve(customer_id, pid, qty, row['QuantityAvailable'],
+                                                 ttl=reservations.checkout_ttl)
+            if available == 0:
                 out_of_stock.append(row['Name'])
-            elif row['QuantityAvailable'] < qty:
+            elif not ok:
                 insufficient_stock.append({
                     'name': row['Name'],
                     'requested': qty,
-                    'available': row['QuantityAvailable']
+                    'available': available
                 })
             
             items.append(row)
@@ -424,20 +359,22 @@ def cart_add():
     if not product:
         return jsonify({'success': False, 'message': 'Product not found'}), 404
     
-    # Check current cart quantity
-    cart = session.get('cart', {})
-    current_qty = cart.get(str(pid), 0)
-    new_total_qty = current_qty + qty
+    # Atomic increment, so clicks from several tabs all count
+    cart_id = _cart_id(create=True)
+    new_total_qty = cart_store.add(cart_id, pid, qty)
     
-    if new_total_qty > product['QuantityAvailable']:
+    # Hold the stock for this cart; other carts' holds count as sold
+    ok, available = reservations.reserve(session['user']['RelatedID'], pid, new_total_qty,
+                                         product['QuantityAvailable'])
+    if not ok:
+        # give the increment back
+        current_qty = cart_store.add(cart_id, pid, -qty)
         return jsonify({
             'success': False, 
-            'message': f'Only {product["QuantityAvailable"]} units of {product["Name"]} available. You already have {current_qty} in cart.'
+            'message': f'Only {available} units of {product["Name"]} available. You already have {current_qty} in cart.'
         }), 400
     
-    cart[str(pid)] = new_total_qty
-    session['cart'] = cart
-    return jsonify({'success': True, 'cartCount': sum(cart.values())})
+    return jsonify({'success': True, 'cartCount': sum(cart_store.get(cart_id).values())})
 
 @customer_bp.route("/cart/update", methods=["POST"])
 @login_required
@@ -451,26 +388,22 @@ def cart_update():
     if not product:
         return jsonify({'success': False, 'message': 'Product not found'}), 404
     
-    if qty > product['QuantityAvailable']:
+    ok, available = reservations.reserve(session['user']['RelatedID'], pid, max(qty, 0),
+                                         product['QuantityAvailable'])
+    if not ok:
         return jsonify({
             'success': False, 
-            'message': f'Only {product["QuantityAvailable"]} units of {product["Name"]} available'
+            'message': f'Only {available} units of {product["Name"]} available'
         }), 400
     
-    cart = session.get('cart', {})
-    if qty <= 0:
-        cart.pop(str(pid), None)
-    else:
-        cart[str(pid)] = qty
-    session['cart'] = cart
+    cart_store.set(_cart_id(create=True), pid, qty)
     return jsonify({'success': True})
 
 @customer_bp.route("/order/place", methods=["POST"])
 @login_required
 @role_required("Customer")
 def order_place():
-    from database import execute, get_conn
-    cart = session.get('cart', {})
+    cart = _cart(fresh=True)
     if not cart:
         return jsonify({'success': False, 'message': 'Cart empty'}), 400
     
@@ -479,79 +412,63 @@ def order_place():
     # Get loyalty points to use from the request
     loyalty_points_used = int(request.form.get('loyalty_points_used', 0))
     
-    # First, check all products have sufficient stock
-    for pid, qty in cart.items():
-        product = fetchone("SELECT QuantityAvailable, Name FROM Product WHERE ProductID=%s", (pid,))
-        if not product:
-            return jsonify({'success': False, 'message': f'Product ID {pid} not found'}), 404
-        if product['QuantityAvailable'] < qty:
-            return jsonify({
-                'success': False, 
-                'message': f'Insufficient stock for {product["Name"]}. Only {product["QuantityAvailable"]} available.'
-            }), 400
-    
-    # Calculate cart total
-    cart_total = 0
-    for pid, qty in cart.items():
-        row = fetchone("SELECT Price FROM Product WHERE ProductID=%s", (pid,))
-        if row:
-            cart_total += float(row['Price']) * int(qty)
-    
-    # Apply loyalty discount (1 point = ₹1 discount)
-    discount = min(loyalty_points_used, cart_total)
-    final_total = cart_total - discount
-    
-    # Use a transaction to ensure atomicity
-    cnx = get_conn()
-    cursor = cnx.cursor()
+    # Queued intake: validate now, commit later in a group with other orders
+    if order_intake.enabled:
+        lines, failures = validate_cart(customer_id, cart)
+        if failures:
+            return jsonify({'success': False, 'message': failures[0]['message'], 'failures': failures}), 400
+        try:
+            token = order_intake.submit(customer_id, lines, loyalty_points_used)
+        except OrderError as e:
+            return jsonify({'success': False, 'message': e.message}), 503
+        # the ordered lines leave the cart once order_status sees the commit
+        session['pending_orders'] = session.get('pending_orders', []) + [token]
+        return jsonify({
+            'success': True,
+            'queued': True,
+            'token': token,
+            'status_url': url_for('customer.order_status', token=token)
+        }), 202
     
+    # Whole cart goes in as one order in a single transaction
     try:
-        # Place orders for each product and deduct stock
-        order_ids = []
-        for pid, qty in cart.items():
-            # Place order using stored procedure
-            cursor.callproc('PlaceOrder', (customer_id, int(pid), int(qty), 0))
-            cnx.commit()
-            
-            # Get the order ID
-            cursor.execute("SELECT LAST_INSERT_ID()")
-            order_id = cursor.fetchone()[0]
-            order_ids.append(order_id)
-            
-            # Deduct quantity from product stock
-            cursor.execute("""
-                UPDATE Product 
-                SET QuantityAvailable = QuantityAvailable - %s 
-                WHERE ProductID = %s
-            """, (qty, int(pid)))
-            cnx.commit()
-        
-        # Update the last order total to reflect the discount
-        if order_ids and discount > 0:
-            cursor.execute("""
-                UPDATE orders 
-                SET TotalAmount = TotalAmount - %s 
-                WHERE OrderID = %s
-            """, (discount, order_ids[0]))
-            cnx.commit()
-        
-        cursor.close()
-        cnx.close()
-        
-        session.pop('cart', None)
-        
-        return jsonify({
-            'success': True, 
-            'order_ids': order_ids,
-            'discount_applied': discount,
-            'final_total': final_total
-        })
-        
+        result = place_order(customer_id, cart, loyalty_points_used)
+    except OrderError as e:
+        return jsonify({'success': False, 'message': e.message, 'failures': e.failures}), 400
     except Exception as e:
-        cnx.rollback()
-        cursor.close()
-        cnx.close()
         return jsonify({'success': False, 'message': f'Error placing order: {str(e)}'}), 500
+    
+    # only what was ordered: lines added meanwhile stay in the cart
+    cart_store.subtract(session.get('cart_id'), result['lines'])
+    
+    return jsonify({
+        'success': True, 
+        'order_id': result['order_id'],
+        'order_ids': [result['order_id']],
+        'discount_applied': result['discount_applied'],
+        'final_total': result['final_total']
+    })
+
+@customer_bp.route("/order/status/<token>")
+@login_required
+@role_required("Customer")
+def order_status(token):
+    """Poll an order queued by order_place in group-commit mode"""
+    ticket = order_intake.status(token, session['user']['RelatedID'])
+    if ticket is None:
+        return jsonify({'success': False, 'message': 'Unknown order token'}), 404
+    pending = session.get('pending_orders', [])
+    if ticket['state'] != 'queued' and token in pending:
+        session['pending_orders'] = [t for t in pending if t != token]
+        if ticket['state'] == 'committed':
+            cart_store.subtract(session.get('cart_id'), ticket['lines'])
+    if ticket['state'] == 'committed':
+        return jsonify(dict(ticket['result'], success=True, state='committed',
+                            order_ids=[ticket['result']['order_id']]))
+    if ticket['state'] == 'failed':
+        return jsonify({'success': False, 'state': 'failed', 'message': ticket['message'],
+                        'failures': ticket['failures']})
+    return jsonify({'success': True, 'state': 'queued'})
 
 @customer_bp.route("/review/add", methods=["POST"])
 @login_required
@@ -562,6 +479,9 @@ def add_review():
     rating = request.form.get('rating')
     comment = request.form.get('comment', '')
     result = add_product_review(customer_id, int(product_id), float(rating), comment)
+    if result.get('success'):
+        catalog.refresh_products([int(product_id)])
+        farmer_stats.products_changed([int(product_id)])
     return jsonify(result)
 
 @customer_bp.route("/loyalty")
@@ -569,7 +489,7 @@ def add_review():
 @role_required("Customer")
 def loyalty():
     customer_id = session['user']['RelatedID']
-    loyalty_points = get_customer_loyalty_points(customer_id)
+    account = loyalty_ledger.account(customer_id)
     
     # Get order history to show points earned
     orders = fetchall("""
@@ -582,7 +502,9 @@ def loyalty():
     total_spent = sum(float(order['TotalAmount']) for order in orders)
     
     return flask_render("customer/loyalty.html", 
-                       loyalty_points=loyalty_points, 
+                       loyalty_points=account['Balance'], 
+                       loyalty_earned=account['Earned'],
+                       loyalty_redeemed=account['Redeemed'],
                        orders=orders,
                        total_spent=total_spent)
 
@@ -592,8 +514,16 @@ def loyalty():
 def api_loyalty_points():
     """API endpoint to get loyalty points for AJAX requests"""
     customer_id = session['user']['RelatedID']
-    loyalty_points = get_customer_loyalty_points(customer_id)
-    return jsonify({'points': loyalty_points})
+    account = loyalty_ledger.account(customer_id)
+    # one ledger row per request; browsers reuse it briefly and then revalidate
+    etag = f"{customer_id}-{account['Earned']}-{account['Redeemed']}"
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = jsonify({'points': account['Balance']})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"private, max-age={LOYALTY_CONFIG['api_max_age']}"
+    return response
 
 @customer_bp.route("/settings", methods=["GET", "POST"])
 @login_required
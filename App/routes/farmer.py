@@ -1,15 +1,18 @@
 from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for, flash, send_file
 from functools import wraps
-from database import fetchall, fetchone, execute, get_farmer_report
-from config import APP_CONFIG
+from database import fetchall, fetchone, execute, transaction
+import catalog
+import farmer_stats
+import forecast
+import product_import
+import product_updates
+import stock_alerts
+import platform_counters
+import sales_rollup
+from config import APP_CONFIG, FORECAST_CONFIG, STOCK_ALERT_CONFIG
 from io import BytesIO
 from datetime import datetime
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
+from render_service import render_service, RenderBusy
 
 farmer_bp = Blueprint("farmer", __name__, template_folder="../templates/farmer")
 
@@ -41,47 +44,19 @@ def role_required(role):
 @role_required("Farmer")
 def dashboard():
     farmer_id = session['user']['RelatedID']
-    # gather metrics
-    total_products_row = fetchone("SELECT GetFarmerProductCount(%s) AS total", (farmer_id,))
-    total_products = total_products_row['total'] if total_products_row else 0
-    
-    # Get total stock quantity
-    total_stock_row = fetchone("""
-        SELECT COALESCE(SUM(QuantityAvailable), 0) as TotalStock,
-               COALESCE(SUM(CASE WHEN QuantityAvailable <= 10 THEN 1 ELSE 0 END), 0) as LowStockCount,
-               COALESCE(SUM(CASE WHEN QuantityAvailable = 0 THEN 1 ELSE 0 END), 0) as OutOfStockCount
-        FROM product 
-        WHERE FarmerID = %s
-    """, (farmer_id,))
-    
-    # total orders and revenue via GetFarmerReport
-    farmer_report = get_farmer_report(farmer_id)
-    overview = farmer_report[0][0] if farmer_report and farmer_report[0] else {}
-    product_rows = farmer_report[1] if farmer_report and len(farmer_report) > 1 else []
-    
-    # Add stock information to overview
-    if total_stock_row:
-        overview['TotalStock'] = total_stock_row['TotalStock']
-        overview['LowStockCount'] = total_stock_row['LowStockCount']
-        overview['OutOfStockCount'] = total_stock_row['OutOfStockCount']
-    
-    # Enhance product rows with quantity
-    enhanced_products = fetchall("""
-        SELECT 
-            p.Name as ProductName,
-            p.Price,
-            p.QuantityAvailable,
-            COALESCE(SUM(op.Quantity), 0) as TotalUnitsSold,
-            COALESCE(SUM(o.TotalAmount), 0) as ProductRevenue
-        FROM product p
-        LEFT JOIN order_product op ON p.ProductID = op.ProductID
-        LEFT JOIN orders o ON op.OrderID = o.OrderID
-        WHERE p.FarmerID = %s
-        GROUP BY p.ProductID, p.Name, p.Price, p.QuantityAvailable
-        ORDER BY ProductRevenue DESC
-    """, (farmer_id,))
-    
-    return flask_render("farmer/dashboard.html", overview=overview, products=enhanced_products, total_products=total_products)
+    # the dashboard figures come from the farmer's stats snapshot ...
+    stats = farmer_stats.snapshot(farmer_id)
+    forecasts = forecast.recommendations(farmer_id, stats['products'])
+    # ... and the low/out-of-stock counts from the in-memory low-stock set
+    low = stock_alerts.low_products(farmer_id)
+    stats['LowStockCount'] = len(low)
+    stats['OutOfStockCount'] = sum(1 for qty in low.values() if qty <= 0)
+    return flask_render("farmer/dashboard.html", overview=stats, products=stats['products'],
+                        total_products=stats['TotalProducts'], low=low,
+                        unread_alerts=stock_alerts.unread_count(farmer_id),
+                        restock=[f for f in forecasts if f['SuggestedRestock'] > 0][:10],
+                        cover={f['ProductID']: f['DaysOfCover'] for f in forecasts},
+                        horizon_days=FORECAST_CONFIG['horizon_days'])
 
 @farmer_bp.route("/products")
 @login_required
@@ -100,15 +75,17 @@ def products():
             p.Freshness,
             (SELECT COALESCE(SUM(op.Quantity), 0) FROM order_product op WHERE op.ProductID=p.ProductID) as Quantity,
             COALESCE((SELECT AVG(r.Rating) FROM review r WHERE r.ProductID=p.ProductID), 0) as avg_rating, 
-            COALESCE((SELECT COUNT(DISTINCT op.OrderID) FROM order_product op WHERE op.ProductID=p.ProductID), 0) as total_orders 
+            COALESCE((SELECT COUNT(DISTINCT op.OrderID) FROM order_product op WHERE op.ProductID=p.ProductID), 0) as total_orders,
+            COALESCE(st.Threshold, %s) as AlertThreshold
         FROM product p 
         LEFT JOIN category c ON p.CategoryID = c.CategoryID
+        LEFT JOIN stock_threshold st ON st.ProductID = p.ProductID
         LEFT JOIN product_season ps ON p.ProductID = ps.ProductID
         LEFT JOIN season s ON ps.SeasonID = s.SeasonID
         WHERE p.FarmerID=%s
-        GROUP BY p.ProductID, p.FarmerID, p.Name, c.CategoryName, p.Price, p.QuantityAvailable, p.Freshness
+        GROUP BY p.ProductID, p.FarmerID, p.Name, c.CategoryName, p.Price, p.QuantityAvailable, p.Freshness, st.Threshold
         ORDER BY p.ProductID DESC
-    """, (farmer_id,))
+    """, (STOCK_ALERT_CONFIG['default_threshold'], farmer_id))
     return flask_render("farmer/products.html", products=rows)
 
 @farmer_bp.route("/product/edit_price", methods=["POST"])
@@ -120,7 +97,10 @@ def edit_price():
     if not product_id or not new_price:
         return jsonify({'success': False, 'message': 'Missing fields'}), 400
     try:
-        execute("UPDATE product SET Price=%s WHERE ProductID=%s", (new_price, product_id))
+        with transaction():
+            execute("UPDATE product SET Price=%s WHERE ProductID=%s", (new_price, product_id))
+            catalog.refresh_products([product_id])
+            farmer_stats.products_changed([product_id])
         return jsonify({'success': True, 'message': 'Price updated'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -148,11 +128,16 @@ def restock_product():
         if quantity_to_add <= 0:
             return jsonify({'success': False, 'message': 'Quantity must be positive'}), 400
         
-        execute("""
-            UPDATE product 
-            SET QuantityAvailable = QuantityAvailable + %s 
-            WHERE ProductID = %s
-        """, (quantity_to_add, product_id))
+        with transaction():
+            execute("""
+                UPDATE product 
+                SET QuantityAvailable = QuantityAvailable + %s 
+                WHERE ProductID = %s
+            """, (quantity_to_add, product_id))
+            catalog.adjust_stock({product_id: quantity_to_add})
+            farmer_stats.products_changed([product_id])
+            stock_alerts.stock_changed({product_id: quantity_to_add})
+            platform_counters.add({'total_stock': quantity_to_add})
         
         new_quantity = prod['QuantityAvailable'] + quantity_to_add
         
@@ -164,6 +149,73 @@ def restock_product():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _batch_items():
+    """The items list of a batch request body ({"items": [...]} or a bare list), or None."""
+    body = request.get_json(silent=True)
+    items = body.get('items') if isinstance(body, dict) else body
+    return items if isinstance(items, list) else None
+
+def _batch_response(apply):
+    items = _batch_items()
+    if not items:
+        return jsonify({'success': False, 'message': 'Send a JSON list of items'}), 400
+    if len(items) > product_updates.MAX_ITEMS:
+        return jsonify({'success': False,
+                        'message': f'At most {product_updates.MAX_ITEMS} items per request'}), 400
+    try:
+        results = apply(session['user']['RelatedID'], items)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+    counts = {}
+    for r in results:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+    return jsonify({'success': True, 'counts': counts, 'results': results})
+
+@farmer_bp.route("/products/prices", methods=["POST"])
+@login_required
+@role_required("Farmer")
+def edit_prices():
+    """Set many prices at once: {"items": [{"product_id": 1, "price": 42.5}, ...]}"""
+    return _batch_response(product_updates.set_prices)
+
+@farmer_bp.route("/products/restock", methods=["POST"])
+@login_required
+@role_required("Farmer")
+def restock_products():
+    """Restock many products at once: {"items": [{"product_id": 1, "quantity": 20}, ...]}"""
+    return _batch_response(product_updates.restock)
+
+@farmer_bp.route("/product/threshold", methods=["POST"])
+@login_required
+@role_required("Farmer")
+def set_stock_threshold():
+    """Set the stock level at which a product raises a low-stock alert (blank for the default)"""
+    product_id = request.form.get('product_id')
+    threshold = request.form.get('threshold', '').strip()
+    try:
+        product_id = int(product_id)
+        threshold = int(threshold) if threshold else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Threshold must be a whole number'}), 400
+    if threshold is not None and threshold < 0:
+        return jsonify({'success': False, 'message': 'Threshold cannot be negative'}), 400
+    if not stock_alerts.set_threshold(session['user']['RelatedID'], product_id, threshold):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    effective = STOCK_ALERT_CONFIG['default_threshold'] if threshold is None else threshold
+    return jsonify({'success': True, 'message': f'Alerts at {effective} units or fewer',
+                    'threshold': effective})
+
+@farmer_bp.route("/notifications", methods=["GET", "POST"])
+@login_required
+@role_required("Farmer")
+def notifications():
+    """Stock alert feed; POST marks everything read"""
+    farmer_id = session['user']['RelatedID']
+    if request.method == "POST":
+        stock_alerts.mark_read(farmer_id)
+        return redirect(url_for('farmer.notifications'))
+    return flask_render("farmer/notifications.html", notifications=stock_alerts.notifications(farmer_id))
+
 @farmer_bp.route("/product/delete/<int:product_id>", methods=["POST"])
 @login_required
 @role_required("Farmer")
@@ -174,7 +226,14 @@ def delete_product(product_id):
     if not prod or prod['FarmerID'] != farmer_id:
         flash("Unauthorized", "danger")
         return redirect(url_for('farmer.products'))
-    execute("DELETE FROM product WHERE ProductID=%s", (product_id,))
+    with transaction():
+        stock = fetchone("SELECT QuantityAvailable FROM product WHERE ProductID=%s FOR UPDATE", (product_id,))
+        execute("DELETE FROM product WHERE ProductID=%s", (product_id,))
+        if stock:
+            platform_counters.add({'products': -1, 'total_stock': -stock['QuantityAvailable']})
+        catalog.remove_products([product_id])
+        farmer_stats.products_changed([product_id], farmer_id)
+        stock_alerts.products_removed([product_id])
     flash("Product deleted", "success")
     return redirect(url_for('farmer.products'))
 
@@ -183,8 +242,8 @@ def delete_product(product_id):
 @role_required("Farmer")
 def add_product():
     # Load categories and seasons for form
-    categories = fetchall("SELECT CategoryID, CategoryName FROM category ORDER BY CategoryName")
-    seasons = fetchall("SELECT SeasonID, SeasonName FROM season ORDER BY SeasonName")
+    categories = fetchall("SELECT CategoryID, CategoryName FROM category ORDER BY CategoryName", cache=True)
+    seasons = fetchall("SELECT SeasonID, SeasonName FROM season ORDER BY SeasonName", cache=True)
     if request.method == "POST":
         farmer_id = session['user']['RelatedID']
         
@@ -216,28 +275,33 @@ def add_product():
                 return flask_render("farmer/add_product.html", categories=categories, seasons=seasons)
             
             # Validate category exists
-            category_row = fetchone("SELECT CategoryID FROM category WHERE CategoryID=%s", (category_id,))
+            category_row = fetchone("SELECT CategoryID FROM category WHERE CategoryID=%s", (category_id,), cache=True)
             if not category_row:
                 flash("Invalid category selected", "danger")
                 return flask_render("farmer/add_product.html", categories=categories, seasons=seasons)
             
             # Validate season exists
-            season_row = fetchone("SELECT SeasonID FROM season WHERE SeasonID=%s", (season_id,))
+            season_row = fetchone("SELECT SeasonID FROM season WHERE SeasonID=%s", (season_id,), cache=True)
             if not season_row:
                 flash("Invalid season selected", "danger")
                 return flask_render("farmer/add_product.html", categories=categories, seasons=seasons)
             
-            # Insert product with quantity
-            product_id = execute(
-                "INSERT INTO product (FarmerID, Name, Price, Freshness, CategoryID, QuantityAvailable) VALUES (%s, %s, %s, %s, %s, %s)",
-                (farmer_id, product_name, price, freshness, category_id, quantity)
-            )
-            
-            # Link product with season
-            execute(
-                "INSERT INTO product_season (ProductID, SeasonID) VALUES (%s, %s)",
-                (product_id, season_id)
-            )
+            with transaction():
+                # Insert product with quantity
+                product_id = execute(
+                    "INSERT INTO product (FarmerID, Name, Price, Freshness, CategoryID, QuantityAvailable) VALUES (%s, %s, %s, %s, %s, %s)",
+                    (farmer_id, product_name, price, freshness, category_id, quantity)
+                )
+                
+                # Link product with season
+                execute(
+                    "INSERT INTO product_season (ProductID, SeasonID) VALUES (%s, %s)",
+                    (product_id, season_id)
+                )
+                catalog.refresh_products([product_id])
+                farmer_stats.products_changed([product_id])
+                stock_alerts.products_added([product_id])
+                platform_counters.add({'products': 1, 'total_stock': quantity})
             
             flash("Product added successfully!", "success")
             return redirect(url_for('farmer.products'))
@@ -252,17 +316,68 @@ def add_product():
     # GET request - show the form
     return flask_render("farmer/add_product.html", categories=categories, seasons=seasons)
 
+@farmer_bp.route("/products/import", methods=["POST"])
+@login_required
+@role_required("Farmer")
+def import_products():
+    """Bulk-add products from an uploaded CSV or NDJSON file"""
+    upload = request.files.get('file')
+    fmt = product_import.detect_format(upload.filename if upload else None, request.form.get('format'))
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    if not upload or not upload.filename or fmt is None:
+        message = "Choose a .csv or .ndjson file to import"
+        if wants_json:
+            return jsonify({'success': False, 'error': message}), 400
+        flash(message, "danger")
+        return redirect(url_for('farmer.add_product'))
+
+    report = product_import.import_products(session['user']['RelatedID'], upload.stream, fmt)
+    if wants_json:
+        return jsonify(dict(report, success=True))
+    if report['imported']:
+        flash(f"Imported {report['imported']} product(s)", "success")
+    if report['failed'] or report['skipped']:
+        flash(f"{report['failed']} row(s) could not be imported"
+              + (f", {report['skipped']} skipped over the row limit" if report['skipped'] else ""), "danger")
+    categories = fetchall("SELECT CategoryID, CategoryName FROM category ORDER BY CategoryName", cache=True)
+    seasons = fetchall("SELECT SeasonID, SeasonName FROM season ORDER BY SeasonName", cache=True)
+    return flask_render("farmer/add_product.html", categories=categories, seasons=seasons,
+                        import_report=report)
+
+def _report_range(farmer_id):
+    """(start, end) dates of the sales report: ?from=&to=, all time by default"""
+    def parse(value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+        except ValueError:
+            return None
+    today = datetime.now().date()
+    end = parse(request.args.get('to')) or today
+    start = parse(request.args.get('from')) or sales_rollup.first_sale(farmer_id) or end
+    if start > end:
+        start, end = end, start
+    return start, end
+
+def _sales_report_data(farmer_id, start, end):
+    """Overview and per-product rows for the range, from the sales rollups"""
+    overview, product_rows = sales_rollup.report(farmer_id, start, end)
+    stats = farmer_stats.snapshot(farmer_id)
+    overview['TotalProducts'] = stats['TotalProducts']
+    overview['AverageProductRating'] = stats['AvgRating']
+    return overview, product_rows
+
 @farmer_bp.route("/sales_report")
 @login_required
 @role_required("Farmer")
 def sales_report():
     """Display the sales report page with option to download PDF."""
     farmer_id = session['user']['RelatedID']
-    # Get farmer report data
-    farmer_report = get_farmer_report(farmer_id)
-    overview = farmer_report[0][0] if farmer_report and farmer_report[0] else {}
-    product_rows = farmer_report[1] if farmer_report and len(farmer_report) > 1 else []
-    return flask_render("farmer/sales_report.html", overview=overview, products=product_rows)
+    start, end = _report_range(farmer_id)
+    overview, product_rows = _sales_report_data(farmer_id, start, end)
+    return flask_render("farmer/sales_report.html", overview=overview, products=product_rows,
+                        start=start, end=end,
+                        comparison=sales_rollup.compare(farmer_id, start, end),
+                        trend=sales_rollup.trend(farmer_id, start, end, request.args.get('grain')))
 
 @farmer_bp.route("/sales_report/pdf")
 @login_required
@@ -272,143 +387,24 @@ def sales_report_pdf():
     farmer_id = session['user']['RelatedID']
     farmer_name = session['user'].get('Name', 'Farmer')
     
-    # Get farmer report data
-    farmer_report = get_farmer_report(farmer_id)
-    overview = farmer_report[0][0] if farmer_report and farmer_report[0] else {}
-    product_rows = farmer_report[1] if farmer_report and len(farmer_report) > 1 else []
-    
-    # Create a BytesIO buffer for the PDF
-    buffer = BytesIO()
-    
-    # Create the PDF document
-    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    elements = []
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#047857'),
-        spaceAfter=12,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#059669'),
-        spaceAfter=10,
-        spaceBefore=10,
-        fontName='Helvetica-Bold'
-    )
-    
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.HexColor('#374151')
-    )
+    start, end = _report_range(farmer_id)
+    overview, product_rows = _sales_report_data(farmer_id, start, end)
     
-    # Title
-    title = Paragraph("Sales Report", title_style)
-    elements.append(title)
-    
-    # Farmer info and date
-    date_str = datetime.now().strftime("%B %d, %Y")
-    farmer_info = Paragraph(f"<b>Farmer:</b> {farmer_name}<br/><b>Report Date:</b> {date_str}", normal_style)
-    elements.append(farmer_info)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Summary section
-    elements.append(Paragraph("Summary", heading_style))
-    
-    summary_data = [
-        ['Metric', 'Value'],
-        ['Total Products', str(overview.get('TotalProducts', 0))],
-        ['Total Orders', str(overview.get('TotalOrders', 0))],
-        ['Total Revenue', f"₹{overview.get('TotalRevenue', '0.00')}"],
-        ['Average Product Rating', f"{overview.get('AverageProductRating', '0.0')} ★"]
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[3*inch, 3*inch])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TOPPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f0fdf4')),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#d1fae5')),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('TOPPADDING', (0, 1), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-    ]))
-    
-    elements.append(summary_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Products breakdown section
-    if product_rows:
-        elements.append(Paragraph("Product Sales Breakdown", heading_style))
-        
-        product_data = [['Product Name', 'Price', 'Units Sold', 'Revenue']]
-        
-        for p in product_rows:
-            product_data.append([
-                str(p.get('ProductName', 'N/A')),
-                f"₹{p.get('Price', '0.00')}",
-                str(p.get('TotalUnitsSold', 0)),
-                f"₹{p.get('ProductRevenue', '0.00')}"
-            ])
-        
-        product_table = Table(product_data, colWidths=[2.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-        product_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('TOPPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0fdf4')]),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#d1fae5')),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-        ]))
-        
-        elements.append(product_table)
-    else:
-        elements.append(Paragraph("No product sales data available.", normal_style))
-    
-    # Add footer
-    elements.append(Spacer(1, 0.5*inch))
-    footer_text = Paragraph(
-        f"<i>Generated by FarmConnect on {datetime.now().strftime('%B %d, %Y at %I:%M %p')}</i>",
-        ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.grey, alignment=TA_CENTER)
-    )
-    elements.append(footer_text)
-    
-    # Build PDF
-    doc.build(elements)
-    
-    # Get the value from the BytesIO buffer
-    buffer.seek(0)
+    # Rendered in the render_service pool; slow reports come back as a job to poll
+    filename = f"Sales_Report_{farmer_name.replace(' ', '_')}_{start:%Y%m%d}_{end:%Y%m%d}.pdf"
+    try:
+        pdf_data, job_id = render_service.render(
+            'sales_report', (farmer_name, overview, product_rows, datetime.now(), (start, end)),
+            owner=session['user']['UserID'], filename=filename)
+    except RenderBusy as e:
+        flash(str(e), "error")
+        return redirect(url_for('farmer.sales_report', **{'from': start.isoformat(), 'to': end.isoformat()}))
+    if pdf_data is None:
+        return redirect(url_for('jobs.status', job_id=job_id))
     
     # Send the PDF file
-    filename = f"Sales_Report_{farmer_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
     return send_file(
-        buffer,
+        BytesIO(pdf_data),
         mimetype='application/pdf',
         as_attachment=True,
         download_name=filename
@@ -462,8 +458,10 @@ def settings():
             location = request.form.get('location')
             
             if name and location:
-                execute("UPDATE farmer SET Name = %s, Location = %s WHERE FarmerID = %s", 
-                       (name, location, farmer_id))
+                with transaction():
+                    execute("UPDATE farmer SET Name = %s, Location = %s WHERE FarmerID = %s", 
+                           (name, location, farmer_id))
+                    catalog.refresh_farmer(farmer_id)
                 # Update session
                 session['user']['Name'] = name
                 flash("Profile updated successfully!", "success")
@@ -0,0 +1,62 @@
+from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for, make_response
+from functools import wraps
+from config import APP_CONFIG
+from render_service import render_service
+
+jobs_bp = Blueprint("jobs", __name__, template_folder="../templates/jobs")
+
+# helper
+def flask_render(tpl, **kwargs):
+    return render_template(tpl, app_config=APP_CONFIG, **kwargs)
+
+def login_required(f):
+    @wraps(f)
+    def inner(*args, **kwargs):
+        if not session.get('user'):
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return inner
+
+def pdf_response(pdf_data, filename):
+    response = make_response(pdf_data)
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+def _wants_json():
+    return request.accept_mimetypes.best == 'application/json'
+
+@jobs_bp.route("/<job_id>")
+@login_required
+def status(job_id):
+    """Progress of a PDF render handed back by a download route"""
+    job = render_service.job(job_id, session['user']['UserID'])
+    if job is None:
+        if _wants_json():
+            return jsonify({'state': 'unknown', 'message': 'Unknown or expired job'}), 404
+        return flask_render("errors/404.html"), 404
+    future = job['future']
+    if not future.done():
+        state = 'pending'
+    elif future.cancelled() or future.exception() is not None:
+        state = 'failed'
+    else:
+        state = 'done'
+    if _wants_json():
+        return jsonify({'state': state, 'filename': job['filename'],
+                        'download_url': url_for('jobs.download', job_id=job_id) if state == 'done' else None})
+    if state == 'done':
+        return redirect(url_for('jobs.download', job_id=job_id))
+    return flask_render("jobs/wait.html", job=job, state=state)
+
+@jobs_bp.route("/<job_id>/download")
+@login_required
+def download(job_id):
+    job = render_service.job(job_id, session['user']['UserID'])
+    if job is None:
+        return redirect(url_for('jobs.status', job_id=job_id))
+    future = job['future']
+    # exception() raises on a cancelled future, so check that first
+    if not future.done() or future.cancelled() or future.exception() is not None:
+        return redirect(url_for('jobs.status', job_id=job_id))
+    return pdf_response(future.result(), job['filename'])
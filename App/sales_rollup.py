@@ -0,0 +1,346 @@
+"""
+sales_rollup.py
+Pre-aggregated sales facts for farmer reports.
+
+Every order line is recorded once in sales_line with the unit price it
+was sold at. Sales are bucketed per farmer and product by day in
+sales_daily and rolled up by week and month in sales_rollup, from those
+recorded lines only, so later price changes never touch past revenue.
+Each bucket also has a farmer-level row under ProductID 0, whose Orders
+column counts distinct orders (an order lands in exactly one day, so
+those add up across buckets). Buckets are adjusted in the same
+transaction as the order writes: placing an order adds its lines,
+cancelling one takes exactly those amounts back out, and un-cancelling
+adds them again. A report for any date range reads whole months from the
+rollup and only the partial months at either end from the daily buckets,
+so its cost depends on the length of the range, not the size of the
+order history.
+"""
+
+from datetime import timedelta
+
+from database import execute, fetchall, fetchone, get_products_by_ids, transaction, ensure_index
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS sales_line (
+        OrderID INT NOT NULL,
+        ProductID INT NOT NULL,
+        FarmerID INT NOT NULL,
+        Day DATE NOT NULL,
+        Units INT NOT NULL,
+        UnitPrice DECIMAL(10,2) NOT NULL,
+        PRIMARY KEY (OrderID, ProductID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sales_daily (
+        FarmerID INT NOT NULL,
+        Day DATE NOT NULL,
+        ProductID INT NOT NULL,
+        Units INT NOT NULL DEFAULT 0,
+        Revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+        Orders INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (FarmerID, Day, ProductID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sales_rollup (
+        FarmerID INT NOT NULL,
+        Grain VARCHAR(5) NOT NULL,
+        PeriodStart DATE NOT NULL,
+        ProductID INT NOT NULL,
+        Units INT NOT NULL DEFAULT 0,
+        Revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+        Orders INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (FarmerID, Grain, PeriodStart, ProductID)
+    )
+    """,
+)
+
+GRAINS = ('day', 'week', 'month')
+
+# farmer-level rows use this ProductID
+ALL_PRODUCTS = 0
+
+# records order lines not recorded yet, at the unit price given by {price}
+_RECORD = """
+    INSERT IGNORE INTO sales_line (OrderID, ProductID, FarmerID, Day, Units, UnitPrice)
+    SELECT o.OrderID, op.ProductID, p.FarmerID, DATE(o.OrderDate), op.Quantity, {price}
+    FROM orders o
+    JOIN order_product op ON o.OrderID = op.OrderID
+    JOIN product p ON op.ProductID = p.ProductID
+    WHERE {where}
+"""
+
+# recorded lines as facts; {sign} is 1 to add an order and -1 to take it out
+_LINES = """
+    SELECT l.FarmerID, l.Day, {product} AS ProductID,
+           {sign} * SUM(l.Units) AS Units,
+           {sign} * SUM(l.Units * l.UnitPrice) AS Revenue,
+           {sign} * COUNT(DISTINCT l.OrderID) AS Orders
+    FROM sales_line l
+    JOIN orders o ON o.OrderID = l.OrderID
+    WHERE {where}
+    GROUP BY l.FarmerID, l.Day{group}
+"""
+
+_PERIOD = {
+    'week': "DATE_SUB(Day, INTERVAL WEEKDAY(Day) DAY)",
+    'month': "DATE_SUB(Day, INTERVAL DAYOFMONTH(Day) - 1 DAY)",
+}
+
+_ADD = """
+    ON DUPLICATE KEY UPDATE Units = Units + VALUES(Units), Revenue = Revenue + VALUES(Revenue),
+                            Orders = Orders + VALUES(Orders)
+"""
+
+
+def ensure_schema():
+    for statement in SCHEMA:
+        execute(statement)
+    # per-product revenue for the farmer dashboard snapshots
+    ensure_index('sales_line', 'idx_sales_line_product', 'ProductID')
+
+
+def _facts(where, sign):
+    """Per-product and farmer-level day facts for the orders matching `where`."""
+    return " UNION ALL ".join([
+        _LINES.format(product="l.ProductID", sign=sign, where=where, group=", l.ProductID"),
+        _LINES.format(product=ALL_PRODUCTS, sign=sign, where=where, group=""),
+    ])
+
+
+def _apply(where, params, sign):
+    facts = _facts(where, sign)
+    execute(f"""
+        INSERT INTO sales_daily (FarmerID, Day, ProductID, Units, Revenue, Orders)
+        SELECT FarmerID, Day, ProductID, Units, Revenue, Orders FROM ({facts}) f
+    """ + _ADD, params * 2)
+    rollups = " UNION ALL ".join(
+        f"SELECT FarmerID, '{grain}' AS Grain, {period} AS PeriodStart, ProductID, "
+        f"SUM(Units) AS Units, SUM(Revenue) AS Revenue, SUM(Orders) AS Orders "
+        f"FROM ({facts}) f{i} GROUP BY FarmerID, PeriodStart, ProductID"
+        for i, (grain, period) in enumerate(_PERIOD.items()))
+    execute(f"""
+        INSERT INTO sales_rollup (FarmerID, Grain, PeriodStart, ProductID, Units, Revenue, Orders)
+        SELECT * FROM ({rollups}) r
+    """ + _ADD, params * 2 * len(_PERIOD))
+
+
+def record_order(order_id, prices):
+    """
+    Record a just-written order at the unit prices it was charged,
+    {product_id: price}, and add it to the buckets; runs inside the
+    order's transaction.
+    """
+    ids = sorted(prices)
+    cases = " ".join(["WHEN %s THEN %s"] * len(ids))
+    execute(_RECORD.format(price=f"CASE op.ProductID {cases} END", where="o.OrderID = %s"),
+            tuple([v for pid in ids for v in (pid, prices[pid])] + [order_id]))
+    _apply("o.OrderID = %s", (order_id,), 1)
+
+
+def status_changed(order_id, old_status, new_status):
+    """Take a cancelled order out of the buckets, or put an un-cancelled one back."""
+    was, now = old_status == 'Cancelled', new_status == 'Cancelled'
+    if was != now:
+        _apply("o.OrderID = %s", (order_id,), -1 if now else 1)
+
+
+def _rebuild_buckets():
+    """Record any order lines missing from sales_line (at current prices) and recompute every bucket."""
+    execute(_RECORD.format(price="p.Price", where="1 = 1"))
+    execute("DELETE FROM sales_daily")
+    execute("DELETE FROM sales_rollup")
+    _apply("o.Status <> 'Cancelled'", (), 1)
+
+
+def backfill():
+    """
+    Record order history and fill the buckets from it if no lines are
+    recorded yet (e.g. first start). Prices of past orders are not stored
+    anywhere else, so history is recorded at current prices.
+    """
+    # one worker process backfills; the others wait here and find it done
+    lock = fetchone("SELECT GET_LOCK('sales_rollup_backfill', 60) AS got")
+    if not lock or not lock['got']:
+        return False
+    try:
+        if fetchone("SELECT 1 AS present FROM sales_line LIMIT 1"):
+            return False
+        with transaction():
+            _rebuild_buckets()
+        return True
+    finally:
+        fetchone("SELECT RELEASE_LOCK('sales_rollup_backfill') AS released")
+
+
+def rebuild():
+    """Recompute every bucket from the recorded order lines."""
+    with transaction():
+        _rebuild_buckets()
+
+
+def first_sale(farmer_id):
+    """Day of the farmer's first recorded sale, or None."""
+    row = fetchone("SELECT MIN(Day) AS first FROM sales_daily WHERE FarmerID = %s", (farmer_id,))
+    return row['first'] if row else None
+
+
+def _month_start(d):
+    return d.replace(day=1)
+
+
+def _next_month(d):
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _segments(start, end):
+    """
+    Split [start, end] into (kind, first, last) pieces: whole months
+    from the rollup, the partial months at either end from daily buckets.
+    """
+    first_full = start if start.day == 1 else _next_month(start)
+    after_last_full = _month_start(end + timedelta(days=1))
+    if first_full >= after_last_full:
+        return [('daily', start, end)]
+    segments = []
+    if start < first_full:
+        segments.append(('daily', start, first_full - timedelta(days=1)))
+    segments.append(('month', first_full, _month_start(after_last_full - timedelta(days=1))))
+    if after_last_full <= end:
+        segments.append(('daily', after_last_full, end))
+    return segments
+
+
+def _totals(farmer_id, start, end, product_rows):
+    """{ProductID: (units, revenue, orders)} over [start, end]."""
+    parts, params = [], []
+    for kind, first, last in _segments(start, end):
+        if kind == 'daily':
+            parts.append("SELECT ProductID, Units, Revenue, Orders FROM sales_daily "
+                         "WHERE FarmerID = %s AND Day BETWEEN %s AND %s")
+        else:
+            parts.append("SELECT ProductID, Units, Revenue, Orders FROM sales_rollup "
+                         "WHERE FarmerID = %s AND Grain = 'month' AND PeriodStart BETWEEN %s AND %s")
+        params += [farmer_id, first, last]
+    where = "" if product_rows else f" WHERE ProductID = {ALL_PRODUCTS}"
+    rows = fetchall(f"""
+        SELECT ProductID, SUM(Units) AS Units, SUM(Revenue) AS Revenue, SUM(Orders) AS Orders
+        FROM ({" UNION ALL ".join(parts)}) t{where}
+        GROUP BY ProductID
+    """, tuple(params))
+    return {r['ProductID']: (int(r['Units'] or 0), float(r['Revenue'] or 0), int(r['Orders'] or 0))
+            for r in rows}
+
+
+def report(farmer_id, start, end):
+    """
+    Sales of one farmer over [start, end] (dates, inclusive): an overview
+    with TotalOrders, TotalUnits and TotalRevenue, and per-product rows
+    (ProductName, Price, TotalUnitsSold, ProductRevenue), best selling first.
+    """
+    by_product = _totals(farmer_id, start, end, product_rows=True)
+    units, revenue, orders = by_product.pop(ALL_PRODUCTS, (0, 0.0, 0))
+    names = get_products_by_ids(by_product, "ProductID, Name, Price")
+    products = []
+    for pid, (p_units, p_revenue, _) in by_product.items():
+        product = names.get(pid)
+        products.append({
+            'ProductID': pid,
+            'ProductName': product['Name'] if product else f'Deleted product #{pid}',
+            'Price': float(product['Price']) if product else 0.0,
+            'TotalUnitsSold': p_units,
+            'ProductRevenue': round(p_revenue, 2),
+        })
+    products.sort(key=lambda p: (-p['ProductRevenue'], p['ProductID']))
+    overview = {'TotalOrders': orders, 'TotalUnits': units, 'TotalRevenue': round(revenue, 2)}
+    return overview, products
+
+
+def totals(farmer_id, start, end):
+    """{'TotalOrders', 'TotalUnits', 'TotalRevenue'} over [start, end]."""
+    units, revenue, orders = _totals(farmer_id, start, end, product_rows=False).get(ALL_PRODUCTS, (0, 0.0, 0))
+    return {'TotalOrders': orders, 'TotalUnits': units, 'TotalRevenue': round(revenue, 2)}
+
+
+def compare(farmer_id, start, end):
+    """Totals over [start, end] and over the equally long period just before it, with % changes."""
+    length = end - start + timedelta(days=1)
+    current = totals(farmer_id, start, end)
+    previous = totals(farmer_id, start - length, start - timedelta(days=1))
+    change = {key: (round((current[key] - previous[key]) * 100.0 / previous[key], 1) if previous[key] else None)
+              for key in current}
+    return {'current': current, 'previous': previous, 'change': change,
+            'previous_start': start - length, 'previous_end': start - timedelta(days=1)}
+
+
+def _period_start(d, grain):
+    if grain == 'week':
+        return d - timedelta(days=d.weekday())
+    if grain == 'month':
+        return _month_start(d)
+    return d
+
+
+def default_grain(start, end):
+    days = (end - start).days + 1
+    return 'day' if days <= 62 else 'week' if days <= 366 else 'month'
+
+
+def trend(farmer_id, start, end, grain=None):
+    """
+    [{'period', 'units', 'revenue', 'orders'}] per day, week or month over
+    [start, end], with empty buckets filled in. Weeks or months cut by the
+    ends of the range only count the days inside it.
+    """
+    grain = grain if grain in GRAINS else default_grain(start, end)
+    buckets = {}
+    p = _period_start(start, grain)
+    while p <= end:
+        buckets[p] = {'period': p, 'units': 0, 'revenue': 0.0, 'orders': 0}
+        p = p + timedelta(days=1) if grain == 'day' else \
+            p + timedelta(days=7) if grain == 'week' else _next_month(p)
+
+    def add(period, row):
+        bucket = buckets[_period_start(period, grain)]
+        bucket['units'] += int(row['Units'] or 0)
+        bucket['revenue'] = round(bucket['revenue'] + float(row['Revenue'] or 0), 2)
+        bucket['orders'] += int(row['Orders'] or 0)
+
+    if grain == 'day':
+        days = [(start, end)]
+    else:
+        # whole periods from the rollup, cut ones from the daily buckets
+        periods = sorted(buckets)
+        whole = [p for p in periods if p >= start and
+                 (_next_month(p) if grain == 'month' else p + timedelta(days=7)) - timedelta(days=1) <= end]
+        days = []
+        if whole:
+            for row in fetchall("""
+                SELECT PeriodStart, Units, Revenue, Orders FROM sales_rollup
+                WHERE FarmerID = %s AND Grain = %s AND ProductID = %s AND PeriodStart BETWEEN %s AND %s
+            """, (farmer_id, grain, ALL_PRODUCTS, whole[0], whole[-1])):
+                add(row['PeriodStart'], row)
+            if start < whole[0]:
+                days.append((start, whole[0] - timedelta(days=1)))
+            tail = (_next_month(whole[-1]) if grain == 'month' else whole[-1] + timedelta(days=7))
+            if tail <= end:
+                days.append((tail, end))
+        else:
+            days.append((start, end))
+    for first, last in days:
+        for row in fetchall("""
+            SELECT Day, Units, Revenue, Orders FROM sales_daily
+            WHERE FarmerID = %s AND ProductID = %s AND Day BETWEEN %s AND %s
+        """, (farmer_id, ALL_PRODUCTS, first, last)):
+            add(row['Day'], row)
+    return [buckets[p] for p in sorted(buckets)]
+
+
+def init_app(app):
+    """Create the sales fact tables and fill them from history on first start."""
+    with app.app_context():
+        ensure_schema()
+        backfill()
@@ -0,0 +1,253 @@
+"""
+search.py
+In-process full-text search over the catalog: product name, category, farmer
+name and farmer location.
+
+Terms live in an inverted index (term -> {product_id: weighted tf}) ranked
+with BM25, where a hit in the product name counts for more than one in the
+farmer's location. Each query word is matched exactly, as a prefix of longer
+terms (found by bisecting a sorted vocabulary) and within a small edit
+distance of terms that share trigrams with it, so "tomatoe" finds both
+tomatoes and tomato and "panir" still finds paneer; the looser matches
+score lower. Like the facet index it subscribes
+to catalog.py and is kept in step with product writes.
+"""
+
+import math
+import re
+import threading
+import heapq
+from bisect import bisect_left
+from collections import defaultdict
+
+import catalog
+
+# field weights: (row column, weight)
+FIELDS = (
+    ('ProductName', 3.0),
+    ('CategoryName', 1.5),
+    ('FarmerName', 1.0),
+    ('FarmerLocation', 1.0),
+)
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# score multipliers for the looser ways a query word can match a term
+PREFIX_WEIGHT = 0.7
+FUZZY_WEIGHT = 0.5
+
+MAX_EXPANSIONS = 30   # longer terms a query word may be a prefix of
+MAX_FUZZY = 5         # misspelling corrections tried per query word
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _TOKEN.findall((text or '').lower())
+
+
+def _trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_edits(term):
+    return 0 if len(term) < 3 else 1 if len(term) < 5 else 2
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance of a and b, or limit + 1 once it must exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self._postings = defaultdict(dict)   # term -> {product_id: weighted tf}
+        self._doc_terms = {}                  # product_id -> terms, to remove a product
+        self._texts = {}                      # product_id -> indexed field values
+        self._doc_len = {}                    # product_id -> weighted length
+        self._norms = {}                      # product_id -> BM25 length normalisation
+        self._total_len = 0.0
+        self._vocab = []                      # sorted terms, for prefix lookups
+        self._grams = defaultdict(set)        # trigram -> terms, for fuzzy lookups
+
+    def _add_term(self, term):
+        i = bisect_left(self._vocab, term)
+        self._vocab.insert(i, term)
+        for gram in _trigrams(term):
+            self._grams[gram].add(term)
+
+    def _drop_term(self, term):
+        del self._postings[term]
+        i = bisect_left(self._vocab, term)
+        if i < len(self._vocab) and self._vocab[i] == term:
+            del self._vocab[i]
+        for gram in _trigrams(term):
+            terms = self._grams.get(gram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._grams[gram]
+
+    def _remove(self, pid):
+        terms = self._doc_terms.pop(pid, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(pid, None)
+            if not postings:
+                self._drop_term(term)
+        self._total_len -= self._doc_len.pop(pid)
+        del self._norms[pid]
+        del self._texts[pid]
+
+    def _add(self, row, track_vocab=True):
+        pid = int(row['ProductID'])
+        self._texts[pid] = tuple(row.get(column) for column, _ in FIELDS)
+        tf = defaultdict(float)
+        for column, weight in FIELDS:
+            for token in tokenize(row.get(column)):
+                tf[token] += weight
+        for term, freq in tf.items():
+            if track_vocab and term not in self._postings:
+                self._add_term(term)
+            self._postings[term][pid] = freq
+        self._doc_terms[pid] = set(tf)
+        self._doc_len[pid] = sum(tf.values())
+        self._total_len += self._doc_len[pid]
+        # normalised against the average length of the moment; the periodic
+        # full reload brings every product back onto the same average
+        avg_len = self._total_len / len(self._doc_len)
+        self._norms[pid] = K1 * (1 - B + B * self._doc_len[pid] / avg_len)
+
+    def load(self, rows):
+        fresh = SearchIndex()
+        for row in rows:
+            fresh._add(row, track_vocab=False)
+        # vocabulary and trigrams built once at the end, not term by term
+        fresh._vocab = sorted(fresh._postings)
+        avg_len = fresh._total_len / len(fresh._doc_len) if fresh._doc_len else 1.0
+        fresh._norms = {pid: K1 * (1 - B + B * length / avg_len) for pid, length in fresh._doc_len.items()}
+        for term in fresh._vocab:
+            for gram in _trigrams(term):
+                fresh._grams[gram].add(term)
+        with self._lock:
+            self._postings = fresh._postings
+            self._doc_terms = fresh._doc_terms
+            self._texts = fresh._texts
+            self._doc_len = fresh._doc_len
+            self._norms = fresh._norms
+            self._total_len = fresh._total_len
+            self._vocab = fresh._vocab
+            self._grams = fresh._grams
+            self.loaded = True
+
+    def apply(self, rows, removed_ids):
+        with self._lock:
+            for pid in removed_ids:
+                self._remove(int(pid))
+            for row in rows:
+                pid = int(row['ProductID'])
+                # stock-only changes (orders, restocks) leave the text alone
+                if self._texts.get(pid) == tuple(row.get(column) for column, _ in FIELDS):
+                    continue
+                self._remove(pid)
+                self._add(row)
+
+    def _prefixed(self, word):
+        i = bisect_left(self._vocab, word)
+        out = []
+        while i < len(self._vocab) and len(out) < MAX_EXPANSIONS and self._vocab[i].startswith(word):
+            if self._vocab[i] != word:
+                out.append(self._vocab[i])
+            i += 1
+        return out
+
+    def _similar(self, word):
+        """[(term, edits)] for the closest other terms within the edit budget of word."""
+        limit = _max_edits(word)
+        if not limit:
+            return []
+        shared = defaultdict(int)
+        for gram in _trigrams(word):
+            for term in self._grams.get(gram, ()):
+                shared[term] += 1
+        # check the terms sharing most trigrams first
+        candidates = heapq.nlargest(MAX_EXPANSIONS * 4, shared, key=shared.get)
+        found = [(term, edit_distance(word, term, limit)) for term in candidates]
+        found = [(term, edits) for term, edits in found if 0 < edits <= limit]
+        if not found:
+            return []
+        # only the closest spellings: a one-letter slip shouldn't also pull in
+        # every term two edits away
+        closest = min(edits for _, edits in found)
+        return [(term, edits) for term, edits in found if edits == closest][:MAX_FUZZY]
+
+    def _expand(self, word):
+        """[(term, multiplier)] a query word matches."""
+        terms = [(word, 1.0)] if word in self._postings else []
+        terms += [(t, PREFIX_WEIGHT) for t in self._prefixed(word)]
+        # misspellings too, even when the word is a prefix of something: the
+        # lower multiplier leaves the ranking to prefer the closer matches
+        seen = {t for t, _ in terms}
+        terms += [(t, FUZZY_WEIGHT / edits) for t, edits in self._similar(word) if t not in seen]
+        return terms
+
+    def search(self, query, limit=50):
+        """
+        [(product_id, score)] best first. Products matching more of the query
+        words rank above those matching fewer, then by BM25 score.
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return []
+        with self._lock:
+            n = len(self._doc_len)
+            if not n:
+                return []
+            norms = self._norms
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+            for word in words:
+                best = {}
+                for term, multiplier in self._expand(word):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                    weight = multiplier * idf * (K1 + 1)
+                    term_scores = {pid: weight * tf / (tf + norms[pid]) for pid, tf in postings.items()}
+                    if not best:
+                        best = term_scores
+                        continue
+                    for pid, score in term_scores.items():
+                        if score > best.get(pid, 0.0):
+                            best[pid] = score
+                # a word counts once per product, through its best-scoring term
+                for pid, score in best.items():
+                    scores[pid] += score
+                    matched[pid] += 1
+        top = heapq.nlargest(limit, scores, key=lambda pid: (matched[pid], scores[pid], pid))
+        return [(pid, round(scores[pid], 4)) for pid in top]
+
+    def stats(self):
+        with self._lock:
+            return {'loaded': self.loaded, 'products': len(self._doc_len),
+                    'terms': len(self._vocab), 'trigrams': len(self._grams)}
+
+
+product_search = SearchIndex()
+catalog.subscribe(product_search)
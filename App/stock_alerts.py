@@ -0,0 +1,236 @@
+"""
+stock_alerts.py
+Low-stock tracking and alerts for farmers.
+
+Every product has a low-stock threshold: its stock_threshold row if the
+farmer set one, else STOCK_ALERT_CONFIG['default_threshold']. Each worker
+process keeps the products at or below their threshold in memory, so the
+dashboards count low and out-of-stock products without scanning product.
+The stock-changing paths (placing an order, restocking, adding and
+deleting products) report their changes here inside their transaction:
+a product whose stock just fell to its threshold or ran out gets a
+farmer_notification row in the same transaction, and the in-memory set
+is updated once it commits. A periodic reload picks up changes made by
+other worker processes.
+"""
+
+import threading
+import time
+
+from config import STOCK_ALERT_CONFIG
+from database import execute, executemany, fetchall, fetchone, after_commit
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS stock_threshold (
+        ProductID INT NOT NULL PRIMARY KEY,
+        Threshold INT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS farmer_notification (
+        NotificationID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        FarmerID INT NOT NULL,
+        ProductID INT NULL,
+        Kind VARCHAR(20) NOT NULL,
+        Message VARCHAR(255) NOT NULL,
+        CreatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        ReadAt TIMESTAMP NULL,
+        KEY idx_farmer_notification_feed (FarmerID, ReadAt, CreatedAt)
+    )
+    """,
+)
+
+# current stock and effective threshold of products
+STOCK_QUERY = """
+    SELECT p.ProductID, p.FarmerID, p.Name, p.QuantityAvailable,
+           COALESCE(t.Threshold, %s) AS Threshold
+    FROM product p
+    LEFT JOIN stock_threshold t ON t.ProductID = p.ProductID
+"""
+
+_low = {}          # product_id -> (farmer_id, quantity) at or below threshold
+_by_farmer = {}    # farmer_id -> {product_id} in _low
+_lock = threading.Lock()
+_refresher = None
+
+
+def ensure_schema():
+    for statement in SCHEMA:
+        execute(statement)
+
+
+def _in_list(ids):
+    ids = sorted({int(i) for i in ids})
+    return ids, ", ".join(["%s"] * len(ids))
+
+
+def _stock_rows(product_ids):
+    ids, placeholders = _in_list(product_ids)
+    if not ids:
+        return []
+    return fetchall(STOCK_QUERY + f" WHERE p.ProductID IN ({placeholders})",
+                    tuple([STOCK_ALERT_CONFIG['default_threshold']] + ids))
+
+
+def _discard(product_id):
+    entry = _low.pop(product_id, None)
+    if entry is not None:
+        products = _by_farmer.get(entry[0])
+        products.discard(product_id)
+        if not products:
+            del _by_farmer[entry[0]]
+
+
+def _apply(product_ids, rows):
+    """Bring the set up to date for product_ids from their current rows."""
+    with _lock:
+        for pid in product_ids:
+            _discard(int(pid))
+        for row in rows:
+            if row['QuantityAvailable'] <= row['Threshold']:
+                _low[row['ProductID']] = (row['FarmerID'], row['QuantityAvailable'])
+                _by_farmer.setdefault(row['FarmerID'], set()).add(row['ProductID'])
+
+
+def _refresh_after_commit(product_ids):
+    product_ids = list(product_ids)
+
+    def refresh():
+        try:
+            _apply(product_ids, _stock_rows(product_ids))
+        except Exception:
+            pass   # the write is committed; the periodic reload catches up
+    after_commit(refresh)
+
+
+def load():
+    """Reload the set of low-stock products from product in one query."""
+    rows = fetchall(STOCK_QUERY + " WHERE p.QuantityAvailable <= COALESCE(t.Threshold, %s)",
+                    (STOCK_ALERT_CONFIG['default_threshold'],) * 2)
+    low, by_farmer = {}, {}
+    for row in rows:
+        low[row['ProductID']] = (row['FarmerID'], row['QuantityAvailable'])
+        by_farmer.setdefault(row['FarmerID'], set()).add(row['ProductID'])
+    global _low, _by_farmer
+    with _lock:
+        _low, _by_farmer = low, by_farmer
+    return len(low)
+
+
+def stock_changed(deltas):
+    """
+    Report stock changes {product_id: units added (negative when sold)}
+    made in the current transaction, after the product rows were updated.
+    Products that fell to their threshold or ran out notify their farmer.
+    """
+    deltas = {int(pid): int(d) for pid, d in deltas.items()}
+    notes = []
+    for row in _stock_rows(deltas):
+        new, threshold = row['QuantityAvailable'], row['Threshold']
+        old = new - deltas[row['ProductID']]
+        if new <= 0 < old:
+            notes.append((row['FarmerID'], row['ProductID'], 'out_of_stock',
+                          f"{row['Name']} is out of stock"))
+        elif new <= threshold < old:
+            notes.append((row['FarmerID'], row['ProductID'], 'low_stock',
+                          f"{row['Name']} is down to {new} units (alert at {threshold})"))
+    if notes:
+        executemany("INSERT INTO farmer_notification (FarmerID, ProductID, Kind, Message) "
+                    "VALUES (%s, %s, %s, %s)", notes)
+    _refresh_after_commit(deltas)
+
+
+def products_added(product_ids):
+    """Track new products; their starting stock raises no alert."""
+    _refresh_after_commit(product_ids)
+
+
+def products_removed(product_ids):
+    product_ids = list(product_ids)
+
+    def drop():
+        try:
+            with _lock:
+                for pid in product_ids:
+                    _discard(int(pid))
+        except Exception:
+            pass   # the delete is committed; the periodic reload catches up
+    after_commit(drop)
+
+
+def set_threshold(farmer_id, product_id, threshold):
+    """Set a product's alert threshold (None restores the default); False if not the farmer's."""
+    owned = fetchone("SELECT 1 AS owned FROM product WHERE ProductID = %s AND FarmerID = %s",
+                     (product_id, farmer_id))
+    if not owned:
+        return False
+    if threshold is None:
+        execute("DELETE FROM stock_threshold WHERE ProductID = %s", (product_id,))
+    else:
+        execute("""
+            INSERT INTO stock_threshold (ProductID, Threshold) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE Threshold = VALUES(Threshold)
+        """, (product_id, threshold))
+    _refresh_after_commit([product_id])
+    return True
+
+
+def thresholds(product_ids):
+    """{product_id: effective threshold} for the given products."""
+    return {r['ProductID']: r['Threshold'] for r in _stock_rows(product_ids)}
+
+
+def low_products(farmer_id=None):
+    """{product_id: quantity} of low-stock products, for one farmer or all."""
+    with _lock:
+        if farmer_id is None:
+            return {pid: qty for pid, (_, qty) in _low.items()}
+        return {pid: _low[pid][1] for pid in _by_farmer.get(farmer_id, ())}
+
+
+def counts(farmer_id=None):
+    """{'low': products at or below their threshold (out of stock included), 'out': out of stock}."""
+    low = low_products(farmer_id)
+    return {'low': len(low), 'out': sum(1 for qty in low.values() if qty <= 0)}
+
+
+def notifications(farmer_id, limit=50):
+    return fetchall("""
+        SELECT NotificationID, ProductID, Kind, Message, CreatedAt, ReadAt
+        FROM farmer_notification WHERE FarmerID = %s
+        ORDER BY CreatedAt DESC, NotificationID DESC
+        LIMIT %s
+    """, (farmer_id, limit))
+
+
+def unread_count(farmer_id):
+    return fetchone("SELECT COUNT(*) AS unread FROM farmer_notification "
+                    "WHERE FarmerID = %s AND ReadAt IS NULL", (farmer_id,))['unread']
+
+
+def mark_read(farmer_id):
+    execute("UPDATE farmer_notification SET ReadAt = NOW() WHERE FarmerID = %s AND ReadAt IS NULL",
+            (farmer_id,))
+
+
+def _reload_forever(app):
+    while True:
+        time.sleep(STOCK_ALERT_CONFIG['reload_interval'])
+        try:
+            with app.app_context():
+                load()
+        except Exception:
+            app.logger.exception("low-stock reload failed")
+
+
+def init_app(app):
+    """Create the alert tables, load the low-stock set and start its periodic reload."""
+    global _refresher
+    with app.app_context():
+        ensure_schema()
+        load()
+    if _refresher is None and STOCK_ALERT_CONFIG['reload_interval']:
+        _refresher = threading.Thread(target=_reload_forever, args=(app,),
+                                      name="stock-alerts-reload", daemon=True)
+        _refresher.start()
@@ -0,0 +1,197 @@
+"""
+suggest.py
+Search-box autocomplete over product names, categories and farmer names.
+
+Every suggestion is stored under each of its word suffixes ("alphonso mango",
+"mango") in one sorted array, so the suggestions for a typed prefix are a
+contiguous slice found by bisection. Suggestions are ranked by popularity:
+units sold from order_product, summed up to the category and farmer. Very
+short prefixes, whose slices span much of the array, are answered from top
+lists precomputed at load. Queries never touch MySQL; the index subscribes
+to catalog.py for product changes and is bumped as orders are placed.
+"""
+
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+
+import catalog
+from database import fetchall
+
+SHORT_PREFIX = 3      # prefixes up to this length use the precomputed top lists
+SHORT_TOP = 20        # suggestions kept per short prefix
+MAX_SCAN = 500        # keys looked at for longer prefixes
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _normalize(text):
+    return ' '.join(_WORD.findall((text or '').lower()))
+
+
+def _keys(label):
+    words = _normalize(label).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self._keys = []            # sorted (key, entry) pairs
+        self._entries = {}         # entry -> {'text', 'kind', 'id', 'products': set}
+        self._weights = {}         # entry -> popularity
+        self._product_entries = {} # product_id -> entries the product counts towards
+        self._sold = {}            # product_id -> units sold
+        self._short = {}           # short prefix -> top entries
+
+    @staticmethod
+    def _row_entries(row):
+        entries = [(('product', int(row['ProductID'])), row.get('ProductName'), 'product', int(row['ProductID']))]
+        if row.get('CategoryName'):
+            entries.append((('category', row['CategoryName'].lower()), row['CategoryName'], 'category',
+                            row['CategoryName']))
+        if row.get('FarmerID') is not None and row.get('FarmerName'):
+            entries.append((('farmer', row['FarmerID']), row['FarmerName'], 'farmer', row['FarmerID']))
+        return entries
+
+    def _index_keys(self, entry, text, add):
+        for key in _keys(text):
+            if add:
+                insort(self._keys, (key, entry))
+                continue
+            i = bisect_left(self._keys, (key, entry))
+            if i < len(self._keys) and self._keys[i] == (key, entry):
+                del self._keys[i]
+
+    def _link(self, pid, entry, text, kind, ident):
+        info = self._entries.get(entry)
+        if info is None:
+            info = self._entries[entry] = {'text': text, 'kind': kind, 'id': ident, 'products': set()}
+            self._weights[entry] = 0
+            self._index_keys(entry, text, add=True)
+        elif info['text'] != text:
+            # renamed farmer (or category): move every product's entry over
+            self._index_keys(entry, info['text'], add=False)
+            self._index_keys(entry, text, add=True)
+            info['text'] = text
+        info['products'].add(pid)
+        self._weights[entry] += self._sold.get(pid, 0)
+
+    def _unlink(self, pid, entry):
+        info = self._entries[entry]
+        info['products'].discard(pid)
+        self._weights[entry] -= self._sold.get(pid, 0)
+        if not info['products']:
+            self._index_keys(entry, info['text'], add=False)
+            del self._entries[entry]
+            del self._weights[entry]
+
+    def _remove(self, pid):
+        for entry in self._product_entries.pop(pid, ()):
+            self._unlink(pid, entry)
+
+    def _add(self, row):
+        pid = int(row['ProductID'])
+        entries = self._row_entries(row)
+        for entry, text, kind, ident in entries:
+            self._link(pid, entry, text, kind, ident)
+        self._product_entries[pid] = [e[0] for e in entries]
+
+    def _rank_short(self, prefixes=None):
+        """Recompute the top lists of `prefixes` (every short prefix by default)."""
+        if prefixes is None:
+            prefixes = {key[:n] for key, _ in self._keys for n in range(1, SHORT_PREFIX + 1)}
+            self._short = {}
+        for prefix in prefixes:
+            i = bisect_left(self._keys, (prefix,))
+            entries = set()
+            while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+                entries.add(self._keys[i][1])
+                i += 1
+            if entries:
+                self._short[prefix] = heapq.nlargest(SHORT_TOP, entries, key=self._rank)
+            else:
+                self._short.pop(prefix, None)
+
+    def _short_prefixes(self, pid):
+        return {key[:n] for entry in self._product_entries.get(pid, ())
+                for key in _keys(self._entries[entry]['text']) for n in range(1, SHORT_PREFIX + 1)}
+
+    def _rank(self, entry):
+        return (self._weights[entry], len(self._entries[entry]['products']), entry[0] == 'product')
+
+    def load(self, rows):
+        sold = {r['ProductID']: int(r['Sold'] or 0) for r in fetchall(
+            "SELECT ProductID, SUM(Quantity) AS Sold FROM order_product GROUP BY ProductID")}
+        fresh = SuggestIndex()
+        fresh._sold = sold
+        for row in rows:
+            fresh._add(row)
+        fresh._rank_short()
+        with self._lock:
+            self._keys = fresh._keys
+            self._entries = fresh._entries
+            self._weights = fresh._weights
+            self._product_entries = fresh._product_entries
+            self._sold = sold
+            self._short = fresh._short
+            self.loaded = True
+
+    def apply(self, rows, removed_ids):
+        with self._lock:
+            touched = set()
+            for pid in removed_ids:
+                touched |= self._short_prefixes(int(pid))
+                self._remove(int(pid))
+            for row in rows:
+                pid = int(row['ProductID'])
+                entries = self._row_entries(row)
+                if [e[0] for e in entries] == self._product_entries.get(pid) and \
+                        all(self._entries[e]['text'] == text for e, text, _, _ in entries):
+                    continue   # stock or price change: nothing to suggest differently
+                touched |= self._short_prefixes(pid)
+                self._remove(pid)
+                self._add(row)
+                touched |= self._short_prefixes(pid)
+            self._rank_short(touched)
+
+    def record_order(self, lines):
+        """Count the units of a placed order ({product_id: quantity}) towards popularity."""
+        with self._lock:
+            touched = set()
+            for pid, qty in lines.items():
+                self._sold[pid] = self._sold.get(pid, 0) + qty
+                for entry in self._product_entries.get(pid, ()):
+                    self._weights[entry] += qty
+                touched |= self._short_prefixes(pid)
+            # the precomputed short-prefix lists must see the new popularity too
+            self._rank_short(touched)
+
+    def suggest(self, prefix, limit=8):
+        """[{'text', 'kind', 'id'}] most popular first for a typed prefix."""
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            if len(prefix) <= SHORT_PREFIX:
+                top = self._short.get(prefix, [])[:limit]
+            else:
+                i = bisect_left(self._keys, (prefix,))
+                end = min(i + MAX_SCAN, len(self._keys))
+                candidates = set()
+                while i < end and self._keys[i][0].startswith(prefix):
+                    candidates.add(self._keys[i][1])
+                    i += 1
+                top = heapq.nlargest(limit, candidates, key=self._rank)
+            return [{'text': self._entries[e]['text'], 'kind': self._entries[e]['kind'],
+                     'id': self._entries[e]['id']} for e in top if e in self._entries]
+
+    def stats(self):
+        with self._lock:
+            return {'loaded': self.loaded, 'suggestions': len(self._entries), 'keys': len(self._keys)}
+
+
+suggestions = SuggestIndex()
+catalog.subscribe(suggestions)
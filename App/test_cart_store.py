@@ -0,0 +1,74 @@
+from cart_store import CartStore
+
+
+def _store(**kwargs):
+    return CartStore(backend='memory', **kwargs)
+
+
+def test_add_increments_and_removes_at_zero():
+    store = _store()
+    assert store.add('c1', '7', 2) == 2
+    assert store.add('c1', 7, 3) == 5
+    assert store.add('c1', 7, -5) == 0
+    assert store.get('c1', fresh=True) == {}
+
+
+def test_set_and_clear():
+    store = _store()
+    store.set('c1', 1, 4)
+    store.set('c1', 2, 1)
+    store.set('c1', 2, 0)
+    assert store.get('c1') == {1: 4}
+    store.clear('c1')
+    assert store.get('c1') == {}
+
+
+def test_no_cart_id():
+    store = _store()
+    assert store.get(None) == {}
+    store.clear(None)
+    store.subtract(None, {1: 1})
+
+
+def test_cached_reads_can_be_stale_but_fresh_reads_are_not():
+    store, other = _store(), _store()
+    other.backend = store.backend   # a second worker sharing the backend
+    store.add('c1', 1, 1)
+    assert store.get('c1') == {1: 1}
+    other.add('c1', 2, 1)
+    assert store.get('c1') == {1: 1}
+    assert store.get('c1', fresh=True) == {1: 1, 2: 1}
+    assert store.stats()['hits'] == 1
+
+
+def test_expired_entries_are_reloaded():
+    store, other = _store(lru_ttl=0), _store()
+    other.backend = store.backend
+    store.get('c1')
+    other.add('c1', 3, 2)
+    assert store.get('c1') == {3: 2}
+
+
+def test_writes_update_the_cached_copy():
+    store = _store()
+    store.get('c1')
+    store.add('c1', 1, 2)
+    store.set('c1', 2, 5)
+    assert store.get('c1') == {1: 2, 2: 5}
+    assert store.stats()['misses'] == 1
+
+
+def test_subtract_keeps_lines_added_meanwhile():
+    store = _store()
+    store.add('c1', 1, 2)
+    store.add('c1', 2, 1)
+    store.add('c1', 1, 1)
+    store.subtract('c1', {1: 2, 2: 1})
+    assert store.get('c1', fresh=True) == {1: 1}
+
+
+def test_lru_is_bounded():
+    store = _store(lru_size=2)
+    for cart_id in ('a', 'b', 'c'):
+        store.get(cart_id)
+    assert store.stats()['cached_carts'] == 2
@@ -0,0 +1,70 @@
+from contextlib import nullcontext
+from decimal import Decimal
+
+import catalog
+from catalog import decode_cursor, encode_cursor
+
+
+def _row(pid, price):
+    return {'ProductID': pid, 'Price': Decimal(price), 'ProductName': f'Product {pid}', 'AvgRating': Decimal('4.50')}
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(_row(7, '12.50'), 'price-low')) == ('12.50', 7)
+    assert decode_cursor(encode_cursor(_row(7, '12.50'), 'newest')) == (None, 7)
+
+
+def test_unusable_cursors_are_ignored():
+    for cursor in (None, '', '%%%', 'W10', encode_cursor({'ProductID': 'x', 'Price': 1}, 'price-low')):
+        assert decode_cursor(cursor) is None
+
+
+def _capture(monkeypatch, rows):
+    calls = []
+
+    def fetchall(query, params=None, cache=False):
+        calls.append((query, params))
+        return rows
+    monkeypatch.setattr(catalog, 'fetchall', fetchall)
+    return calls
+
+
+def test_page_resumes_after_the_cursor(monkeypatch):
+    calls = _capture(monkeypatch, [_row(3, '20.00'), _row(4, '20.00'), _row(9, '25.00')])
+    cursor = encode_cursor(_row(2, '20.00'), 'price-low')
+    rows, next_cursor = catalog.page(category='Fruits', in_stock=True, sort='price-low',
+                                     cursor=cursor, limit=2)
+    query, params = calls[0]
+    assert "(Price > %s OR (Price = %s AND ProductID > %s))" in query
+    assert query.endswith("ORDER BY Price ASC, ProductID ASC LIMIT %s")
+    assert params == ('Fruits', '20.00', '20.00', 2, 3)
+    assert [r['ProductID'] for r in rows] == [3, 4]
+    assert decode_cursor(next_cursor) == ('20.00', 4)
+
+
+def test_descending_sorts_and_newest(monkeypatch):
+    calls = _capture(monkeypatch, [])
+    catalog.page(sort='price-high', cursor=encode_cursor(_row(5, '9.00'), 'price-high'))
+    assert "(Price < %s OR (Price = %s AND ProductID < %s))" in calls[-1][0]
+    rows, next_cursor = catalog.page(sort='bogus', cursor=encode_cursor(_row(5, '9.00'), 'newest'))
+    assert "ProductID < %s" in calls[-1][0]
+    assert calls[-1][0].endswith("ORDER BY ProductID DESC LIMIT %s")
+    assert rows == [] and next_cursor is None
+
+
+def test_verify_repairs_drifted_and_orphaned_rows(monkeypatch):
+    base = dict.fromkeys(catalog.COLUMNS.split(", "))
+    base.update(Price=Decimal('10.00'), AvgRating=Decimal('4.3333'), QuantityAvailable=5)
+    source = [dict(base, ProductID=1), dict(base, ProductID=2)]
+    stored = [dict(base, ProductID=1, AvgRating=Decimal('4.33')),   # same once rounded
+              dict(base, ProductID=2, QuantityAvailable=9),          # drifted
+              dict(base, ProductID=3)]                               # product deleted
+    monkeypatch.setattr(catalog, 'fetchall', lambda query, params=None:
+                        stored if query.startswith("SELECT ProductID, ProductName") else source)
+    repaired = {}
+    monkeypatch.setattr(catalog, 'transaction', nullcontext)
+    monkeypatch.setattr(catalog, 'refresh_products', lambda ids: repaired.update(refreshed=ids))
+    monkeypatch.setattr(catalog, 'remove_products', lambda ids: repaired.update(removed=ids))
+    report = catalog.verify()
+    assert repaired == {'refreshed': [2], 'removed': [3]}
+    assert (report['checked'], report['drifted'], report['removed']) == (2, [2], 1)
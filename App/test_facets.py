@@ -0,0 +1,70 @@
+from facets import FacetIndex, _bits
+
+
+def _row(pid, category='Vegetables', season='Summer', farmer=1, price=40, qty=5):
+    return {'ProductID': pid, 'CategoryName': category, 'SeasonName': season, 'FarmerID': farmer,
+            'FarmerName': f'Farmer {farmer}', 'Price': price, 'QuantityAvailable': qty}
+
+
+def _index():
+    index = FacetIndex()
+    index.load([
+        _row(1),
+        _row(2, category='Fruits', price=120),
+        _row(3, season='Winter, Monsoon', farmer=2, qty=0),
+        _row(4, category='Dairy', season='Year-round', farmer=2, price=600),
+    ])
+    return index
+
+
+def test_bits():
+    assert _bits([]) == 0
+    assert _bits([0, 3, 9]) == (1 << 0) | (1 << 3) | (1 << 9)
+
+
+def test_query_before_load():
+    assert FacetIndex().query({}) is None
+
+
+def test_filters_and_newest_first():
+    result = _index().query({'category': 'vegetables'}, limit=10)
+    assert result['total'] == 2
+    assert result['ids'] == [3, 1]
+
+
+def test_year_round_products_match_every_season():
+    result = _index().query({'season': 'Winter'}, limit=10)
+    assert result['ids'] == [4, 3]
+
+
+def test_counts_leave_out_their_own_filter():
+    result = _index().query({'category': 'Vegetables', 'in_stock': True}, facets=('category', 'in_stock'))
+    assert result['total'] == 1
+    # category counts apply the stock filter only
+    assert result['counts']['category'] == {'vegetables': 1, 'fruits': 1, 'dairy': 1}
+    # the stock count applies the category filter only
+    assert result['counts']['in_stock'] == 1
+
+
+def test_price_bands_and_ranges():
+    index = _index()
+    assert index.query({'max_price': 100}, limit=10)['ids'] == [3, 1]
+    assert index.query({'min_price': 100, 'max_price': 700}, limit=10)['ids'] == [4, 2]
+
+
+def test_farmer_counts_and_names():
+    result = _index().query({}, facets=('farmer',))
+    assert result['counts']['farmer'] == {1: 2, 2: 2}
+    assert result['farmer_names'] == {1: 'Farmer 1', 2: 'Farmer 2'}
+
+
+def test_within_restricts_to_given_ids():
+    assert _index().query({}, limit=10, within=[1, 4, 99])['ids'] == [4, 1]
+
+
+def test_apply_moves_and_removes_products():
+    index = _index()
+    index.apply([_row(1, category='Fruits')], removed_ids=[2])
+    assert index.query({'category': 'Fruits'}, limit=10)['ids'] == [1]
+    assert index.query({}, limit=10)['total'] == 3
+    assert index.query({'category': 'Vegetables'}, limit=10)['ids'] == [3]
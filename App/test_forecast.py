@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import pytest
+
+import forecast
+
+
+@pytest.fixture
+def sales(monkeypatch):
+    """Daily units per product, served as sales_daily rows; records each query's range."""
+    daily = {}
+    queries = []
+
+    def fetchall(query, params):
+        farmer_id, _, first, last = params
+        queries.append((first, last))
+        return [{'ProductID': pid, 'Day': day, 'Units': units}
+                for pid, days in daily.items() for day, units in days.items()
+                if first <= day <= last and units]
+
+    monkeypatch.setattr(forecast, 'fetchall', fetchall)
+    monkeypatch.setattr(forecast, '_fits', OrderedDict())
+    monkeypatch.setattr(forecast, '_counters', dict.fromkeys(forecast._counters, 0))
+    return daily, queries
+
+
+def _history(days, units):
+    """{day: units(day)} over the last `days` days up to yesterday."""
+    today = date.today()
+    return {today - timedelta(days=n): units(today - timedelta(days=n)) for n in range(1, days + 1)}
+
+
+def _product(pid, stock):
+    return {'ProductID': pid, 'ProductName': f'Product {pid}', 'QuantityAvailable': stock}
+
+
+def test_steady_demand(sales):
+    daily, _ = sales
+    daily[1] = _history(56, lambda day: 4)
+    [rec] = forecast.recommendations(7, [_product(1, 20)])
+    assert rec['DailyDemand'] == pytest.approx(4, abs=0.01)
+    assert rec['DaysOfCover'] == 4
+    # 14 days of cover at 4 a day, less the 20 in stock; no forecast error to pad
+    assert rec['SuggestedRestock'] == 36
+
+
+def test_weekday_pattern_is_learned(sales):
+    daily, _ = sales
+    # sells only at the weekend
+    daily[1] = _history(56, lambda day: 14 if day.weekday() >= 5 else 0)
+    [rec] = forecast.recommendations(7, [_product(1, 1000)])
+    assert rec['DailyDemand'] == pytest.approx(4, abs=0.5)
+    assert rec['DaysOfCover'] == forecast.FORECAST_CONFIG['horizon_days']
+
+
+def test_products_without_sales(sales):
+    daily, _ = sales
+    daily[1] = _history(56, lambda day: 2)
+    recs = forecast.recommendations(7, [_product(2, 0), _product(1, 1)])
+    assert [r['ProductID'] for r in recs] == [1, 2]
+    assert recs[1]['DaysOfCover'] is None and recs[1]['SuggestedRestock'] == 0
+    assert forecast.recommendations(7, []) == []
+
+
+def test_fits_are_cached_per_farmer(sales):
+    daily, queries = sales
+    daily[1] = _history(56, lambda day: 3)
+    forecast.recommendations(7, [_product(1, 5)])
+    forecast.recommendations(7, [_product(1, 5)])
+    assert len(queries) == 1
+    assert forecast.stats()['hits'] == 1 and forecast.stats()['full_fits'] == 1
+
+
+def test_stale_fit_is_advanced_incrementally(sales):
+    daily, queries = sales
+    daily[1] = _history(56, lambda day: 3)
+    forecast.recommendations(7, [_product(1, 5)])
+    # pretend the cached fit is two days old
+    fit = forecast._fits[7]
+    fit.through -= timedelta(days=2)
+    forecast.recommendations(7, [_product(1, 5)])
+    assert queries[-1] == (fit.through + timedelta(days=1), date.today() - timedelta(days=1))
+    assert forecast.stats()['incremental_fits'] == 1
@@ -0,0 +1,57 @@
+from datetime import datetime
+from decimal import Decimal
+
+from invoices import InvoiceCache, content_hash
+
+
+def _items(status='Pending', qty=2):
+    return [{'OrderID': 1, 'OrderDate': datetime(2026, 3, 5, 10, 0), 'Status': status,
+             'Quantity': qty, 'ProductName': 'Milk', 'UnitPrice': Decimal('25.00')}]
+
+
+def test_content_hash_is_stable_and_tracks_changes():
+    assert content_hash(_items()) == content_hash(_items())
+    assert len(content_hash(_items())) == 32
+    assert content_hash(_items(status='Shipped')) != content_hash(_items())
+    assert content_hash(_items(qty=3)) != content_hash(_items())
+    # key order does not matter
+    assert content_hash([dict(reversed(list(_items()[0].items())))]) == content_hash(_items())
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = InvoiceCache(memory_bytes=10)
+    cache.store(1, 'a', b'1234')
+    cache.store(2, 'b', b'1234')
+    assert cache.lookup(1, 'a') == b'1234'      # 1 is now the most recent
+    cache.store(3, 'c', b'1234')
+    assert cache.lookup(2, 'b') is None
+    assert cache.lookup(1, 'a') == b'1234' and cache.lookup(3, 'c') == b'1234'
+    assert cache.stats()['memory_bytes'] == 8
+
+
+def test_disk_tier_survives_memory_eviction(tmp_path):
+    cache = InvoiceCache(memory_bytes=4, disk_dir=str(tmp_path))
+    cache.store(1, 'a', b'1234')
+    cache.store(2, 'b', b'5678')
+    assert cache.lookup(1, 'a') == b'1234'
+    assert cache.stats()['disk_hits'] == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['1-a.pdf', '2-b.pdf']
+
+
+def test_storing_a_new_version_drops_the_old_one(tmp_path):
+    cache = InvoiceCache(disk_dir=str(tmp_path))
+    cache.store(1, 'old', b'v1')
+    cache.store(1, 'new', b'v2')
+    assert cache.lookup(1, 'old') is None
+    assert cache.lookup(1, 'new') == b'v2'
+    assert [p.name for p in tmp_path.iterdir()] == ['1-new.pdf']
+
+
+def test_invalidate(tmp_path):
+    cache = InvoiceCache(disk_dir=str(tmp_path))
+    cache.store(1, 'a', b'v1')
+    cache.store(12, 'b', b'v2')
+    cache.invalidate(1)
+    assert cache.lookup(1, 'a') is None
+    assert cache.lookup(12, 'b') == b'v2'
+    assert cache.stats()['invalidations'] == 1
@@ -0,0 +1,52 @@
+from datetime import date, datetime
+
+import order_history
+from order_history import decode_cursor, encode_cursor
+
+
+def _order(order_id, day):
+    return {'OrderID': order_id, 'OrderDate': datetime(2026, 3, day, 9, 30), 'Status': 'Pending',
+            'TotalAmount': 100}
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(_order(42, 5))
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == ('2026-03-05 09:30:00', 42)
+
+
+def test_unusable_cursors_are_ignored():
+    for cursor in (None, '', 'not base64!', encode_cursor({'OrderDate': 'x', 'OrderID': 'y'}), 'W10'):
+        assert decode_cursor(cursor) is None
+
+
+def test_page_resumes_after_the_cursor(monkeypatch):
+    calls = []
+
+    def fetchall(query, params=None):
+        calls.append((query, params))
+        if 'FROM orders' in query:
+            return [_order(9, 20), _order(8, 19), _order(7, 19)]
+        return [{'OrderID': 9, 'ProductID': 1, 'Quantity': 2, 'ProductName': 'Milk', 'UnitPrice': 25}]
+
+    monkeypatch.setattr(order_history, 'fetchall', fetchall)
+    cursor = encode_cursor(_order(10, 21))
+    orders, next_cursor = order_history.page(5, status='Pending', start=date(2026, 3, 1),
+                                             end=date(2026, 3, 31), cursor=cursor, limit=2)
+
+    query, params = calls[0]
+    assert "(OrderDate < %s OR (OrderDate = %s AND OrderID < %s))" in query
+    assert params == (5, 'Pending', date(2026, 3, 1), date(2026, 4, 1),
+                      '2026-03-21 09:30:00', '2026-03-21 09:30:00', 10, 3)
+    # one extra row tells there is another page; its cursor is the last row shown
+    assert [o['OrderID'] for o in orders] == [9, 8]
+    assert decode_cursor(next_cursor) == ('2026-03-19 09:30:00', 8)
+    assert orders[0]['items'][0]['ProductName'] == 'Milk'
+    assert orders[1]['items'] == []
+
+
+def test_last_page_has_no_cursor(monkeypatch):
+    monkeypatch.setattr(order_history, 'fetchall', lambda query, params=None:
+                        [_order(1, 1)] if 'FROM orders' in query else [])
+    orders, next_cursor = order_history.page(5, status='Unknown', limit=2)
+    assert len(orders) == 1 and next_cursor is None
@@ -0,0 +1,60 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import render_service as rs
+from render_service import RenderBusy, RenderService
+
+
+@pytest.fixture
+def service(monkeypatch):
+    def fail(reason):
+        raise ValueError(reason)
+    monkeypatch.setitem(rs.RENDERERS, 'echo', lambda data: data)
+    monkeypatch.setitem(rs.RENDERERS, 'fail', fail)
+    return RenderService(mode='inline', max_pending=1, wait_timeout=1)
+
+
+def test_render_inline(service):
+    done = []
+    pdf, job_id = service.render('echo', (b'%PDF-1',), owner=3, filename='a.pdf', on_done=done.append)
+    assert pdf == b'%PDF-1'
+    assert done == [b'%PDF-1']
+    assert service.job(job_id, 3)['filename'] == 'a.pdf'
+    assert service.stats()['completed'] == 1
+
+
+def test_jobs_are_only_visible_to_their_owner(service):
+    job_id = service.submit('echo', (b'x',), owner=3, filename='a.pdf')
+    assert service.job(job_id, 4) is None
+    assert service.job('unknown', 3) is None
+
+
+def test_failed_render(service):
+    done = []
+    job_id = service.submit('fail', ('broken',), owner=3, filename='a.pdf', on_done=done.append)
+    with pytest.raises(ValueError):
+        service.wait(job_id)
+    assert done == []
+    assert service.stats()['failed'] == 1
+    # the slot was given back
+    assert service.render('echo', (b'ok',), owner=3, filename='b.pdf')[0] == b'ok'
+
+
+def test_busy_when_every_slot_is_taken(service):
+    service._slots.acquire()
+    with pytest.raises(RenderBusy):
+        service.submit('echo', (b'x',), owner=3, filename='a.pdf')
+    assert service.stats()['rejected'] == 1
+    service._slots.release()
+    assert service.start('echo', (b'y',)).result() == b'y'
+
+
+def test_invoice_renders_a_pdf():
+    items = [{'OrderID': 12, 'OrderDate': datetime(2026, 1, 2), 'Status': 'Pending',
+              'TotalAmount': Decimal('50.00'), 'Quantity': 2, 'ProductName': 'Milk',
+              'UnitPrice': Decimal('25.00'), 'CustomerName': 'A', 'CustomerLocation': 'Pune',
+              'CustomerEmail': 'a@b', 'FarmerName': 'F', 'FarmerLocation': 'Nashik'}]
+    pdf, _ = RenderService(mode='inline').render('invoice', (items,), owner=1, filename='invoice.pdf')
+    assert pdf.startswith(b'%PDF-')
@@ -0,0 +1,69 @@
+from search import SearchIndex, edit_distance, tokenize
+
+
+def _row(pid, name, category='Vegetables', farmer='Ravi', location='Pune'):
+    return {'ProductID': pid, 'ProductName': name, 'CategoryName': category,
+            'FarmerName': farmer, 'FarmerLocation': location}
+
+
+def _index():
+    index = SearchIndex()
+    index.load([
+        _row(1, 'Tomatoes'),
+        _row(2, 'Organic Tomato', farmer='Asha', location='Nashik'),
+        _row(3, 'Paneer', category='Dairy'),
+        _row(4, 'Potatoes', location='Tomatoville'),
+    ])
+    return index
+
+
+def _ids(results):
+    return [pid for pid, _ in results]
+
+
+def test_tokenize():
+    assert tokenize("Farm-fresh EGGS (12)") == ['farm', 'fresh', 'eggs', '12']
+    assert tokenize(None) == []
+
+
+def test_edit_distance():
+    assert edit_distance('panir', 'paneer', 2) == 2
+    assert edit_distance('tomato', 'tomato', 1) == 0
+    # gives up once the limit is exceeded
+    assert edit_distance('milk', 'paneer', 1) == 2
+
+
+def test_exact_and_prefix_matches():
+    assert _ids(_index().search('paneer')) == [3]
+    assert _ids(_index().search('pan')) == [3]
+
+
+def test_name_hits_outrank_location_hits():
+    assert _ids(_index().search('tomatoes'))[0] == 1
+    assert _index().search('tomato')[0][0] == 2
+
+
+def test_typo_that_is_also_a_prefix_still_matches_fuzzily():
+    # "tomatoe" is a prefix of "tomatoes" and one edit from "tomato"
+    assert set(_ids(_index().search('tomatoe'))) >= {1, 2}
+
+
+def test_misspelling():
+    assert _ids(_index().search('panir')) == [3]
+
+
+def test_products_matching_more_words_rank_first():
+    assert _ids(_index().search('organic tomato'))[0] == 2
+
+
+def test_apply_updates_and_removes():
+    index = _index()
+    index.apply([_row(3, 'Cottage Cheese', category='Dairy')], removed_ids=[1])
+    assert index.search('paneer') == []
+    assert _ids(index.search('cheese')) == [3]
+    assert 1 not in _ids(index.search('tomatoes'))
+
+
+def test_empty_query_and_index():
+    assert _index().search('   ') == []
+    assert SearchIndex().search('tomato') == []
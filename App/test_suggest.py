@@ -0,0 +1,62 @@
+import pytest
+
+import suggest
+from suggest import SuggestIndex, _keys, _normalize
+
+
+def _row(pid, name, category='Fruits', farmer_id=1, farmer='Ravi Patil'):
+    return {'ProductID': pid, 'ProductName': name, 'CategoryName': category,
+            'FarmerID': farmer_id, 'FarmerName': farmer}
+
+
+@pytest.fixture
+def index(monkeypatch):
+    # units sold per product, as order_product would report them
+    sold = [{'ProductID': 1, 'Sold': 5}, {'ProductID': 2, 'Sold': 40}]
+    monkeypatch.setattr(suggest, 'fetchall', lambda query, params=None: sold)
+    index = SuggestIndex()
+    index.load([
+        _row(1, 'Alphonso Mango'),
+        _row(2, 'Mango Pulp', category='Preserves', farmer_id=2, farmer='Asha More'),
+        _row(3, 'Apple'),
+    ])
+    return index
+
+
+def _texts(results):
+    return [s['text'] for s in results]
+
+
+def test_keys_are_word_suffixes():
+    assert _normalize("  Alphonso-MANGO ") == 'alphonso mango'
+    assert _keys('Alphonso Mango') == ['alphonso mango', 'mango']
+
+
+def test_matches_any_word_and_ranks_by_popularity(index):
+    # the longer prefix goes through the sorted keys, not the short lists
+    assert _texts(index.suggest('mang'))[:2] == ['Mango Pulp', 'Alphonso Mango']
+
+
+def test_short_prefixes_use_precomputed_lists(index):
+    results = index.suggest('a')
+    assert results[0] == {'text': 'Asha More', 'kind': 'farmer', 'id': 2}
+    assert {'Alphonso Mango', 'Apple'} <= set(_texts(results))
+
+
+def test_orders_rerank_short_prefixes(index):
+    assert _texts(index.suggest('ap')) == ['Apple']
+    index.record_order({3: 100})
+    assert index.suggest('a')[0]['text'] == 'Apple'
+    assert index.suggest('fru')[0]['kind'] == 'category'
+
+
+def test_apply_renames_and_removes(index):
+    index.apply([_row(3, 'Green Apple')], removed_ids=[2])
+    assert _texts(index.suggest('green')) == ['Green Apple']
+    assert 'Mango Pulp' not in _texts(index.suggest('mango'))
+    assert 'Asha More' not in _texts(index.suggest('a'))
+
+
+def test_limit_and_blank_prefix(index):
+    assert len(index.suggest('a', limit=1)) == 1
+    assert index.suggest('  ') == []